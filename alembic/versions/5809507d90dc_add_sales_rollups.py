@@ -0,0 +1,61 @@
+"""add sales rollups
+
+Revision ID: 5809507d90dc
+Revises: 4d1dfaad83e0
+Create Date: 2026-10-18 16:26:12.256967
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5809507d90dc'
+down_revision: Union[str, Sequence[str], None] = '4d1dfaad83e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('vendas_dia',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('pedidos', sa.Integer(), nullable=False),
+    sa.Column('receita_centavos', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'status')
+    )
+    op.create_table('vendas_item',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('sabor', sa.String(), nullable=False),
+    sa.Column('tamanho', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('receita_centavos', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'sabor', 'tamanho', 'status')
+    )
+    op.create_table('vendas_usuario',
+    sa.Column('usuario', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('pedidos', sa.Integer(), nullable=False),
+    sa.Column('receita_centavos', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('usuario', 'status')
+    )
+    op.create_index('ix_vendas_usuario_status_receita', 'vendas_usuario', ['status', 'receita_centavos'], unique=False)
+    op.add_column('pedidos', sa.Column('fechado_em', sa.DateTime(), nullable=True))
+    # pedidos já fechados: usa o horário do evento de fechamento quando existe, senão o momento da migração.
+    # Os agregados são preenchidos depois com "python cli.py reconstruir-relatorios".
+    op.execute("UPDATE pedidos SET fechado_em = COALESCE((SELECT MAX(eventos_pedido.criado_em) FROM eventos_pedido "
+               "WHERE eventos_pedido.pedido = pedidos.id AND eventos_pedido.tipo IN ('pedido_concluido', 'pedido_cancelado')), "
+               "CURRENT_TIMESTAMP) WHERE status IN ('CONCLUIDO', 'CANCELADO')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pedidos', 'fechado_em')
+    op.drop_index('ix_vendas_usuario_status_receita', table_name='vendas_usuario')
+    op.drop_table('vendas_usuario')
+    op.drop_table('vendas_item')
+    op.drop_table('vendas_dia')
@@ -0,0 +1,39 @@
+"""Store prices as integer cents
+
+Revision ID: 991d15683236
+Revises: 9c3f5d61abee
+Create Date: 2026-10-18 16:09:53.351172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '991d15683236'
+down_revision: Union[str, Sequence[str], None] = '9c3f5d61abee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('itens_pedido', sa.Column('preco_unitario_centavos', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('pedidos', sa.Column('preco_centavos', sa.Integer(), server_default='0', nullable=False))
+    # converte os valores existentes antes de remover as colunas Float
+    op.execute("UPDATE itens_pedido SET preco_unitario_centavos = CAST(ROUND(COALESCE(preco_unitario, 0) * 100) AS INTEGER)")
+    op.execute("UPDATE pedidos SET preco_centavos = CAST(ROUND(COALESCE(preco, 0) * 100) AS INTEGER)")
+    op.drop_column('itens_pedido', 'preco_unitario')
+    op.drop_column('pedidos', 'preco')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('pedidos', sa.Column('preco', sa.FLOAT(), nullable=True))
+    op.add_column('itens_pedido', sa.Column('preco_unitario', sa.FLOAT(), nullable=True))
+    op.execute("UPDATE pedidos SET preco = preco_centavos / 100.0")
+    op.execute("UPDATE itens_pedido SET preco_unitario = preco_unitario_centavos / 100.0")
+    op.drop_column('pedidos', 'preco_centavos')
+    op.drop_column('itens_pedido', 'preco_unitario_centavos')
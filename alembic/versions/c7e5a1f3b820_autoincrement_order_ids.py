@@ -0,0 +1,41 @@
+"""autoincrement order ids
+
+Revision ID: c7e5a1f3b820
+Revises: b41e7c2d9a05
+Create Date: 2026-10-18 19:12:08.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e5a1f3b820'
+down_revision: Union[str, Sequence[str], None] = 'b41e7c2d9a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # sem AUTOINCREMENT o SQLite reaproveita os ids mais altos depois de apagados (ex.: pedidos arquivados).
+    # O SQLite não altera a chave primária de uma tabela existente: as tabelas são recriadas com os dados,
+    # e o sqlite_sequence começa no maior id atual. No PostgreSQL as sequences já não reaproveitam ids.
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table('pedidos', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+    with op.batch_alter_table('itens_pedido', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table('itens_pedido', recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
+    with op.batch_alter_table('pedidos', recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,75 @@
+from sqlalchemy import select, delete
+from sqlalchemy.exc import OperationalError
+from database import insert_on_conflict, dialeto_de
+from models import Base, Pedido, ItemPedido
+from relatorios import STATUS_FECHADOS
+
+# pedidos CONCLUIDO/CANCELADO nunca mais são alterados: depois de um prazo saem das tabelas quentes para o
+# banco de arquivo (database.DATABASE_ARQUIVO), de onde visualizar e listar pedidos ainda os leem
+
+def _colunas(modelo):
+    # atributos do mapeamento (e não a Table), para a sessão rotear o SELECT pelo modelo
+    return [getattr(modelo, coluna.key) for coluna in modelo.__table__.columns]
+
+async def criar_tabelas_arquivo(engine_arquivo):
+    """Cria as tabelas de pedidos e itens no banco de arquivo, se ainda não existirem."""
+    for tentativa in range(2):
+        try:
+            async with engine_arquivo.begin() as conexao:
+                await conexao.run_sync(Base.metadata.create_all, tables = [Pedido.__table__, ItemPedido.__table__])
+            return
+        except OperationalError:
+            # outro worker criou as tabelas entre a verificação e o CREATE: a segunda tentativa já as encontra
+            if tentativa:
+                raise
+
+async def _ja_arquivados(sessao_arquivo, pedidos, itens):
+    """Ids dos pedidos cuja cópia no arquivo é idêntica à quente (o pedido e o conjunto dos seus itens)."""
+    ids = [pedido["id"] for pedido in pedidos]
+    copias = {pedido["id"]: dict(pedido) for pedido in (await sessao_arquivo.execute(
+        select(*_colunas(Pedido)).filter(Pedido.id.in_(ids)))).mappings()}
+    itens_copiados, itens_quentes = {}, {}
+    for item in (await sessao_arquivo.execute(select(*_colunas(ItemPedido)).filter(ItemPedido.pedido.in_(ids)))).mappings():
+        itens_copiados.setdefault(item["pedido"], []).append(dict(item))
+    for item in itens:
+        itens_quentes.setdefault(item["pedido"], []).append(dict(item))
+    ordem = lambda item: item["id"]
+    return {pedido["id"] for pedido in pedidos
+            if copias.get(pedido["id"]) == dict(pedido)
+            and sorted(itens_copiados.get(pedido["id"], []), key=ordem) == sorted(itens_quentes.get(pedido["id"], []), key=ordem)}
+
+async def arquivar_pedidos(session, sessao_arquivo, corte, lote):
+    """Move os pedidos fechados antes de `corte`, com seus itens, para o banco de arquivo, em lotes por id.
+    Cada lote é confirmado primeiro no arquivo e depois removido das tabelas quentes: se o processo parar no
+    meio, o pedido fica nos dois bancos (as leituras preferem o quente) e a próxima execução termina a
+    remoção. Um pedido só sai das tabelas quentes se a cópia no arquivo for idêntica a ele; se o id já existe
+    no arquivo com outros dados (id reaproveitado em um banco antigo, sem AUTOINCREMENT), o pedido fica no
+    banco quente. Retorna a quantidade de pedidos arquivados e os ids desses pedidos em conflito."""
+    arquivados = 0
+    conflitos = []
+    ultimo_id = -1
+    dialeto = dialeto_de(sessao_arquivo, Pedido)
+    while True:
+        pedidos = (await session.execute(select(*_colunas(Pedido))
+                                         .filter(Pedido.id > ultimo_id, Pedido.status.in_(STATUS_FECHADOS), Pedido.fechado_em < corte)
+                                         .order_by(Pedido.id).limit(lote))).mappings().all()
+        if not pedidos:
+            return arquivados, conflitos
+        ids = [pedido["id"] for pedido in pedidos]
+        itens = (await session.execute(select(*_colunas(ItemPedido)).filter(ItemPedido.pedido.in_(ids)))).mappings().all()
+
+        # DO NOTHING: a cópia de uma execução interrompida já está lá; a conferência abaixo decide o que sai
+        await sessao_arquivo.execute(insert_on_conflict(dialeto, Pedido).on_conflict_do_nothing(), [dict(pedido) for pedido in pedidos])
+        if itens:
+            await sessao_arquivo.execute(insert_on_conflict(dialeto, ItemPedido).on_conflict_do_nothing(), [dict(item) for item in itens])
+        await sessao_arquivo.commit()
+        copiados = await _ja_arquivados(sessao_arquivo, pedidos, itens)
+        await sessao_arquivo.commit()
+
+        if copiados:
+            await session.execute(delete(ItemPedido).filter(ItemPedido.pedido.in_(copiados)))
+            await session.execute(delete(Pedido).filter(Pedido.id.in_(copiados)))
+            await session.commit()
+        arquivados += len(copiados)
+        conflitos += [id_pedido for id_pedido in ids if id_pedido not in copiados]
+        ultimo_id = ids[-1]
@@ -1,27 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException
 from models import Usuario
-from dependencies import pegar_sessao, verificar_token
-from main import bcrypt_context, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
+from dependencies import pegar_sessao, verificar_token, UsuarioAutenticado
+from main import ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, TOKEN_EMBUTIR_CLAIMS
 from schemas import LoginSchema, UsuarioSchema
-from sqlalchemy.orm import Session
+from senhas import criptografar_senha, verificar_senha, metricas
+from limites import limitar_por_ip, verificar_limite
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordRequestForm
 
 auth_router = APIRouter(prefix="/auth", tags=["Autenticação"])
 
-def criar_token(id_usuario, duracao_token=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
+def criar_token(usuario, duracao_token=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), embutir_claims=True):
     data_expiracao = datetime.now(timezone.utc)+duracao_token
-    dic_info = {"sub" : str(id_usuario), "exp" : data_expiracao}
+    dic_info = {"sub" : str(usuario.id), "exp" : data_expiracao}
+    # só o token de acesso (de curta duração) leva as claims: o refresh token vale 7 dias e também é aceito
+    # como token de acesso, então ele é sempre verificado no banco (um usuário rebaixado ou desativado não
+    # mantém o acesso até o refresh token expirar)
+    if embutir_claims and TOKEN_EMBUTIR_CLAIMS:
+        dic_info["admin"] = bool(usuario.admin)
+        dic_info["ativo"] = bool(usuario.ativo)
     jwt_codificado = jwt.encode(dic_info, SECRET_KEY, ALGORITHM)
     return jwt_codificado
 
-def autenticar_usuario(email, senha, session):
-    usuario = session.query(Usuario).filter(Usuario.email==email).first()
+async def autenticar_usuario(email, senha, session):
+    # limite por e-mail antes do bcrypt: tentativas distribuídas entre IPs contra a mesma conta
+    verificar_limite("login_email", email.strip().lower())
+    usuario = await session.scalar(select(Usuario).filter(Usuario.email==email))
     if not usuario:
        return False
-    elif not bcrypt_context.verify(senha, usuario.senha):
+    senha_valida, novo_hash = await verificar_senha(senha, usuario.senha)
+    if not senha_valida:
        return False
+    if novo_hash:
+       usuario.senha = novo_hash
+       await session.commit()
     return usuario
      
      
@@ -33,8 +48,8 @@ async def home():
     """
     return {"mensagem": "Você acessou a rota padrão de autenticação", "CODE": "200"}
 
-@auth_router.post("/criar_conta")
-async def criar_conta(usuario_schema: UsuarioSchema, session: Session = Depends(pegar_sessao)):
+@auth_router.post("/criar_conta", dependencies=[Depends(limitar_por_ip("criar_conta_ip"))])
+async def criar_conta(usuario_schema: UsuarioSchema, session: AsyncSession = Depends(pegar_sessao)):
     """Criar conta:  
         Operação que cria uma nova conta.
         
@@ -53,20 +68,24 @@ async def criar_conta(usuario_schema: UsuarioSchema, session: Session = Depends(
             }
 
         ERRO 400: E-mail já cadastrado.
+
+        ERRO 429: Muitas requisições do mesmo IP ou para o mesmo e-mail (ver cabeçalho Retry-After).
     """    
-    usuario = session.query(Usuario).filter(Usuario.email==usuario_schema.email).first()
+    # limite por e-mail: tentativas distribuídas entre IPs contra o mesmo endereço
+    verificar_limite("criar_conta_email", usuario_schema.email.strip().lower())
+    usuario = await session.scalar(select(Usuario).filter(Usuario.email==usuario_schema.email))
 
     if usuario:
         raise HTTPException(status_code = 400, detail = "E-mail já cadastrado.")
     else:
-        senha_criptografada = bcrypt_context.hash(usuario_schema.senha)
+        senha_criptografada = await criptografar_senha(usuario_schema.senha)
         novo_usuario = Usuario(usuario_schema.nome, usuario_schema.email, senha_criptografada, usuario_schema.ativo, usuario_schema.admin, )
         session.add(novo_usuario)
-        session.commit()
+        await session.commit()
         return {"mensagem": "usuario criado com sucesso."}
         
-@auth_router.post("/login")
-async def login(login_schema: LoginSchema, session: Session = Depends(pegar_sessao)):
+@auth_router.post("/login", dependencies=[Depends(limitar_por_ip("login_ip"))])
+async def login(login_schema: LoginSchema, session: AsyncSession = Depends(pegar_sessao)):
     """Login:  
         Operação que realiza login.
         
@@ -90,21 +109,23 @@ async def login(login_schema: LoginSchema, session: Session = Depends(pegar_sess
             }
 
         ERRO 400: Usuario não encontrado ou senha inválida.
+
+        ERRO 429: Muitas tentativas de login para o IP ou para o e-mail (ver cabeçalho Retry-After).
     """    
-    usuario = autenticar_usuario(login_schema.email, login_schema.senha, session)
+    usuario = await autenticar_usuario(login_schema.email, login_schema.senha, session)
     if not usuario:
         raise HTTPException(status_code = 400, detail = "Usuario não encontrado ou senha inválida")
     else:
-        access_token = criar_token((usuario.id))
-        refresh_token = criar_token(usuario.id, duracao_token=timedelta(days=7))
+        access_token = criar_token(usuario)
+        refresh_token = criar_token(usuario, duracao_token=timedelta(days=7), embutir_claims=False)
         return{
             "access_token" : access_token,
             "refresh_token" : refresh_token,
             "token_type" : "Bearer"
         }
 
-@auth_router.post("/login-form")
-async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends() , session: Session = Depends(pegar_sessao)):
+@auth_router.post("/login-form", dependencies=[Depends(limitar_por_ip("login_ip"))])
+async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends() , session: AsyncSession = Depends(pegar_sessao)):
     """Login form:  
         Operação que realiza login usando o formulário de login do FASTAPI.
         
@@ -115,19 +136,21 @@ async def login_form(dados_formulario: OAuth2PasswordRequestForm = Depends() , s
         Devolve os dados seguindo o padrão "OAuth2PasswordBearer".
 
         ERRO 400: Usuario não encontrado ou senha inválida.
+
+        ERRO 429: Muitas tentativas de login para o IP ou para o e-mail (ver cabeçalho Retry-After).
     """ 
-    usuario = autenticar_usuario(dados_formulario.username, dados_formulario.password, session)
+    usuario = await autenticar_usuario(dados_formulario.username, dados_formulario.password, session)
     if not usuario:
         raise HTTPException(status_code = 400, detail = "Usuario nao encontrado ou senha inválida")
     else:
-        access_token = criar_token((usuario.id))        
+        access_token = criar_token(usuario)        
         return{
             "access_token" : access_token,           
             "token_type" : "Bearer"
         }
     
 @auth_router.get("/refresh")
-async def use_refresh_token(usuario: Usuario = Depends(verificar_token)):
+async def use_refresh_token(usuario: UsuarioAutenticado = Depends(verificar_token), session: AsyncSession = Depends(pegar_sessao)):
     """Refresh:  
         Para realizar a operação usuário deve estar devidamente logado no sistema.
         
@@ -138,8 +161,25 @@ async def use_refresh_token(usuario: Usuario = Depends(verificar_token)):
         ERRO 401: Usuario não autenticado.
     """
    
-    access_token = criar_token(usuario.id)
+    # relê o usuário no banco para que o novo token não herde claims desatualizadas do refresh token
+    usuario = await session.get(Usuario, usuario.id)
+    if not usuario:
+        raise HTTPException(status_code = 401, detail = "Acesso inválido.")
+    access_token = criar_token(usuario)
     return {
         "access_token" : access_token,
         "token_type" : "Bearer"
-    }
\ No newline at end of file
+    }
+
+@auth_router.get("/metricas-senha")
+async def metricas_senha(usuario: UsuarioAutenticado = Depends(verificar_token)):
+    """Métricas de senha:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna as métricas do pool de criptografia de senhas (latência do bcrypt, espera na fila e requisições recusadas).
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    if not usuario.admin:
+        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
+    return metricas()
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""Teste de carga da API: semeia um banco temporário e mede login, criar pedido, adicionar item,
+listar, visualizar e relatórios de vendas, dentro do processo (httpx + ASGI) ou contra um uvicorn local.
+
+Uso:
+    python -m benchmarks.carga --modo asgi --requisicoes 500 --concorrencia 20 --saida resultado.json
+    python -m benchmarks.carga --modo uvicorn --comparar resultado.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from benchmarks.estatisticas import resumir
+from benchmarks.semear import semear, email_usuario, SENHA, EMAIL_ADMIN
+
+CENARIOS = ("login", "criar_pedido", "adicionar_item", "listar", "visualizar", "relatorios")
+ITEM = {"sabor": "PIZZA CALABRESA", "quantidade": 2, "tamanho": "GRANDE", "preco_unitario": 49.9}
+
+async def executar_cenario(requisicoes, concorrencia, fazer_requisicao):
+    """Dispara `requisicoes` chamadas de `fazer_requisicao(i)` com no máximo `concorrencia` em paralelo."""
+    tempos, erros = [], 0
+    indices = iter(range(requisicoes))
+
+    async def trabalhador():
+        nonlocal erros
+        for indice in indices:
+            inicio = time.perf_counter()
+            resposta = await fazer_requisicao(indice)
+            tempos.append(time.perf_counter() - inicio)
+            if resposta.status_code >= 400:
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    return {**resumir(tempos), "rps": requisicoes / duracao, "requisicoes": requisicoes, "erros": erros}
+
+async def logar(cliente, email):
+    resposta = await cliente.post("/auth/login", json={"email": email, "senha": SENHA})
+    resposta.raise_for_status()
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+async def rodar_cenarios(cliente, args, total_pedidos):
+    aleatorio = random.Random(7)
+    admin = await logar(cliente, EMAIL_ADMIN)
+    usuarios = [await logar(cliente, email_usuario(aleatorio.randint(1, args.usuarios))) for _ in range(args.tokens)]
+    criados = []
+    resultado = {}
+
+    async def login(_):
+        return await cliente.post("/auth/login", json={"email": email_usuario(aleatorio.randint(1, args.usuarios)), "senha": SENHA})
+
+    async def criar_pedido(_):
+        cabecalhos = aleatorio.choice(usuarios)
+        resposta = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+        if resposta.status_code == 200:
+            criados.append((cabecalhos, int(resposta.json()[0].split("ID Pedido:")[1])))
+        return resposta
+
+    async def adicionar_item(_):
+        cabecalhos, id_pedido = aleatorio.choice(criados)
+        return await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=cabecalhos, json=ITEM)
+
+    async def listar(_):
+        return await cliente.get("/pedidos/listar", headers=admin, params={"limit": 50, "cursor": aleatorio.randint(0, total_pedidos)})
+
+    async def visualizar(_):
+        return await cliente.get(f"/pedidos/pedido/{aleatorio.randint(1, total_pedidos)}", headers=admin)
+
+    async def relatorios(i):
+        # alterna entre os relatórios de vendas, com uma janela de 30 dias
+        fim = datetime.now(timezone.utc).date() - timedelta(days=aleatorio.randint(0, 335))
+        periodo = {"de": (fim - timedelta(days=30)).isoformat(), "ate": fim.isoformat()}
+        rota, parametros = (("/relatorios/vendas/dia", periodo), ("/relatorios/vendas/status", periodo),
+                            ("/relatorios/vendas/usuario", {"limite": 50}), ("/relatorios/vendas/item", periodo))[i % 4]
+        return await cliente.get(rota, headers=admin, params=parametros)
+
+    funcoes = {"login": login, "criar_pedido": criar_pedido, "adicionar_item": adicionar_item, "listar": listar, "visualizar": visualizar,
+               "relatorios": relatorios}
+    for nome in args.cenarios:
+        if nome == "adicionar_item" and not criados:
+            await criar_pedido(0)
+        requisicoes = args.requisicoes_login if nome == "login" else args.requisicoes
+        resultado[nome] = await executar_cenario(requisicoes, args.concorrencia, funcoes[nome])
+        print(f"{nome}: {json.dumps(resultado[nome])}", file=sys.stderr)
+    return resultado
+
+async def rodar_asgi(args, total_pedidos):
+    from main import app
+    from database import db
+
+    limites = httpx.Limits(max_connections=args.concorrencia)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", limits=limites, timeout=60) as cliente:
+        resultado = await rodar_cenarios(cliente, args, total_pedidos)
+    await db.dispose()
+    return resultado
+
+async def rodar_uvicorn(args, total_pedidos):
+    base_url = f"http://127.0.0.1:{args.porta}"
+    processo = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.porta), "--log-level", "warning"],
+                                env=os.environ.copy())
+    try:
+        limites = httpx.Limits(max_connections=args.concorrencia)
+        async with httpx.AsyncClient(base_url=base_url, limits=limites, timeout=60) as cliente:
+            limite_espera = time.monotonic() + 30
+            while True:
+                try:
+                    if (await cliente.get("/auth/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > limite_espera or processo.poll() is not None:
+                    raise RuntimeError("uvicorn não respondeu a tempo")
+                await asyncio.sleep(0.1)
+            return await rodar_cenarios(cliente, args, total_pedidos)
+    finally:
+        processo.terminate()
+        processo.wait()
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(anterior, atual):
+    for nome, medidas in atual["cenarios"].items():
+        if nome not in anterior.get("cenarios", {}):
+            continue
+        antes = anterior["cenarios"][nome]
+        variacoes = []
+        for chave in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            if antes[chave]:
+                variacoes.append(f"{chave} {antes[chave]:.2f} -> {medidas[chave]:.2f} ({(medidas[chave] / antes[chave] - 1) * 100:+.1f}%)")
+        print(f"{nome}: " + ", ".join(variacoes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modo", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--pedidos-por-usuario", type=int, default=10)
+    parser.add_argument("--itens-por-pedido", type=int, default=3)
+    parser.add_argument("--requisicoes", type=int, default=500, help="requisições por cenário")
+    parser.add_argument("--requisicoes-login", type=int, default=50, help="requisições do cenário de login (bcrypt é lento)")
+    parser.add_argument("--concorrencia", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=20, help="quantidade de usuários logados usados nos cenários de pedido")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    parser.add_argument("--comparar", help="resultado JSON anterior para comparar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "bench.db")
+        total_pedidos = semear(caminho, args.usuarios, args.pedidos_por_usuario, args.itens_por_pedido, args.bcrypt_rounds)
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{caminho}"
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+        # mede a capacidade da API, não os limites de taxa (LIMITES_ATIVOS=true para incluí-los)
+        os.environ.setdefault("LIMITES_ATIVOS", "false")
+        sys.path.insert(0, os.getcwd())
+        rodar = rodar_asgi if args.modo == "asgi" else rodar_uvicorn
+        cenarios = asyncio.run(rodar(args, total_pedidos))
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now(timezone.utc).isoformat(),
+        "modo": args.modo,
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave not in ("saida", "comparar")},
+        "cenarios": cenarios,
+    }
+    texto = json.dumps(resultado, indent=2)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            comparar(json.load(arquivo), resultado)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import statistics
+
+def percentil(ordenados, fracao):
+    if not ordenados:
+        return 0.0
+    posicao = min(len(ordenados) - 1, max(0, round(fracao * len(ordenados)) - 1))
+    return ordenados[posicao]
+
+def resumir(tempos):
+    """Resume uma lista de latências (em segundos) em milissegundos."""
+    ordenados = sorted(tempos)
+    return {
+        "p50_ms": percentil(ordenados, 0.50) * 1000,
+        "p95_ms": percentil(ordenados, 0.95) * 1000,
+        "p99_ms": percentil(ordenados, 0.99) * 1000,
+        "media_ms": (statistics.fmean(ordenados) if ordenados else 0.0) * 1000,
+    }
@@ -0,0 +1,81 @@
+"""Mede a latência das consultas de login (Usuario.email) e de listagem por usuário
+(Pedido.usuario) antes e depois dos índices da migração 9c3f5d61abee.
+
+Uso:
+    python -m benchmarks.indices --usuarios 1000000 --pedidos 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.schema import CreateIndex
+
+from models import Base
+from benchmarks.estatisticas import resumir
+
+CONSULTA_LOGIN = "SELECT id, nome, email, senha, ativo, admin FROM usuarios WHERE email = ? LIMIT 1"
+CONSULTA_LISTAGEM = "SELECT id, status, usuario, preco_centavos FROM pedidos WHERE usuario = ?"
+
+def criar_banco(caminho, qtd_usuarios, qtd_pedidos):
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(engine, checkfirst=False)
+    indices = [str(CreateIndex(indice).compile(engine)) for tabela in Base.metadata.sorted_tables for indice in tabela.indexes]
+    engine.dispose()
+
+    conexao = sqlite3.connect(caminho)
+    for tabela in Base.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            conexao.execute(f"DROP INDEX {indice.name}")
+    conexao.executemany("INSERT INTO usuarios (id, nome, email, senha, ativo, admin) VALUES (?, ?, ?, ?, 1, 0)",
+                        ((i, f"usuario {i}", f"usuario{i}@teste.com", "x") for i in range(1, qtd_usuarios + 1)))
+    status = ("PENDENTE", "CONCLUIDO", "CANCELADO")
+    conexao.executemany("INSERT INTO pedidos (id, status, usuario, preco_centavos) VALUES (?, ?, ?, ?)",
+                        ((i, status[i % 3], random.randint(1, qtd_usuarios), 1000) for i in range(1, qtd_pedidos + 1)))
+    conexao.commit()
+    return conexao, indices
+
+def medir(conexao, consulta, parametros):
+    tempos = []
+    for parametro in parametros:
+        inicio = time.perf_counter()
+        conexao.execute(consulta, (parametro,)).fetchall()
+        tempos.append(time.perf_counter() - inicio)
+    return resumir(tempos)
+
+def rodar(conexao, qtd_usuarios, repeticoes):
+    ids = [random.randint(1, qtd_usuarios) for _ in range(repeticoes)]
+    return {
+        "login": medir(conexao, CONSULTA_LOGIN, [f"usuario{i}@teste.com" for i in ids]),
+        "listar_pedido_usuario": medir(conexao, CONSULTA_LISTAGEM, ids),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    parser.add_argument("--pedidos", type=int, default=1000000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        conexao, indices = criar_banco(os.path.join(diretorio, "bench.db"), args.usuarios, args.pedidos)
+        resultado = {"usuarios": args.usuarios, "pedidos": args.pedidos, "antes": rodar(conexao, args.usuarios, args.repeticoes)}
+        for ddl in indices:
+            conexao.execute(ddl)
+        conexao.execute("ANALYZE")
+        resultado["depois"] = rodar(conexao, args.usuarios, args.repeticoes)
+        conexao.close()
+
+    texto = json.dumps(resultado, indent=2)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compara adicionar N itens a um pedido com N chamadas a /pedidos/pedido/adicionar-item
+contra uma única chamada a /pedidos/pedido/adicionar-itens, sobre uma cópia temporária do banco.db.
+
+Uso:
+    python -m benchmarks.itens_em_lote --quantidades 1 10 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ITEM = {"sabor": "PIZZA", "quantidade": 1, "tamanho": "GRANDE", "preco_unitario": 42.5}
+
+async def medir(cliente, cabecalhos, quantidades, repeticoes):
+    resultado = {}
+    for quantidade in quantidades:
+        individual, lote = [], []
+        for _ in range(repeticoes):
+            resposta = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+            id_pedido = int(resposta.json()[0].split("ID Pedido:")[1])
+            inicio = time.perf_counter()
+            for _ in range(quantidade):
+                await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=cabecalhos, json=ITEM)
+            individual.append(time.perf_counter() - inicio)
+
+            resposta = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+            id_pedido = int(resposta.json()[0].split("ID Pedido:")[1])
+            inicio = time.perf_counter()
+            await cliente.post(f"/pedidos/pedido/adicionar-itens/{id_pedido}", headers=cabecalhos, json=[ITEM] * quantidade)
+            lote.append(time.perf_counter() - inicio)
+        resultado[quantidade] = {
+            "individual_ms": min(individual) * 1000,
+            "lote_ms": min(lote) * 1000,
+            "ganho": min(individual) / min(lote),
+        }
+    return resultado
+
+async def rodar(args):
+    import httpx
+    from main import app
+    from database import db
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        resposta = await cliente.post("/auth/login", json={"email": args.email, "senha": args.senha})
+        cabecalhos = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+        resultado = await medir(cliente, cabecalhos, args.quantidades, args.repeticoes)
+    await db.dispose()
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quantidades", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--email", default="teste@gmail.com")
+    parser.add_argument("--senha", default="123456")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        copia = os.path.join(diretorio, "banco.db")
+        shutil.copy("banco.db", copia)
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{copia}"
+        os.environ.setdefault("LIMITES_ATIVOS", "false")
+        sys.path.insert(0, os.getcwd())
+        resultado = asyncio.run(rodar(args))
+    print(json.dumps(resultado, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Tempo de partida a frio: do início do processo até a primeira resposta, e a latência do primeiro login
+(que paga conexões do banco e o bcrypt) comparada aos seguintes. Compara o uvicorn simples com servidor.py.
+
+Uso:
+    python -m benchmarks.partida --modos uvicorn servidor --repeticoes 5 --saida partida.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.carga import commit_atual
+from benchmarks.semear import semear, SENHA, EMAIL_ADMIN
+
+MODOS = ("uvicorn", "servidor")
+
+def comando(modo, porta, workers):
+    if modo == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--log-level", "warning"]
+    return [sys.executable, "servidor.py", "--workers", str(workers), "--bind", f"127.0.0.1:{porta}"]
+
+async def medir_partida(modo, porta, workers, logins):
+    """Sobe o servidor e retorna os tempos (ms) até a primeira resposta, do primeiro login e dos seguintes."""
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando(modo, porta, workers), env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{porta}", timeout=60) as cliente:
+            while True:
+                try:
+                    if (await cliente.get("/auth/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - inicio > 60 or processo.poll() is not None:
+                    raise RuntimeError(f"{modo} não respondeu a tempo")
+                await asyncio.sleep(0.01)
+            pronto = time.perf_counter() - inicio
+
+            tempos_login = []
+            for _ in range(logins):
+                antes = time.perf_counter()
+                resposta = await cliente.post("/auth/login", json={"email": EMAIL_ADMIN, "senha": SENHA})
+                resposta.raise_for_status()
+                tempos_login.append(time.perf_counter() - antes)
+    finally:
+        processo.terminate()
+        processo.wait()
+    return {"primeira_resposta_ms": pronto * 1000, "primeiro_login_ms": tempos_login[0] * 1000,
+            "logins_seguintes_ms": statistics.median(tempos_login[1:]) * 1000 if logins > 1 else None}
+
+async def rodar(args):
+    resultado = {}
+    for modo in args.modos:
+        medidas = [await medir_partida(modo, args.porta, args.workers, args.logins) for _ in range(args.repeticoes)]
+        # mediana de cada medida entre as repetições
+        resultado[modo] = {chave: statistics.median(medida[chave] for medida in medidas) for chave in medidas[0] if medidas[0][chave] is not None}
+        print(f"{modo}: {json.dumps(resultado[modo])}", file=sys.stderr)
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--logins", type=int, default=6, help="logins por partida (o primeiro é o medido a frio)")
+    parser.add_argument("--workers", type=int, default=2, help="workers do servidor.py")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--porta", type=int, default=8766)
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "bench.db")
+        semear(caminho, 10, 1, 1, args.bcrypt_rounds)
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{caminho}"
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+        os.environ.setdefault("LIMITES_ATIVOS", "false")
+        modos = asyncio.run(rodar(args))
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now(timezone.utc).isoformat(),
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "modos": modos,
+    }
+    texto = json.dumps(resultado, indent=2)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+
+if __name__ == "__main__":
+    main()
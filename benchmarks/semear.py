@@ -0,0 +1,87 @@
+"""Cria um banco SQLite com o schema atual e volumes configuráveis de usuários, pedidos e itens.
+
+Uso:
+    python -m benchmarks.semear --banco /tmp/bench.db --usuarios 1000 --pedidos-por-usuario 10 --itens-por-pedido 3
+"""
+import argparse
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+
+from models import Base
+from relatorios import agregacoes_vendas
+
+SENHA = "123456"
+EMAIL_ADMIN = "admin@bench.com"
+DIAS_FECHAMENTO = 365
+SABORES = ("PIZZA CALABRESA", "X-TUDO", "COCA COLA", "SUCO NATURAL", "BOLO NO POTE")
+TAMANHOS = ("PEQUENO", "MEDIO", "GRANDE")
+
+def email_usuario(indice):
+    return f"usuario{indice}@bench.com"
+
+def semear(caminho, usuarios, pedidos_por_usuario, itens_por_pedido, bcrypt_rounds=12, semente=42):
+    """Cria o schema em `caminho` e insere os dados. Todos os usuários usam a senha SENHA
+    (um único hash bcrypt); o usuário EMAIL_ADMIN é ADMIN. Pedidos fechados recebem uma data de fechamento
+    nos últimos DIAS_FECHAMENTO dias e os agregados de vendas são calculados. Retorna a quantidade de pedidos criados."""
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    aleatorio = random.Random(semente)
+    senha_criptografada = CryptContext(schemes=["bcrypt"], bcrypt__rounds=bcrypt_rounds).hash(SENHA)
+    conexao = sqlite3.connect(caminho)
+    conexao.execute("INSERT INTO usuarios (nome, email, senha, ativo, admin) VALUES (?, ?, ?, 1, 1)",
+                    ("admin", EMAIL_ADMIN, senha_criptografada))
+    conexao.executemany("INSERT INTO usuarios (nome, email, senha, ativo, admin) VALUES (?, ?, ?, 1, 0)",
+                        ((f"usuario {i}", email_usuario(i), senha_criptografada) for i in range(1, usuarios + 1)))
+
+    status = ("PENDENTE", "CONCLUIDO", "CANCELADO")
+    agora = datetime.utcnow()
+    id_pedido = 0
+    pedidos, itens = [], []
+    for id_usuario in range(2, usuarios + 2):
+        for _ in range(pedidos_por_usuario):
+            id_pedido += 1
+            total = 0
+            for _ in range(itens_por_pedido):
+                quantidade, preco = aleatorio.randint(1, 5), aleatorio.randint(500, 9000)
+                itens.append((aleatorio.choice(SABORES), quantidade, aleatorio.choice(TAMANHOS), preco, id_pedido))
+                total += quantidade * preco
+            status_pedido = aleatorio.choice(status)
+            fechado_em = None if status_pedido == "PENDENTE" else agora - timedelta(seconds=aleatorio.randint(0, DIAS_FECHAMENTO * 86400))
+            pedidos.append((id_pedido, status_pedido, id_usuario, total, fechado_em and fechado_em.isoformat(" ")))
+        if len(itens) > 50000:
+            conexao.executemany("INSERT INTO pedidos (id, status, usuario, preco_centavos, fechado_em) VALUES (?, ?, ?, ?, ?)", pedidos)
+            conexao.executemany("INSERT INTO itens_pedido (sabor, quantidade, tamanho, preco_unitario_centavos, pedido) VALUES (?, ?, ?, ?, ?)", itens)
+            pedidos, itens = [], []
+    conexao.executemany("INSERT INTO pedidos (id, status, usuario, preco_centavos, fechado_em) VALUES (?, ?, ?, ?, ?)", pedidos)
+    conexao.executemany("INSERT INTO itens_pedido (sabor, quantidade, tamanho, preco_unitario_centavos, pedido) VALUES (?, ?, ?, ?, ?)", itens)
+    conexao.commit()
+    conexao.close()
+
+    with engine.begin() as conexao_engine:
+        for consulta in agregacoes_vendas(engine.dialect.name):
+            conexao_engine.execute(consulta)
+    engine.dispose()
+    conexao = sqlite3.connect(caminho)
+    conexao.execute("ANALYZE")
+    conexao.close()
+    return id_pedido
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--banco", required=True, help="arquivo SQLite a ser criado")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--pedidos-por-usuario", type=int, default=10)
+    parser.add_argument("--itens-por-pedido", type=int, default=3)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    args = parser.parse_args()
+    pedidos = semear(args.banco, args.usuarios, args.pedidos_por_usuario, args.itens_por_pedido, args.bcrypt_rounds)
+    print(f"{args.usuarios} usuários, {pedidos} pedidos e {pedidos * args.itens_por_pedido} itens criados em {args.banco}.")
+
+if __name__ == "__main__":
+    main()
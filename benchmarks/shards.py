@@ -0,0 +1,103 @@
+"""Vazão de escrita por quantidade de shards: sobe o servidor.py com os pedidos em 0 (só DATABASE_URL),
+2, 4... bancos e mede criar pedido + adicionar item, com vários usuários em paralelo.
+
+Uso:
+    python -m benchmarks.shards --shards 0 2 4 --requisicoes 2000 --concorrencia 64 --workers 4 --saida shards.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.carga import commit_atual, executar_cenario, logar, ITEM
+from benchmarks.semear import semear, email_usuario
+
+async def medir(args, ambiente):
+    processo = subprocess.Popen([sys.executable, "servidor.py", "--workers", str(args.workers), "--bind", f"127.0.0.1:{args.porta}"],
+                                env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        limites = httpx.Limits(max_connections=args.concorrencia)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.porta}", timeout=60, limits=limites) as cliente:
+            inicio = time.perf_counter()
+            while True:
+                try:
+                    if (await cliente.get("/auth/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - inicio > 60 or processo.poll() is not None:
+                    raise RuntimeError("servidor.py não respondeu a tempo")
+                await asyncio.sleep(0.05)
+
+            aleatorio = random.Random(7)
+            tokens = [await logar(cliente, email_usuario(indice)) for indice in aleatorio.sample(range(1, args.usuarios + 1), args.tokens)]
+
+            async def escrever(indice):
+                # cada requisição cria um pedido de um usuário e adiciona um item a ele
+                token = tokens[indice % len(tokens)]
+                resposta = await cliente.post("/pedidos/pedido", headers=token)
+                if resposta.status_code >= 400:
+                    return resposta
+                id_pedido = int(resposta.json()[0].split("ID Pedido: ")[1].split()[0])
+                return await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=token, json=ITEM)
+            return await executar_cenario(args.requisicoes, args.concorrencia, escrever)
+    finally:
+        processo.terminate()
+        processo.wait()
+
+async def rodar(args, diretorio):
+    resultado = {}
+    for quantidade in args.shards:
+        caminho = os.path.join(diretorio, f"usuarios-{quantidade}.db")
+        semear(caminho, args.usuarios, 0, 0, args.bcrypt_rounds)
+        ambiente = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{caminho}",
+                    "DATABASE_SHARDS": ",".join(f"sqlite+aiosqlite:///{diretorio}/shard-{quantidade}-{indice}.db" for indice in range(quantidade))}
+        if quantidade:
+            subprocess.run([sys.executable, "cli.py", "criar-shards"], env=ambiente, check=True, stdout=subprocess.DEVNULL)
+        resultado[str(quantidade)] = await medir(args, ambiente)
+        print(f"{quantidade} shards: {resultado[str(quantidade)]['rps']:.1f} req/s", file=sys.stderr)
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", nargs="+", type=int, default=[0, 2, 4], help="quantidades de shards (0 = sem shards)")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4, help="workers do servidor.py")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=200, help="usuários distintos que fazem as escritas")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--porta", type=int, default=8767)
+    parser.add_argument("--saida", help="arquivo JSON para gravar o resultado")
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    os.environ.setdefault("LIMITES_ATIVOS", "false")
+    with tempfile.TemporaryDirectory() as diretorio:
+        shards = asyncio.run(rodar(args, diretorio))
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now(timezone.utc).isoformat(),
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "shards": shards,
+    }
+    texto = json.dumps(resultado, indent=2)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+
+if __name__ == "__main__":
+    main()
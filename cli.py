@@ -0,0 +1,203 @@
+"""Comandos administrativos da API.
+
+Uso:
+    python cli.py reconciliar-precos [--lote 10000] [--verificar]
+    python cli.py eventos [--offset 0] [--particao 0] [--lote 10000] [--seguir] [--intervalo 1.0]
+    python cli.py reconstruir-relatorios [--lote 100000]
+    python cli.py sincronizar-replicas [--seguir] [--intervalo 5.0]
+    python cli.py criar-shards
+    python cli.py arquivar-pedidos [--dias 30] [--lote 1000]
+"""
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, func, text
+from sqlalchemy.engine import make_url
+from database import SessionLocal, DATABASE_URL, DATABASE_REPLICAS, shards, TABELAS_SHARD, SHARD_BITS, arquivo, fechar_conexoes, verificar_dialetos
+from models import Base, Pedido, soma_itens_centavos
+from eventos import ler_eventos, registrar_evento
+from relatorios import reconstruir_vendas
+from arquivamento import criar_tabelas_arquivo, arquivar_pedidos
+
+async def reconciliar_precos(lote, verificar):
+    """Compara Pedido.preco_centavos com a soma dos itens em faixas de ID e corrige as divergências.
+    Com verificar=True apenas conta os pedidos divergentes."""
+    corrigidos = 0
+    for shard in shards or [None]:
+        corrigidos += await reconciliar_precos_shard(shard, lote, verificar)
+    await fechar_conexoes()
+    return corrigidos
+
+async def reconciliar_precos_shard(shard, lote, verificar):
+    corrigidos = 0
+    async with SessionLocal(info={"shard": shard}) as session:
+        menor_id, maior_id = (await session.execute(select(func.min(Pedido.id), func.max(Pedido.id)))).one()
+        for inicio in range((menor_id or 1) - 1, maior_id or 0, lote):
+            faixa = (Pedido.id > inicio, Pedido.id <= inicio + lote, Pedido.preco_centavos != soma_itens_centavos())
+            if verificar:
+                corrigidos += await session.scalar(select(func.count()).select_from(Pedido).filter(*faixa))
+            else:
+                # a correção passa pelo log de eventos como as demais alterações (consumidores externos e ETags)
+                pedidos = (await session.scalars(update(Pedido).filter(*faixa)
+                                                 .values(preco_centavos = soma_itens_centavos(), versao = Pedido.versao + 1)
+                                                 .returning(Pedido).execution_options(synchronize_session = False))).all()
+                for pedido in pedidos:
+                    registrar_evento(session, "preco_reconciliado", pedido)
+                corrigidos += len(pedidos)
+                await session.commit()
+    return corrigidos
+
+async def exportar_eventos(offset, particao, lote, seguir, intervalo):
+    """Escreve no stdout, uma linha JSON por evento, os eventos de pedidos com id maior que `offset`,
+    lendo em lotes. Com seguir=True continua aguardando novos eventos até ser interrompido.
+    Retorna o último id escrito, a ser usado como offset da próxima execução (na mesma partição)."""
+    try:
+        while True:
+            async with SessionLocal(info={"shard": shards[particao] if shards else None}) as session:
+                eventos = await ler_eventos(session, offset, lote)
+            for evento in eventos:
+                print(json.dumps({"id": evento.id, "tipo": evento.tipo, "pedido": evento.pedido, "usuario": evento.usuario,
+                                  "dados": evento.dados, "criado_em": evento.criado_em.isoformat()}))
+            if eventos:
+                offset = eventos[-1].id
+            if len(eventos) < lote:
+                if not seguir:
+                    break
+                await asyncio.sleep(intervalo)
+    finally:
+        await fechar_conexoes()
+    return offset
+
+async def reconstruir_relatorios(lote):
+    pedidos = 0
+    for indice, shard in enumerate(shards or [None]):
+        async with SessionLocal(info={"shard": shard}) as session, SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+            if arquivo is None:
+                pedidos += await reconstruir_vendas(session, lote)
+            else:
+                # o arquivo é um só: cada shard soma os pedidos arquivados da sua faixa de ids
+                faixa = (Pedido.id >= indice << SHARD_BITS, Pedido.id < (indice + 1) << SHARD_BITS) if shards else ()
+                pedidos += await reconstruir_vendas(session, lote, sessao_arquivo, *faixa)
+            await session.commit()
+    await fechar_conexoes()
+    return pedidos
+
+async def arquivar(dias, lote):
+    corte = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days = dias)
+    await criar_tabelas_arquivo(arquivo)
+    arquivados = 0
+    conflitos = []
+    for shard in shards or [None]:
+        async with SessionLocal(info={"shard": shard}) as session, SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+            arquivados_shard, conflitos_shard = await arquivar_pedidos(session, sessao_arquivo, corte, lote)
+        arquivados += arquivados_shard
+        conflitos += conflitos_shard
+    await fechar_conexoes()
+    return arquivados, conflitos
+
+async def criar_shards():
+    """Cria as tabelas de pedidos em cada banco de DATABASE_SHARDS e faz o AUTOINCREMENT do shard k começar
+    em k << SHARD_BITS, para que os ids sejam únicos entre shards e indiquem o shard de origem."""
+    verificar_dialetos()
+    tabelas = [Base.metadata.tables[nome] for nome in TABELAS_SHARD]
+    for indice, shard in enumerate(shards):
+        async with shard.begin() as conexao:
+            await conexao.run_sync(Base.metadata.create_all, tables = tabelas)
+            for tabela in ("pedidos", "itens_pedido", "eventos_pedido"):
+                maior_id = await conexao.scalar(text(f"SELECT max(id) FROM {tabela}")) or 0
+                if maior_id and maior_id >> SHARD_BITS != indice:
+                    raise RuntimeError(f"{tabela} do shard {indice} tem ids fora da faixa do shard; a ordem de DATABASE_SHARDS mudou?")
+                # sqlite_sequence guarda o último id gerado de cada tabela com AUTOINCREMENT
+                inicio = max(maior_id, indice << SHARD_BITS)
+                await conexao.execute(text("DELETE FROM sqlite_sequence WHERE name = :tabela"), {"tabela": tabela})
+                await conexao.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:tabela, :inicio)"),
+                                      {"tabela": tabela, "inicio": inicio})
+    await fechar_conexoes()
+
+def sincronizar_replicas(seguir, intervalo):
+    """Copia o banco primário para cada réplica SQLite de DATABASE_REPLICAS com a API de backup do SQLite,
+    que gera uma cópia consistente mesmo com a API gravando. Serve para testar as réplicas localmente; com
+    seguir=True repete a cópia a cada `intervalo` segundos, simulando o atraso de replicação."""
+    while True:
+        with closing(sqlite3.connect(make_url(DATABASE_URL).database)) as origem:
+            for url in DATABASE_REPLICAS:
+                with closing(sqlite3.connect(make_url(url).database)) as destino:
+                    origem.backup(destino)
+        if not seguir:
+            break
+        time.sleep(intervalo)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Comandos administrativos da API.")
+    comandos = parser.add_subparsers(dest = "comando", required = True)
+
+    reconciliar = comandos.add_parser("reconciliar-precos", help = "Recalcula o preço dos pedidos divergentes da soma dos itens.")
+    reconciliar.add_argument("--lote", type = int, default = 10000, help = "quantidade de IDs por transação")
+    reconciliar.add_argument("--verificar", action = "store_true", help = "apenas conta os pedidos divergentes, sem corrigir")
+
+    eventos = comandos.add_parser("eventos", help = "Exporta o log de eventos de pedidos (JSON por linha) a partir de um offset.")
+    eventos.add_argument("--offset", type = int, default = 0, help = "último id já processado pelo consumidor")
+    eventos.add_argument("--particao", type = int, default = 0, help = "shard cujo log é lido (com DATABASE_SHARDS)")
+    eventos.add_argument("--lote", type = int, default = 10000, help = "quantidade de eventos lidos por consulta")
+    eventos.add_argument("--seguir", action = "store_true", help = "continua aguardando novos eventos")
+    eventos.add_argument("--intervalo", type = float, default = 1.0, help = "segundos entre consultas com --seguir")
+
+    relatorios = comandos.add_parser("reconstruir-relatorios", help = "Recalcula os agregados de vendas a partir dos pedidos (backfill).")
+    relatorios.add_argument("--lote", type = int, default = 100000, help = "quantidade de IDs de pedido por consulta")
+
+    replicas = comandos.add_parser("sincronizar-replicas", help = "Copia o banco SQLite primário para as réplicas de DATABASE_REPLICAS.")
+    replicas.add_argument("--seguir", action = "store_true", help = "repete a cópia até ser interrompido")
+    replicas.add_argument("--intervalo", type = float, default = 5.0, help = "segundos entre cópias com --seguir")
+
+    comandos.add_parser("criar-shards", help = "Cria as tabelas de pedidos nos bancos de DATABASE_SHARDS.")
+
+    arquivamento = comandos.add_parser("arquivar-pedidos", help = "Move pedidos fechados antigos para o banco de DATABASE_ARQUIVO.")
+    arquivamento.add_argument("--dias", type = float, default = 30, help = "arquiva pedidos fechados há mais que esse número de dias")
+    arquivamento.add_argument("--lote", type = int, default = 1000, help = "quantidade de pedidos por transação")
+
+    args = parser.parse_args()
+    if args.comando == "reconciliar-precos":
+        quantidade = asyncio.run(reconciliar_precos(args.lote, args.verificar))
+        acao = "divergentes" if args.verificar else "corrigidos"
+        print(f"{quantidade} pedidos {acao}.")
+    elif args.comando == "eventos":
+        if not 0 <= args.particao < max(len(shards), 1):
+            parser.error("partição inválida")
+        try:
+            offset = asyncio.run(exportar_eventos(args.offset, args.particao, args.lote, args.seguir, args.intervalo))
+        except KeyboardInterrupt:
+            return
+        print(f"offset: {offset}", file = sys.stderr)
+    elif args.comando == "reconstruir-relatorios":
+        pedidos = asyncio.run(reconstruir_relatorios(args.lote))
+        print(f"Relatórios reconstruídos a partir de {pedidos} pedidos fechados.")
+    elif args.comando == "sincronizar-replicas":
+        if not DATABASE_REPLICAS:
+            parser.error("nenhuma réplica configurada em DATABASE_REPLICAS")
+        try:
+            sincronizar_replicas(args.seguir, args.intervalo)
+        except KeyboardInterrupt:
+            return
+        print(f"{len(DATABASE_REPLICAS)} réplicas sincronizadas.")
+    elif args.comando == "criar-shards":
+        if not shards:
+            parser.error("nenhum shard configurado em DATABASE_SHARDS")
+        asyncio.run(criar_shards())
+        print(f"{len(shards)} shards prontos.")
+    elif args.comando == "arquivar-pedidos":
+        if arquivo is None:
+            parser.error("nenhum banco de arquivo configurado em DATABASE_ARQUIVO")
+        arquivados, conflitos = asyncio.run(arquivar(args.dias, args.lote))
+        print(f"{arquivados} pedidos arquivados.")
+        if conflitos:
+            print(f"{len(conflitos)} pedidos não arquivados: o id já existe no arquivo com outros dados "
+                  f"(ids: {', '.join(map(str, conflitos))}).", file = sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
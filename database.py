@@ -0,0 +1,189 @@
+import asyncio
+import math
+import os
+import time
+import zlib
+from contextlib import AsyncExitStack
+from itertools import cycle
+from dotenv import load_dotenv
+from sqlalchemy import event, text, inspect
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from metricas import instrumentar_engine
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///banco.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# conexões abertas na inicialização de cada worker (0 desativa)
+DB_POOL_AQUECER = int(os.getenv("DB_POOL_AQUECER", DB_POOL_SIZE))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+# valor negativo = tamanho em KiB (padrão ~64MB por conexão)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -65536))
+
+# réplicas somente leitura (URLs separadas por vírgula): as rotas GET leem delas, o resto usa DATABASE_URL
+DATABASE_REPLICAS = [url.strip() for url in os.getenv("DATABASE_REPLICAS", "").split(",") if url.strip()]
+# depois de uma escrita, por quantos segundos o mesmo cliente continua lendo do primário (read-your-writes),
+# cobrindo o atraso de replicação
+REPLICAS_ADERENCIA = float(os.getenv("REPLICAS_ADERENCIA", 5))
+COOKIE_ADERENCIA = "ler_primario_ate"
+
+# shards (URLs separadas por vírgula): pedidos, itens, eventos, agregados de vendas e chaves de idempotência
+# ficam no shard do usuário dono do pedido; usuários continuam em DATABASE_URL
+DATABASE_SHARDS = [url.strip() for url in os.getenv("DATABASE_SHARDS", "").split(",") if url.strip()]
+TABELAS_SHARD = ("pedidos", "itens_pedido", "eventos_pedido", "vendas_dia", "vendas_usuario", "vendas_item", "chaves_idempotencia")
+# o shard k gera ids (pedidos, itens e eventos) a partir de k << SHARD_BITS: os ids continuam únicos e
+# o shard de um registro sai do próprio id
+SHARD_BITS = 40
+
+# banco de arquivo: pedidos fechados antigos (e seus itens) são movidos para ele por `cli.py arquivar-pedidos`,
+# mantendo as tabelas quentes do tamanho dos pedidos em aberto; um só arquivo para todos os shards
+DATABASE_ARQUIVO = os.getenv("DATABASE_ARQUIVO", "")
+TABELAS_ARQUIVO = ("pedidos", "itens_pedido")
+
+# INSERT ... ON CONFLICT de cada banco suportado, usado nos agregados de vendas e no arquivamento
+INSERTS_ON_CONFLICT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def configurar_sqlite(dbapi_connection, connection_record, somente_leitura=False):
+    # WAL permite leitores concorrentes com um escritor; busy_timeout faz o escritor esperar
+    # o lock em vez de falhar na hora com "database is locked"
+    cursor = dbapi_connection.cursor()
+    if somente_leitura:
+        # réplica: qualquer escrita falha em vez de divergir do primário
+        cursor.execute("PRAGMA query_only=ON")
+    else:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+def criar_engine(url, somente_leitura=False):
+    opcoes = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if ":memory:" not in url:
+        opcoes["pool_size"] = DB_POOL_SIZE
+        opcoes["max_overflow"] = DB_MAX_OVERFLOW
+    engine = create_async_engine(url, **opcoes)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect",
+                     lambda dbapi_connection, connection_record: configurar_sqlite(dbapi_connection, connection_record, somente_leitura))
+    instrumentar_engine(engine)
+    return engine
+
+db = criar_engine(DATABASE_URL)
+replicas = [criar_engine(url, somente_leitura=True) for url in DATABASE_REPLICAS]
+_proxima_replica = cycle(replicas)
+shards = [criar_engine(url) for url in DATABASE_SHARDS]
+arquivo = criar_engine(DATABASE_ARQUIVO) if DATABASE_ARQUIVO else None
+engines = [db, *replicas, *shards, *([arquivo] if arquivo is not None else [])]
+
+class SessaoRoteada(Session):
+    """Sessão que escolhe a engine a cada comando: com `info["arquivo"]`, pedidos e itens vão para o banco de
+    arquivo; tabelas de pedidos vão para o shard em `info["shard"]` (com shards configurados); nas demais, com
+    uma réplica em `info["replica"]`, as leituras vão para ela e escritas (flush, INSERT/UPDATE/DELETE) sempre
+    vão para o primário."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("arquivo") and mapper is not None and mapper.local_table.name in TABELAS_ARQUIVO:
+            return arquivo.sync_engine
+        if shards and mapper is not None and mapper.local_table.name in TABELAS_SHARD:
+            shard = self.info.get("shard")
+            if shard is None:
+                raise RuntimeError(f"Sessão sem shard definido para a tabela {mapper.local_table.name}.")
+            return shard.sync_engine
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["escreveu"] = True
+            return db.sync_engine
+        replica = self.info.get("replica")
+        return replica.sync_engine if replica is not None else db.sync_engine
+
+@event.listens_for(SessaoRoteada, "after_commit")
+def _aderir_ao_primario(session):
+    # a requisição gravou algo: as próximas leituras do mesmo cliente vão ao primário por REPLICAS_ADERENCIA
+    # segundos. Fica num cookie para valer em qualquer worker (ou instância) que atender o cliente.
+    resposta = session.info.get("resposta_http")
+    if session.info.pop("escreveu", False) and replicas and resposta is not None:
+        resposta.set_cookie(COOKIE_ADERENCIA, f"{time.time() + REPLICAS_ADERENCIA:.3f}", max_age=math.ceil(REPLICAS_ADERENCIA),
+                            httponly=True, samesite="lax")
+
+def escolher_replica(cookies):
+    """Próxima réplica (rodízio), ou None se não há réplicas ou se o cliente escreveu há pouco."""
+    if not replicas:
+        return None
+    try:
+        if float(cookies.get(COOKIE_ADERENCIA, 0)) > time.time():
+            return None
+    except ValueError:
+        pass
+    return next(_proxima_replica)
+
+def usar_primario(session):
+    """Faz as próximas leituras da sessão irem ao primário (ex.: quando a réplica pode estar atrasada)."""
+    session.info.pop("replica", None)
+
+def shard_do_usuario(id_usuario):
+    if not shards:
+        return None
+    return shards[zlib.crc32(str(id_usuario).encode()) % len(shards)]
+
+def shard_do_id(id_registro):
+    """Shard em que o pedido, item ou evento foi criado, pela faixa do id (None fora das faixas)."""
+    if not shards:
+        return None
+    indice = id_registro >> SHARD_BITS
+    return shards[indice] if 0 <= indice < len(shards) else None
+
+def usar_shard(session, shard):
+    session.info["shard"] = shard
+
+def dialeto_de(session, modelo):
+    """Nome do dialeto do banco em que a sessão grava `modelo` (shard, arquivo ou primário)."""
+    return session.get_bind(mapper=inspect(modelo)).dialect.name
+
+def insert_on_conflict(dialeto, modelo):
+    return INSERTS_ON_CONFLICT[dialeto](modelo)
+
+def verificar_dialetos():
+    """Falha na inicialização se algum banco configurado não tem INSERT ... ON CONFLICT (SQLite e PostgreSQL têm)
+    ou se algum shard não é SQLite."""
+    for engine in engines:
+        if engine.dialect.name not in INSERTS_ON_CONFLICT:
+            raise RuntimeError(f"Banco não suportado ({engine.dialect.name}): use SQLite ou PostgreSQL.")
+    for shard in shards:
+        # as faixas de ids dos shards são semeadas no sqlite_sequence (cli.py criar-shards) e começam em
+        # k << SHARD_BITS, acima do INTEGER de 32 bits do PostgreSQL
+        if shard.dialect.name != "sqlite":
+            raise RuntimeError(f"DATABASE_SHARDS só suporta bancos SQLite ({shard.dialect.name} configurado).")
+
+SessionLocal = async_sessionmaker(bind=db, sync_session_class=SessaoRoteada, expire_on_commit=False)
+
+async def em_cada_shard(session, operacao):
+    """Executa `operacao(sessao)` em todos os shards, em paralelo (uma sessão por shard), e devolve a lista
+    de resultados. Sem shards, executa uma vez com a própria `session`."""
+    if not shards:
+        return [await operacao(session)]
+
+    async def executar(shard):
+        async with SessionLocal(info={"shard": shard}) as sessao_shard:
+            return await operacao(sessao_shard)
+    return await asyncio.gather(*(executar(shard) for shard in shards))
+
+async def aquecer_pool(quantidade=DB_POOL_AQUECER):
+    """Abre `quantidade` conexões ao mesmo tempo (aplicando os pragmas) em cada engine e as devolve ao pool,
+    para que as primeiras requisições não paguem a abertura da conexão."""
+    for engine in engines:
+        async with AsyncExitStack() as conexoes:
+            for _ in range(min(quantidade, 1) if ":memory:" in str(engine.url) else quantidade):
+                conexao = await conexoes.enter_async_context(engine.connect())
+                await conexao.execute(text("SELECT 1"))
+
+async def fechar_conexoes():
+    for engine in engines:
+        await engine.dispose()
@@ -1,26 +1,83 @@
-from sqlalchemy.orm import sessionmaker, Session
-from fastapi import Depends, HTTPException
-from models import db
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, Request, Response
+from database import SessionLocal, escolher_replica, usar_primario
 from models import Usuario
 from jose import jwt, JWTError
-from main import SECRET_KEY, ALGORITHM, oauth2_schema
+from main import SECRET_KEY, ALGORITHM, TOKEN_EMBUTIR_CLAIMS, oauth2_schema
+from metricas import medir_fase
 
-def pegar_sessao():
-    try:
-        Session = sessionmaker(bind=db)
-        session = Session()
+CACHE_USUARIOS_TTL = float(os.getenv("CACHE_USUARIOS_TTL", 30))
+CACHE_USUARIOS_MAX = int(os.getenv("CACHE_USUARIOS_MAX", 10000))
+
+@dataclass(frozen=True)
+class UsuarioAutenticado:
+    id: int
+    admin: bool
+    ativo: bool
+
+# cache LRU com TTL dos usuários autenticados, por id: evita uma consulta ao banco em cada requisição
+_cache_usuarios = OrderedDict()
+
+def buscar_usuario_cache(id_usuario):
+    entrada = _cache_usuarios.get(id_usuario)
+    if entrada is None:
+        return None
+    usuario, expira_em = entrada
+    if expira_em < time.monotonic():
+        del _cache_usuarios[id_usuario]
+        return None
+    _cache_usuarios.move_to_end(id_usuario)
+    return usuario
+
+def guardar_usuario_cache(usuario):
+    _cache_usuarios[usuario.id] = (usuario, time.monotonic() + CACHE_USUARIOS_TTL)
+    _cache_usuarios.move_to_end(usuario.id)
+    while len(_cache_usuarios) > CACHE_USUARIOS_MAX:
+        _cache_usuarios.popitem(last=False)
+
+def invalidar_usuario(id_usuario):
+    _cache_usuarios.pop(id_usuario, None)
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_usuario_alterado(mapper, connection, usuario):
+    invalidar_usuario(usuario.id)
+
+async def pegar_sessao(request: Request, response: Response):
+    async with SessionLocal() as session:
+        session.info["resposta_http"] = response
+        # GET/HEAD leem das réplicas (se configuradas), salvo logo depois de uma escrita do mesmo cliente
+        if request.method in ("GET", "HEAD"):
+            session.info["replica"] = escolher_replica(request.cookies)
         yield session
-    finally:
-        session.close()
 
-def verificar_token(token: str = Depends(oauth2_schema), session: Session = Depends(pegar_sessao)):
+async def verificar_token(token: str = Depends(oauth2_schema), session: AsyncSession = Depends(pegar_sessao)):
     try:
-        dic_info = jwt.decode(token,SECRET_KEY, ALGORITHM)
+        with medir_fase("jwt"):
+            dic_info = jwt.decode(token,SECRET_KEY, ALGORITHM)
         id_usuario = int(dic_info.get("sub"))
     except JWTError:
         raise HTTPException(status_code = 401, detail = "Acesso negado, verifique a validade do token.")
-    usuario = session.query(Usuario).filter(Usuario.id==id_usuario).first()
-    if not usuario:
+    if TOKEN_EMBUTIR_CLAIMS and "admin" in dic_info and "ativo" in dic_info:
+        return UsuarioAutenticado(id_usuario, dic_info["admin"], dic_info["ativo"])
+    usuario = buscar_usuario_cache(id_usuario)
+    if usuario:
+        return usuario
+    with medir_fase("usuario"):
+        consulta = select(Usuario.id, Usuario.admin, Usuario.ativo).filter(Usuario.id==id_usuario)
+        linha = (await session.execute(consulta)).first()
+        if not linha and session.info.get("replica") is not None:
+            # conta recém-criada que ainda não chegou à réplica
+            usar_primario(session)
+            linha = (await session.execute(consulta)).first()
+    if not linha:
         raise HTTPException(status_code = 401, detail = "Acesso inválido.")   
+    usuario = UsuarioAutenticado(linha.id, bool(linha.admin), bool(linha.ativo))
+    guardar_usuario_cache(usuario)
     return usuario
 
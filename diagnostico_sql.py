@@ -0,0 +1,112 @@
+"""Diagnóstico de SQL para desenvolvimento (ativado com DEBUG_SQL=true).
+
+Registra no log as queries mais lentas que DEBUG_SQL_LENTA_MS, com o plano de execução (EXPLAIN QUERY PLAN),
+e aponta como provável N+1 toda query idêntica repetida DEBUG_SQL_REPETICOES vezes ou mais na mesma requisição.
+
+Para testes, `limitar_queries(maximo)` falha se o bloco executar mais queries que o permitido (ver
+tests/test_consultas.py):
+
+    with limitar_queries(2):
+        await cliente.get("/pedidos/pedido/1", headers=cabecalhos)
+"""
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+DEBUG_SQL_LENTA_MS = float(os.getenv("DEBUG_SQL_LENTA_MS", 50))
+DEBUG_SQL_REPETICOES = int(os.getenv("DEBUG_SQL_REPETICOES", 5))
+
+logger = logging.getLogger("diagnostico_sql")
+
+_statements_requisicao = ContextVar("statements_requisicao", default=None)
+
+def _plano_execucao(conn, statement, parameters):
+    prefixo = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # cursor do DBAPI direto, para que o EXPLAIN não dispare os próprios eventos do SQLAlchemy
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefixo + statement, parameters)
+        return "\n".join(" | ".join(str(coluna) for coluna in linha) for linha in cursor.fetchall())
+    except Exception as erro:
+        return f"(plano indisponível: {erro})"
+    finally:
+        cursor.close()
+
+def _antes_query(conn, cursor, statement, parameters, context, executemany):
+    context._diagnostico_inicio = time.perf_counter()
+
+def _depois_query(conn, cursor, statement, parameters, context, executemany):
+    duracao_ms = (time.perf_counter() - context._diagnostico_inicio) * 1000
+    statements = _statements_requisicao.get()
+    if statements is not None:
+        statements[statement] += 1
+    if duracao_ms >= DEBUG_SQL_LENTA_MS:
+        plano = "(executemany)" if executemany else _plano_execucao(conn, statement, parameters)
+        logger.warning("Query lenta (%.1f ms):\n%s\nParâmetros: %r\nPlano:\n%s", duracao_ms, statement, parameters, plano)
+
+class DiagnosticoSQLMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        statements = Counter()
+        token = _statements_requisicao.set(statements)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _statements_requisicao.reset(token)
+            for statement, repeticoes in statements.items():
+                if repeticoes >= DEBUG_SQL_REPETICOES:
+                    logger.warning("Provável N+1 em %s %s: query repetida %d vezes:\n%s",
+                                   scope["method"], scope["path"], repeticoes, statement)
+
+def ativar_diagnostico(app, *engines):
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", _antes_query)
+        event.listen(engine.sync_engine, "after_cursor_execute", _depois_query)
+    app.add_middleware(DiagnosticoSQLMiddleware)
+    logger.warning("Diagnóstico de SQL ativo (lenta >= %.0f ms, N+1 >= %d repetições).", DEBUG_SQL_LENTA_MS, DEBUG_SQL_REPETICOES)
+
+class ContadorQueries:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def total(self):
+        return len(self.statements)
+
+@contextmanager
+def contar_queries(engine=None):
+    """Conta todas as queries executadas durante o bloco (independente de requisição ou thread) no `engine` ou,
+    por padrão, em todos os bancos configurados (primário, réplicas, shards e arquivo)."""
+    if engine is None:
+        from database import engines
+    else:
+        engines = [engine]
+    contador = ContadorQueries()
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        contador.statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", contar)
+    try:
+        yield contador
+    finally:
+        for engine in engines:
+            event.remove(engine.sync_engine, "before_cursor_execute", contar)
+
+@contextmanager
+def limitar_queries(maximo, engine=None):
+    """Helper de teste: levanta AssertionError se o bloco executar mais de `maximo` queries."""
+    with contar_queries(engine) as contador:
+        yield contador
+    if contador.total > maximo:
+        raise AssertionError(f"{contador.total} queries executadas (máximo {maximo}):\n" + "\n".join(contador.statements))
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import os
+from collections import deque
+from sqlalchemy import text
+from database import SessionLocal, db
+from eventos import marca_eventos, descartar_eventos
+
+# commit em grupo (opcional): as alterações de pedidos de requisições simultâneas são aplicadas por uma
+# única tarefa escritora por banco, cada uma em um SAVEPOINT da mesma transação, confirmada a cada
+# GRUPO_COMMIT_MAX operações ou GRUPO_COMMIT_MS milissegundos. A requisição só recebe a resposta depois
+# do commit do seu lote: a durabilidade é a mesma do commit individual.
+GRUPO_COMMIT = os.getenv("GRUPO_COMMIT", "false").lower() == "true"
+GRUPO_COMMIT_MAX = int(os.getenv("GRUPO_COMMIT_MAX", 64))
+GRUPO_COMMIT_MS = float(os.getenv("GRUPO_COMMIT_MS", 5))
+
+class EscritorEmGrupo:
+    def __init__(self, shard, maximo=GRUPO_COMMIT_MAX, espera_ms=GRUPO_COMMIT_MS):
+        self.shard = shard
+        self.maximo = maximo
+        self.espera = espera_ms / 1000
+        self.pendentes = deque()
+        self.chegou = asyncio.Event()
+        self.ocioso = asyncio.Event()
+        self.tarefa = None
+
+    async def executar(self, operacao):
+        futuro = asyncio.get_running_loop().create_future()
+        self.pendentes.append((operacao, futuro))
+        self.ocioso.clear()
+        self.chegou.set()
+        if self.tarefa is None or self.tarefa.done():
+            # criada dentro da primeira requisição, a tarefa copiaria o contexto dela (medição de métricas,
+            # contador de queries do DEBUG_SQL) e todos os lotes seguintes seriam contados nessa requisição
+            self.tarefa = asyncio.create_task(self._rodar(), context=contextvars.Context())
+        return await futuro
+
+    async def _rodar(self):
+        while True:
+            if not self.pendentes:
+                self.chegou.clear()
+                self.ocioso.set()
+                await self.chegou.wait()
+            await self._confirmar_lote()
+
+    async def encerrar(self):
+        """Confirma as operações que ainda estão na fila (e o lote em andamento) e para a tarefa."""
+        if self.tarefa is None:
+            return
+        if not self.tarefa.done():
+            await self.ocioso.wait()
+        self.tarefa.cancel()
+
+    async def _confirmar_lote(self):
+        loop = asyncio.get_running_loop()
+        engine = self.shard or db
+        concluidas = []
+        async with SessionLocal(info={"shard": self.shard}) as sessao:
+            try:
+                if engine.dialect.name == "sqlite":
+                    # o driver do SQLite não abre a transação antes de um SAVEPOINT (e o RELEASE do primeiro
+                    # confirmaria cada operação sozinha): a transação do lote é aberta aqui, já com o lock de escrita
+                    await sessao.execute(text("BEGIN IMMEDIATE"), bind_arguments={"bind": engine.sync_engine})
+                prazo = loop.time() + self.espera
+                while len(concluidas) < self.maximo:
+                    if not self.pendentes:
+                        restante = prazo - loop.time()
+                        if restante <= 0:
+                            break
+                        self.chegou.clear()
+                        try:
+                            await asyncio.wait_for(self.chegou.wait(), restante)
+                        except TimeoutError:
+                            break
+                        continue
+                    operacao, futuro = self.pendentes.popleft()
+                    concluidas.append((futuro, await self._aplicar(sessao, operacao)))
+                await sessao.commit()
+            except Exception as erro:
+                # sem commit, nenhuma operação do lote foi gravada; se nem a transação abriu, as que aguardam
+                # recebem o erro (em vez de o escritor tentar de novo sem parar)
+                if not concluidas:
+                    concluidas = [(futuro, None) for _, futuro in self.pendentes]
+                    self.pendentes.clear()
+                for futuro, _ in concluidas:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+                return
+        for futuro, (erro, resultado) in concluidas:
+            if futuro.done():
+                continue
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+    async def _aplicar(self, sessao, operacao):
+        """Executa a operação em um SAVEPOINT: se ela falhar, só as suas alterações (e eventos) são desfeitas."""
+        marca = marca_eventos(sessao)
+        try:
+            async with sessao.begin_nested():
+                resultado = await operacao(sessao)
+        except Exception as erro:
+            descartar_eventos(sessao, marca)
+            return erro, None
+        # os objetos da resposta saem da sessão, para que o SAVEPOINT de outra operação não os expire
+        sessao.expunge_all()
+        return None, resultado
+
+_escritores = {}
+
+async def confirmar(session, operacao):
+    """Executa `operacao(sessao)` (que faz as alterações na sessão recebida e devolve a resposta, sem commit)
+    e confirma a transação. No modo normal usa a própria `session`; com GRUPO_COMMIT a operação vai para o
+    escritor do banco (ou shard) da sessão e é confirmada junto com as de outras requisições."""
+    if not GRUPO_COMMIT:
+        resultado = await operacao(session)
+        await session.commit()
+        return resultado
+    shard = session.info.get("shard")
+    escritor = _escritores.get(shard)
+    if escritor is None:
+        escritor = _escritores[shard] = EscritorEmGrupo(shard)
+    # a sessão da requisição só leu: o commit devolve a conexão ao pool antes de esperar o lote (senão as
+    # requisições na fila ocupariam o pool de que o escritor precisa) e a marca para a aderência às réplicas
+    session.info["escreveu"] = True
+    await session.commit()
+    return await escritor.executar(operacao)
+
+async def encerrar_escritores():
+    await asyncio.gather(*(escritor.encerrar() for escritor in _escritores.values()))
+    _escritores.clear()
@@ -0,0 +1,81 @@
+from dataclasses import dataclass, field
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import select, update, false, func
+from database import SessionLocal, arquivo
+from models import Pedido
+
+PENDENTE = "PENDENTE"
+CONCLUIDO = "CONCLUIDO"
+CANCELADO = "CANCELADO"
+
+@dataclass(frozen=True)
+class Transicao:
+    origens: frozenset
+    destino: Optional[str]
+    somente_admin: bool = False
+    # estado final: grava Pedido.fechado_em, usado nos relatórios de vendas
+    fecha_pedido: bool = False
+    # mensagem do erro 409 quando o pedido está em um status fora de `origens`
+    mensagens: dict = field(default_factory=dict)
+    mensagem_autorizacao: str = "Você não tem autorização para fazer essa operação."
+
+# máquina de estados dos pedidos: ação -> status de origem aceitos e status de destino.
+# destino None mantém o status (usado para alterar itens de um pedido ainda aberto).
+# Para um novo estado basta incluir as ações que entram e saem dele aqui.
+TRANSICOES = {
+    "cancelar": Transicao(
+        origens = frozenset({PENDENTE}),
+        destino = CANCELADO,
+        fecha_pedido = True,
+        mensagens = {CANCELADO: "Pedido já CANCELADO anteriormente!", CONCLUIDO: "Pedido CONCLUIDO!"},
+        mensagem_autorizacao = "Você não tem autorização para cancelar esse pedido!",
+    ),
+    "finalizar": Transicao(
+        origens = frozenset({PENDENTE}),
+        destino = CONCLUIDO,
+        somente_admin = True,
+        fecha_pedido = True,
+        mensagens = {CANCELADO: "Pedido CANCELADO!", CONCLUIDO: "Pedido já estava CONCLUIDO anteriormente!"},
+        mensagem_autorizacao = "Você não tem autorização para fazer essa operação!",
+    ),
+    "alterar_itens": Transicao(
+        origens = frozenset({PENDENTE}),
+        destino = None,
+        mensagens = {CANCELADO: "Pedido CANCELADO!", CONCLUIDO: "Pedido CONCLUIDO!"},
+    ),
+}
+
+async def aplicar_transicao(session, acao, id_pedido, usuario, opcoes=(), **valores):
+    """Aplica a ação em um único UPDATE ... WHERE id = ? AND status IN (...) RETURNING, já com a checagem
+    de permissão, de modo que duas requisições concorrentes não passam ambas pela validação.
+    `valores` são gravados no mesmo UPDATE (ex.: o novo total do pedido). Retorna o Pedido atualizado."""
+    transicao = TRANSICOES[acao]
+    condicoes = [Pedido.id == id_pedido, Pedido.status.in_(transicao.origens)]
+    if not usuario.admin:
+        condicoes.append(false() if transicao.somente_admin else Pedido.usuario == usuario.id)
+    if transicao.destino:
+        valores["status"] = transicao.destino
+    if transicao.fecha_pedido:
+        valores["fechado_em"] = func.current_timestamp()
+    valores["versao"] = Pedido.versao + 1
+
+    consulta = update(Pedido).filter(*condicoes).values(**valores).returning(Pedido).options(*opcoes)
+    pedido = (await session.scalars(consulta)).one_or_none()
+    if pedido is None:
+        await explicar_falha(session, transicao, id_pedido)
+    return pedido
+
+async def explicar_falha(session, transicao, id_pedido):
+    # só no caminho de erro: descobre qual condição do UPDATE falhou para devolver a mensagem correta
+    linha = (await session.execute(select(Pedido.status).filter(Pedido.id == id_pedido))).first()
+    if not linha and arquivo is not None:
+        # pedido arquivado: está fechado, e a mensagem é a do seu status
+        async with SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+            linha = (await sessao_arquivo.execute(select(Pedido.status).filter(Pedido.id == id_pedido))).first()
+    if not linha:
+        raise HTTPException(status_code = 400, detail = "Pedido não encontrado!")
+    if linha.status not in transicao.origens:
+        # o pedido existe, mas o seu status não permite a operação (ex.: já fechado): conflito de estado
+        raise HTTPException(status_code = 409, detail = transicao.mensagens.get(linha.status, f"Pedido {linha.status}!"))
+    raise HTTPException(status_code = 401, detail = transicao.mensagem_autorizacao)
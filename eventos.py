@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from database import SessionLocal, shards, SHARD_BITS, em_cada_shard
+from models import EventoPedido
+
+# cada alteração de pedido grava uma linha em eventos_pedido (outbox) na mesma transação. Cada worker
+# acompanha a tabela (por id, em cada partição) e repassa os eventos novos ao pub/sub em memória que
+# alimenta o stream (/pedidos/eventos), onde cada conexão tem a sua fila limitada: assim o stream recebe
+# as alterações feitas em qualquer worker; o commit no próprio worker só antecipa a leitura.
+# Consumidores externos leem o log por offset (/pedidos/eventos/log e cli.py).
+# Com shards o log é particionado: cada shard tem o seu, com ids crescentes dentro da sua faixa.
+EVENTOS_FILA_MAX = int(os.getenv("EVENTOS_FILA_MAX", 100))
+EVENTOS_HISTORICO = int(os.getenv("EVENTOS_HISTORICO", 1000))
+EVENTOS_KEEPALIVE = float(os.getenv("EVENTOS_KEEPALIVE", 15))
+EVENTOS_INTERVALO_MS = float(os.getenv("EVENTOS_INTERVALO_MS", 500))
+EVENTOS_LOTE = 500
+
+logger = logging.getLogger("eventos")
+
+_CHAVE_PENDENTES = "eventos_pendentes"
+PARTICOES = max(len(shards), 1)
+
+def particao(id_evento):
+    return id_evento >> SHARD_BITS
+
+def ler_posicoes(texto):
+    """Posição de retomada do stream (Last-Event-ID): o último id recebido de cada partição, separados por
+    vírgula (sem shards, um único id). None se o texto não corresponde às partições atuais."""
+    try:
+        posicoes = [int(parte) for parte in texto.split(",")]
+    except ValueError:
+        return None
+    return posicoes if len(posicoes) == PARTICOES else None
+
+def registrar_evento(session, tipo, pedido, **extras):
+    """Adiciona o evento à transação da sessão; ele só é publicado no stream se o commit acontecer."""
+    dados = {"id_pedido": pedido.id, "status": pedido.status, "usuario": pedido.usuario, "preco": float(pedido.preco), **extras}
+    evento = EventoPedido(tipo, pedido.id, pedido.usuario, dados)
+    session.add(evento)
+    session.info.setdefault(_CHAVE_PENDENTES, []).append(evento)
+    return evento
+
+def marca_eventos(session):
+    return len(session.info.get(_CHAVE_PENDENTES, ()))
+
+def descartar_eventos(session, marca):
+    """Descarta os eventos registrados depois de `marca` (ex.: num SAVEPOINT desfeito)."""
+    del session.info.get(_CHAVE_PENDENTES, [])[marca:]
+
+@event.listens_for(Session, "after_commit")
+def _publicar_pendentes(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, [])
+    if not pendentes:
+        return
+    if canal_eventos.acompanhando_log():
+        # os eventos chegam ao stream pela leitura do log, na ordem dos ids, junto com os de outros workers
+        canal_eventos.acordar()
+    else:
+        # fora do servidor (ex.: cli.py, ou sem o lifespan) não há leitura do log: publica direto
+        for evento in pendentes:
+            canal_eventos.publicar(evento)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendentes(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+async def ler_eventos(session, offset, limite):
+    """Eventos com id maior que `offset`, em ordem. Como o SQLite tem um único escritor por vez, os ids
+    ficam visíveis em ordem crescente e o último id lido pode ser usado como offset da próxima leitura."""
+    consulta = (select(EventoPedido.id, EventoPedido.tipo, EventoPedido.pedido, EventoPedido.usuario, EventoPedido.dados,
+                       EventoPedido.criado_em)
+                .filter(EventoPedido.id > offset).order_by(EventoPedido.id).limit(limite))
+    return (await session.execute(consulta)).all()
+
+async def ultimo_evento_id(session, usuario=None):
+    """Id do último evento (de todos os pedidos ou só dos pedidos de `usuario`), ou 0. O MAX lê só a última
+    entrada do índice: o da chave primária ou, por usuário, o de (usuario, id)."""
+    consulta = select(func.max(EventoPedido.id))
+    if usuario is not None:
+        consulta = consulta.filter(EventoPedido.usuario == usuario)
+    return await session.scalar(consulta) or 0
+
+async def ler_eventos_particoes(session, offsets, limite):
+    """ler_eventos em cada partição (shard), a partir do offset de cada uma."""
+    if not shards:
+        return [await ler_eventos(session, offsets[0], limite)]
+
+    async def ler(shard, offset):
+        async with SessionLocal(info={"shard": shard}) as sessao_shard:
+            return await ler_eventos(sessao_shard, offset, limite)
+    return await asyncio.gather(*(ler(shard, offset) for shard, offset in zip(shards, offsets)))
+
+def formatar_sse(evento, posicao):
+    return f"id: {posicao}\nevent: {evento.tipo}\ndata: {json.dumps(evento.dados)}\n\n"
+
+class Assinatura:
+    def __init__(self, filtro, posicoes=None, pendentes=()):
+        self.fila = asyncio.Queue(EVENTOS_FILA_MAX)
+        self.filtro = filtro
+        self.posicoes = posicoes
+        # eventos a reenviar antes dos novos (retomada por Last-Event-ID); None quando o histórico em
+        # memória não cobre o ponto de retomada e é preciso buscar no log (retomar_do_log)
+        self.pendentes = pendentes
+        self.retomada_incompleta = False
+        self.atrasada = False
+
+async def posicoes_atuais():
+    """Id do último evento de cada partição (o início da faixa do shard, se ela ainda não tem eventos)."""
+    async with SessionLocal() as session:
+        ultimos = await em_cada_shard(session, ultimo_evento_id)
+    return [ultimo or indice << SHARD_BITS for indice, ultimo in enumerate(ultimos)]
+
+class CanalEventos:
+    def __init__(self, historico=EVENTOS_HISTORICO):
+        self.ultimo_id = 0
+        self.historico = deque(maxlen=historico)
+        self.assinaturas = set()
+        self.offsets = None
+        self.novos = None
+        self.tarefa = None
+
+    def acompanhando_log(self):
+        return self.tarefa is not None and not self.tarefa.done()
+
+    async def iniciar(self):
+        """Começa a acompanhar o log a partir do último evento de cada partição (chamado no lifespan de cada worker)."""
+        self.offsets = await posicoes_atuais()
+        self.novos = asyncio.Event()
+        self.tarefa = asyncio.create_task(self._acompanhar_log())
+
+    async def parar(self):
+        if self.tarefa is not None:
+            self.tarefa.cancel()
+            try:
+                await self.tarefa
+            except asyncio.CancelledError:
+                pass
+            self.tarefa = None
+
+    def acordar(self):
+        self.novos.set()
+
+    async def _acompanhar_log(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.novos.wait(), EVENTOS_INTERVALO_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self.novos.clear()
+            try:
+                await self.ler_log()
+            except Exception:
+                # banco indisponível ou ocupado: os offsets não avançam e a próxima leitura tenta de novo
+                logger.exception("Falha ao ler o log de eventos")
+
+    async def ler_log(self):
+        """Publica os eventos gravados (por qualquer worker) depois dos offsets lidos e avança os offsets."""
+        while True:
+            async with SessionLocal() as session:
+                particoes = await ler_eventos_particoes(session, self.offsets, EVENTOS_LOTE)
+            for indice, eventos in enumerate(particoes):
+                for evento in eventos:
+                    self.publicar(evento)
+                if eventos:
+                    self.offsets[indice] = eventos[-1].id
+            if all(len(eventos) < EVENTOS_LOTE for eventos in particoes):
+                return
+
+    def publicar(self, evento):
+        self.ultimo_id = max(self.ultimo_id, evento.id)
+        self.historico.append(evento)
+        for assinatura in list(self.assinaturas):
+            if not assinatura.filtro(evento):
+                continue
+            try:
+                assinatura.fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # cliente lento: não segura memória nem os demais assinantes; a conexão é encerrada
+                # depois de esvaziar a fila e o cliente retoma pelo último id recebido
+                assinatura.atrasada = True
+                self.assinaturas.discard(assinatura)
+
+    def assinar(self, filtro, posicoes=None):
+        if posicoes is None:
+            assinatura = Assinatura(filtro)
+        elif PARTICOES == 1 and self.historico and self.historico[0].id <= posicoes[0] + 1 <= self.ultimo_id + 1:
+            assinatura = Assinatura(filtro, posicoes, [evento for evento in self.historico if evento.id > posicoes[0] and filtro(evento)])
+        else:
+            # ponto de retomada anterior ao histórico em memória (ou ao início do processo); com shards a
+            # retomada sempre lê o log de cada partição
+            assinatura = Assinatura(filtro, posicoes, None)
+        self.assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        self.assinaturas.discard(assinatura)
+
+    def encerrar(self):
+        """Desligamento do servidor: cada conexão termina depois de enviar o que já está na sua fila, em vez de
+        segurar o desligamento até o prazo; os clientes reconectam (com Last-Event-ID) em outro processo."""
+        for assinatura in list(self.assinaturas):
+            assinatura.atrasada = True
+            try:
+                # acorda a conexão que está esperando na fila vazia
+                assinatura.fila.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self.assinaturas.clear()
+
+    async def transmitir(self, assinatura):
+        try:
+            yield "retry: 3000\n\n"
+            if assinatura.retomada_incompleta:
+                yield "event: recarregar\ndata: {}\n\n"
+            # último id enviado de cada partição: vai no "id:" de cada evento e volta como Last-Event-ID
+            posicoes = list(assinatura.posicoes or (indice << SHARD_BITS for indice in range(PARTICOES)))
+            for evento in assinatura.pendentes:
+                posicoes[particao(evento.id)] = evento.id
+                yield formatar_sse(evento, ",".join(map(str, posicoes)))
+            while not (assinatura.atrasada and assinatura.fila.empty()):
+                try:
+                    evento = await asyncio.wait_for(assinatura.fila.get(), EVENTOS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # comentário SSE: mantém a conexão viva atrás de proxies
+                    yield ": keepalive\n\n"
+                    continue
+                if evento is None:
+                    continue
+                # eventos que chegaram enquanto o log era lido já foram enviados na retomada
+                if evento.id > posicoes[particao(evento.id)]:
+                    posicoes[particao(evento.id)] = evento.id
+                    yield formatar_sse(evento, ",".join(map(str, posicoes)))
+        finally:
+            self.cancelar(assinatura)
+
+async def retomar_do_log(session, assinatura):
+    """Completa a retomada de uma assinatura a partir da tabela de eventos. Se houver mais eventos
+    que o limite do histórico, o cliente recebe "recarregar" e segue apenas com os novos."""
+    particoes = await ler_eventos_particoes(session, assinatura.posicoes, EVENTOS_HISTORICO + 1)
+    if any(len(eventos) > EVENTOS_HISTORICO for eventos in particoes):
+        assinatura.pendentes = []
+        assinatura.retomada_incompleta = True
+    else:
+        # entre partições não há ordem de id: intercala pela data de criação
+        eventos = sorted((evento for eventos in particoes for evento in eventos), key=lambda evento: (evento.criado_em, evento.id))
+        assinatura.pendentes = [evento for evento in eventos if assinatura.filtro(evento)]
+
+canal_eventos = CanalEventos()
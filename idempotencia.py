@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Optional
+from fastapi import Depends, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from dependencies import verificar_token, UsuarioAutenticado
+from models import ChaveIdempotencia
+from escrita import confirmar
+
+# repetições de uma requisição com o mesmo Idempotency-Key devolvem a resposta gravada em vez de
+# executar a operação de novo. A chave é gravada na mesma transação da operação.
+IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", 86400))
+# a cada quantas chaves gravadas as chaves vencidas são apagadas
+IDEMPOTENCIA_LIMPEZA = int(os.getenv("IDEMPOTENCIA_LIMPEZA", 1000))
+
+_travas = {}
+_gravadas = 0
+
+class Idempotencia:
+    def __init__(self, usuario, chave, impressao, response):
+        self.usuario = usuario
+        self.chave_cliente = chave
+        # gravada por usuário: chaves iguais de usuários diferentes não se misturam
+        self.chave = f"{usuario}:{chave}"
+        self.impressao = impressao
+        self.response = response
+        # a chave já existia, mas vencida: é apagada na transação que grava a nova
+        self.vencida = False
+
+    def para_usuario_alvo(self, id_alvo):
+        """Pedido criado para outro usuário (pedido-admin): a chave é gravada no shard desse usuário, então
+        passa a valer por usuário alvo. Uma repetição (mesmo corpo, mesmo alvo) sempre a encontra; o prefixo
+        "usuario>alvo" não coincide com as chaves "usuario:" das requisições do próprio usuário alvo."""
+        self.chave = f"{self.usuario}>{id_alvo}:{self.chave_cliente}"
+
+async def pegar_idempotencia(request: Request, response: Response,
+                             idempotency_key: Annotated[Optional[str], Header(min_length=1, max_length=255)] = None,
+                             usuario: UsuarioAutenticado = Depends(verificar_token)):
+    if idempotency_key is None:
+        return None
+    # a mesma chave só vale para a mesma rota e o mesmo corpo
+    impressao = hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + await request.body()).hexdigest()
+    return Idempotencia(usuario.id, idempotency_key, impressao, response)
+
+@asynccontextmanager
+async def _travar(chave):
+    # repetições simultâneas no mesmo processo esperam a primeira terminar; entre processos, a chave
+    # primária da tabela garante que só uma transação é confirmada
+    trava = _travas.get(chave)
+    if trava is None:
+        trava = _travas[chave] = [asyncio.Lock(), 0]
+    trava[1] += 1
+    try:
+        async with trava[0]:
+            yield
+    finally:
+        trava[1] -= 1
+        if not trava[1]:
+            del _travas[chave]
+
+def _limite_validade():
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=IDEMPOTENCIA_TTL)
+
+async def _buscar_resposta(session, idempotencia):
+    registro = (await session.execute(select(ChaveIdempotencia.impressao, ChaveIdempotencia.resposta, ChaveIdempotencia.criado_em)
+                                      .filter(ChaveIdempotencia.chave == idempotencia.chave))).first()
+    if registro is None:
+        return None
+    if registro.criado_em < _limite_validade():
+        idempotencia.vencida = True
+        return None
+    if registro.impressao != idempotencia.impressao:
+        raise HTTPException(status_code = 422, detail = "Idempotency-Key já utilizada em outra requisição!")
+    idempotencia.response.headers["Idempotent-Replayed"] = "true"
+    return registro.resposta
+
+async def executar_idempotente(session, idempotencia, operacao):
+    """Executa `operacao(sessao)` (que faz as alterações na sessão recebida e devolve a resposta, sem commit)
+    e confirma a transação com escrita.confirmar. Com Idempotency-Key, a resposta é gravada junto na mesma
+    transação e as repetições recebem a resposta gravada. Respostas de erro não são gravadas: a operação
+    pode ser repetida."""
+    if idempotencia is None:
+        return await confirmar(session, operacao)
+
+    async def gravar(sessao):
+        global _gravadas
+        resposta = jsonable_encoder(await operacao(sessao))
+        if idempotencia.vencida:
+            await sessao.execute(delete(ChaveIdempotencia).filter(ChaveIdempotencia.chave == idempotencia.chave,
+                                                                  ChaveIdempotencia.criado_em < _limite_validade()))
+        sessao.add(ChaveIdempotencia(idempotencia.chave, idempotencia.impressao, resposta))
+        _gravadas += 1
+        if _gravadas % IDEMPOTENCIA_LIMPEZA == 0:
+            await sessao.execute(delete(ChaveIdempotencia).filter(ChaveIdempotencia.criado_em < _limite_validade()))
+        return resposta
+
+    async with _travar(idempotencia.chave):
+        resposta_gravada = await _buscar_resposta(session, idempotencia)
+        if resposta_gravada is not None:
+            return resposta_gravada
+        try:
+            return await confirmar(session, gravar)
+        except IntegrityError:
+            # outro processo gravou a mesma chave primeiro: descarta esta transação e devolve a resposta dele
+            await session.rollback()
+            resposta_gravada = await _buscar_resposta(session, idempotencia)
+            if resposta_gravada is None:
+                raise
+            return resposta_gravada
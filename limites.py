@@ -0,0 +1,91 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, Request
+from dependencies import verificar_token, UsuarioAutenticado
+
+# limites de taxa por token bucket, em memória (por processo): "N/S" permite rajadas de até N requisições
+# e repõe N fichas a cada S segundos
+LIMITES_ATIVOS = os.getenv("LIMITES_ATIVOS", "true").lower() == "true"
+LIMITES_MAX_BALDES = int(os.getenv("LIMITES_MAX_BALDES", 100000))
+
+class Limite:
+    def __init__(self, capacidade, segundos):
+        self.capacidade = capacidade
+        self.taxa = capacidade / segundos
+
+    @classmethod
+    def ler(cls, variavel, padrao):
+        capacidade, segundos = os.getenv(variavel, padrao).split("/")
+        return cls(int(capacidade), float(segundos))
+
+# rotas de pedidos, por usuário autenticado: cada rota tem o seu balde, configurável em LIMITE_<NOME>
+# (ex.: LIMITE_PEDIDOS_LISTAR); sem a variável, vale LIMITE_PEDIDOS_USUARIO
+LIMITE_PEDIDOS_USUARIO = os.getenv("LIMITE_PEDIDOS_USUARIO", "120/60")
+ROTAS_PEDIDOS = ("pedidos_inicio", "pedidos_criar", "pedidos_criar_admin", "pedidos_cancelar", "pedidos_finalizar",
+                 "pedidos_adicionar_item", "pedidos_adicionar_itens", "pedidos_remover_item", "pedidos_visualizar",
+                 "pedidos_listar", "pedidos_listar_usuario", "pedidos_exportar", "pedidos_exportar_usuario",
+                 "pedidos_eventos", "pedidos_eventos_log")
+
+LIMITES = {
+    "login_ip": Limite.ler("LIMITE_LOGIN_IP", "20/60"),
+    "login_email": Limite.ler("LIMITE_LOGIN_EMAIL", "5/60"),
+    "criar_conta_ip": Limite.ler("LIMITE_CRIAR_CONTA_IP", "5/60"),
+    "criar_conta_email": Limite.ler("LIMITE_CRIAR_CONTA_EMAIL", "5/60"),
+    **{nome: Limite.ler(f"LIMITE_{nome.upper()}", LIMITE_PEDIDOS_USUARIO) for nome in ROTAS_PEDIDOS},
+}
+
+class LimitadorTaxa:
+    """Baldes por chave num OrderedDict usado como LRU: consultar, repor e consumir é O(1), e acima de
+    `max_baldes` o balde usado há mais tempo é descartado (um balde ocioso já estaria cheio de novo)."""
+
+    def __init__(self, max_baldes=LIMITES_MAX_BALDES):
+        self.max_baldes = max_baldes
+        self.baldes = OrderedDict()
+        self.rejeitadas = {}
+
+    def consumir(self, nome, chave, limite):
+        """Consome uma ficha. Retorna 0 se a requisição pode seguir, ou os segundos até haver ficha."""
+        agora = time.monotonic()
+        balde = self.baldes.get((nome, chave))
+        if balde is None:
+            balde = self.baldes[(nome, chave)] = [limite.capacidade, agora]
+            if len(self.baldes) > self.max_baldes:
+                self.baldes.popitem(last=False)
+        else:
+            self.baldes.move_to_end((nome, chave))
+            balde[0] = min(limite.capacidade, balde[0] + (agora - balde[1]) * limite.taxa)
+            balde[1] = agora
+        if balde[0] >= 1:
+            balde[0] -= 1
+            return 0
+        self.rejeitadas[nome] = self.rejeitadas.get(nome, 0) + 1
+        return (1 - balde[0]) / limite.taxa
+
+limitador = LimitadorTaxa()
+
+def verificar_limite(nome, chave):
+    if not LIMITES_ATIVOS:
+        return
+    espera = limitador.consumir(nome, chave, LIMITES[nome])
+    if espera:
+        raise HTTPException(status_code = 429, detail = "Muitas requisições! Tente novamente mais tarde.",
+                            headers = {"Retry-After": str(math.ceil(espera))})
+
+def ip_cliente(request):
+    # atrás de proxy, rode o uvicorn com --proxy-headers para que este seja o IP real do cliente
+    return request.client.host if request.client else "desconhecido"
+
+def limitar_por_ip(nome):
+    async def dependencia(request: Request):
+        verificar_limite(nome, ip_cliente(request))
+    return dependencia
+
+def limitar_por_usuario(nome):
+    async def dependencia(usuario: UsuarioAutenticado = Depends(verificar_token)):
+        verificar_limite(nome, usuario.id)
+    return dependencia
+
+def metricas():
+    return {"baldes": len(limitador.baldes), "rejeitadas": dict(limitador.rejeitadas)}
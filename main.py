@@ -1,8 +1,11 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 import os
 from fastapi.security import OAuth2PasswordBearer
+from metricas import MetricasMiddleware
+from respostas import classe_resposta_json, CompressaoMiddleware
 
 load_dotenv()
 #para correto funcionamento do teste crie um arquivo .env e inclua os dados: "SECRET_KEY = QnDjPlQ0ZdRtzvbXwvzfDieNi5TqDXAT", "ALGORITHM = HS256", "ACCESS_TOKEN_EXPIRE_MINUTES = 30"
@@ -11,14 +14,55 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+# inclui "admin" e "ativo" no token, dispensando a consulta ao banco na verificação (mudanças só valem no próximo token)
+TOKEN_EMBUTIR_CLAIMS = os.getenv("TOKEN_EMBUTIR_CLAIMS", "false").lower() == "true"
+# modo de desenvolvimento: loga queries lentas (com plano de execução) e prováveis N+1
+DEBUG_SQL = os.getenv("DEBUG_SQL", "false").lower() == "true"
 
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    # roda em cada worker, depois do fork (servidor.py carrega o app antes, no processo principal):
+    # conexões e threads/processos não são compartilhados entre workers
+    from database import aquecer_pool as aquecer_banco, fechar_conexoes, verificar_dialetos, arquivo
+    from senhas import aquecer_pool as aquecer_senhas, encerrar_pool
+    from arquivamento import criar_tabelas_arquivo
+    from escrita import encerrar_escritores
+    from eventos import canal_eventos
+    verificar_dialetos()
+    if arquivo is not None:
+        await criar_tabelas_arquivo(arquivo)
+    await aquecer_banco()
+    await aquecer_senhas()
+    await canal_eventos.iniciar()
+    yield
+    # chamado depois que o servidor terminou as requisições em andamento
+    await canal_eventos.parar()
+    encerrar_pool()
+    await encerrar_escritores()
+    await fechar_conexoes()
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated = "auto")
+app = FastAPI(default_response_class=classe_resposta_json(), lifespan=ciclo_de_vida)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated = "auto", bcrypt__rounds = BCRYPT_ROUNDS)
 oauth2_schema = OAuth2PasswordBearer(tokenUrl="auth/login-form")
 
 from order_routes import order_router
 from auth_routes import auth_router
+from metrics_routes import metrics_router
+from report_routes import report_router
 
 app.include_router(order_router)
 app.include_router(auth_router)
+app.include_router(metrics_router)
+app.include_router(report_router)
+# a compressão fica dentro do middleware de métricas, para que seu tempo entre na latência medida
+app.add_middleware(CompressaoMiddleware)
+app.add_middleware(MetricasMiddleware)
+
+if DEBUG_SQL:
+    from database import engines
+    from diagnostico_sql import ativar_diagnostico
+    # todos os bancos: com réplicas, shards ou arquivo, as queries dos pedidos não passam pelo primário
+    ativar_diagnostico(app, *engines)
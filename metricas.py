@@ -0,0 +1,136 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import event
+
+LIMITES_HISTOGRAMA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    def __init__(self, limites=LIMITES_HISTOGRAMA):
+        self.limites = limites
+        self.series = {}
+
+    def observar(self, rotulos, valor):
+        serie = self.series.get(rotulos)
+        if serie is None:
+            serie = self.series[rotulos] = [[0] * (len(self.limites) + 1), 0.0]
+        serie[0][bisect_left(self.limites, valor)] += 1
+        serie[1] += valor
+
+    def exportar(self, nome, nomes_rotulos):
+        linhas = []
+        for rotulos, (contagens, soma) in sorted(self.series.items()):
+            base = ",".join(f'{chave}="{valor}"' for chave, valor in zip(nomes_rotulos, rotulos))
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), contagens):
+                acumulado += contagem
+                linhas.append(f'{nome}_bucket{{{base},le="{limite}"}} {acumulado}')
+            linhas.append(f"{nome}_sum{{{base}}} {soma}")
+            linhas.append(f"{nome}_count{{{base}}} {acumulado}")
+        return linhas
+
+class Medicao:
+    __slots__ = ("inicio", "fases", "queries", "tempo_db")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.fases = {}
+        self.queries = 0
+        self.tempo_db = 0.0
+
+    def server_timing(self):
+        partes = [f"total;dur={(time.perf_counter() - self.inicio) * 1000:.2f}",
+                  f'db;dur={self.tempo_db * 1000:.2f};desc="{self.queries} queries"']
+        partes += [f"{nome};dur={duracao * 1000:.2f}" for nome, duracao in self.fases.items()]
+        return ", ".join(partes)
+
+# medição da requisição em andamento; as fases (jwt, usuario, bcrypt, ...) e os hooks do SQLAlchemy somam nela
+_medicao_atual = ContextVar("medicao_atual", default=None)
+
+duracao_requisicoes = Histograma()
+queries_por_rota = {}
+tempo_db_por_rota = {}
+
+def registrar_fase(nome, duracao):
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.fases[nome] = medicao.fases.get(nome, 0.0) + duracao
+
+@contextmanager
+def medir_fase(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_fase(nome, time.perf_counter() - inicio)
+
+class JSONRespostaMedida(JSONResponse):
+    """JSONResponse que registra o tempo de serialização na fase "render"."""
+
+    def render(self, content):
+        with medir_fase("render"):
+            return super().render(content)
+
+class ORJSONRespostaMedida(ORJSONResponse):
+    """ORJSONResponse (requer o pacote orjson) que registra o tempo de serialização na fase "render"."""
+
+    def render(self, content):
+        with medir_fase("render"):
+            return super().render(content)
+
+def _antes_query(conn, cursor, statement, parameters, context, executemany):
+    context._metricas_inicio = time.perf_counter()
+
+def _depois_query(conn, cursor, statement, parameters, context, executemany):
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.queries += 1
+        medicao.tempo_db += time.perf_counter() - context._metricas_inicio
+
+def instrumentar_engine(engine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _antes_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _depois_query)
+
+class MetricasMiddleware:
+    """Middleware ASGI que mede cada requisição HTTP: histograma de latência por método, rota e status,
+    contagem/tempo de queries por rota e cabeçalho Server-Timing na resposta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                mensagem["headers"] = [*mensagem.get("headers", []), (b"server-timing", medicao.server_timing().encode())]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicao_atual.reset(token)
+            rota = getattr(scope.get("route"), "path_format", "desconhecida")
+            duracao_requisicoes.observar((scope["method"], rota, str(status)), time.perf_counter() - medicao.inicio)
+            chave = (scope["method"], rota)
+            queries_por_rota[chave] = queries_por_rota.get(chave, 0) + medicao.queries
+            tempo_db_por_rota[chave] = tempo_db_por_rota.get(chave, 0.0) + medicao.tempo_db
+
+def exportar_prometheus():
+    linhas = ["# HELP http_request_duration_seconds Latência das requisições HTTP.",
+              "# TYPE http_request_duration_seconds histogram"]
+    linhas += duracao_requisicoes.exportar("http_request_duration_seconds", ("method", "route", "status"))
+    linhas += ["# HELP db_queries_total Queries executadas, por rota.", "# TYPE db_queries_total counter"]
+    linhas += [f'db_queries_total{{method="{metodo}",route="{rota}"}} {valor}' for (metodo, rota), valor in sorted(queries_por_rota.items())]
+    linhas += ["# HELP db_query_duration_seconds_total Tempo gasto em queries, por rota.", "# TYPE db_query_duration_seconds_total counter"]
+    linhas += [f'db_query_duration_seconds_total{{method="{metodo}",route="{rota}"}} {valor}' for (metodo, rota), valor in sorted(tempo_db_por_rota.items())]
+    return linhas
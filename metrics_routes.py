@@ -0,0 +1,47 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from main import oauth2_schema
+from dependencies import pegar_sessao, verificar_token
+from metricas import exportar_prometheus
+from senhas import metricas as metricas_senha
+from limites import metricas as metricas_limites
+
+# token fixo para o coletor (no Prometheus, `authorization: credentials` ou `bearer_token`); sem ele, só um
+# usuário ADMIN autenticado lê as métricas
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+
+metrics_router = APIRouter(tags=["métricas"])
+
+async def autorizar_metricas(token: str = Depends(oauth2_schema), session: AsyncSession = Depends(pegar_sessao)):
+    if METRICAS_TOKEN and hmac.compare_digest(token.encode(), METRICAS_TOKEN.encode()):
+        return
+    usuario = await verificar_token(token, session)
+    if not usuario.admin:
+        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
+
+def exportar_senhas():
+    dados = metricas_senha()
+    linhas = ["# TYPE senha_pool_pendentes gauge", f"senha_pool_pendentes {dados['pendentes']}",
+              "# TYPE senha_pool_rejeitadas_total counter", f"senha_pool_rejeitadas_total {dados['rejeitadas']}"]
+    for nome in ("latencia_hash", "espera_fila"):
+        estatistica = dados[nome]
+        linhas += [f"# TYPE senha_{nome}_seconds summary",
+                   f"senha_{nome}_seconds_sum {estatistica['soma_segundos']}",
+                   f"senha_{nome}_seconds_count {estatistica['contagem']}"]
+    return linhas
+
+def exportar_limites():
+    dados = metricas_limites()
+    linhas = ["# TYPE rate_limit_baldes gauge", f"rate_limit_baldes {dados['baldes']}",
+              "# TYPE rate_limit_rejeitadas_total counter"]
+    linhas += [f'rate_limit_rejeitadas_total{{limite="{nome}"}} {valor}' for nome, valor in sorted(dados["rejeitadas"].items())]
+    return linhas
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False, dependencies=[Depends(autorizar_metricas)])
+async def metrics():
+    """Métricas no formato texto do Prometheus (latência por rota/status, queries por rota, pool de senhas e limites de taxa).
+    Exige `Authorization: Bearer` com METRICAS_TOKEN ou com o token de um usuário ADMIN."""
+    return "\n".join(exportar_prometheus() + exportar_senhas() + exportar_limites()) + "\n"
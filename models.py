@@ -1,16 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index, Date, DateTime, JSON, select, func
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import declarative_base, relationship
 
-db = create_engine("sqlite:///banco.db")
-
 Base = declarative_base()
 
+CENTAVO = Decimal("0.01")
+
+def para_centavos(valor):
+    return int((Decimal(str(valor)) * 100).quantize(Decimal(1), rounding = ROUND_HALF_UP))
+
 class Usuario(Base):
     __tablename__="usuarios"
 
     id = Column("id", Integer, primary_key = True, autoincrement = True)
     nome = Column("nome", String)
-    email = Column("email", String, nullable = False)
+    email = Column("email", String, nullable = False, unique = True, index = True)
     senha = Column("senha", String)
     ativo = Column("ativo", Boolean)
     admin = Column("admin", Boolean, default = False)
@@ -24,38 +29,130 @@ class Usuario(Base):
 
 class Pedido(Base):
     __tablename__ = "pedidos"
+    # AUTOINCREMENT no SQLite: com shards, cada banco gera ids a partir do início da sua faixa (database.SHARD_BITS)
+    __table_args__ = (Index("ix_pedidos_usuario_status", "usuario", "status"), {"sqlite_autoincrement": True})
 
     id = Column("id", Integer, autoincrement = True, primary_key = True)
     status = Column("status", String)
-    usuario = Column("usuario", ForeignKey("usuarios.id"))
-    preco = Column("preco", Float)
+    usuario = Column("usuario", ForeignKey("usuarios.id"), index = True)
+    preco_centavos = Column("preco_centavos", Integer, nullable = False, default = 0, server_default = "0")
+    # momento (UTC) em que o pedido foi CONCLUIDO ou CANCELADO; define o dia nos relatórios de vendas
+    fechado_em = Column("fechado_em", DateTime)
+    # incrementada a cada alteração do pedido; usada no ETag de /pedidos/pedido/{id}
+    versao = Column("versao", Integer, nullable = False, default = 1, server_default = "1")
     itens = relationship("ItemPedido", cascade = "all, delete")
 
     def __init__(self, usuario, status="PENDENTE", preco=0):
         self.status = status
         self.usuario = usuario
-        self.preco = preco
+        self.preco_centavos = para_centavos(preco)
 
-    def calcular_preco(self):
-        preco_pedido = 0
-        for item in self.itens:
-            preco_item = item.preco_unitario * item.quantidade
-            preco_pedido += preco_item
-        self.preco = preco_pedido
+    @hybrid_property
+    def preco(self):
+        return (Decimal(self.preco_centavos) / 100).quantize(CENTAVO)
+
+    @preco.inplace.expression
+    @classmethod
+    def _preco_expression(cls):
+        return cls.preco_centavos / 100.0
 
 class ItemPedido(Base):
     __tablename__ = "itens_pedido"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column("id", Integer, primary_key=True, autoincrement=True)
     sabor = Column("sabor", String)
     quantidade = Column("quantidade", Integer)
     tamanho = Column("tamanho", String)
-    preco_unitario = Column("preco_unitario", Float)
-    pedido = Column("pedido", ForeignKey("pedidos.id"))
+    preco_unitario_centavos = Column("preco_unitario_centavos", Integer, nullable = False, default = 0, server_default = "0")
+    pedido = Column("pedido", ForeignKey("pedidos.id"), index = True)
 
     def __init__(self, sabor, quantidade, tamanho, preco_unitario, pedido):
         self.sabor = sabor
         self.quantidade = quantidade
         self.tamanho = tamanho
-        self.preco_unitario = preco_unitario
-        self.pedido = pedido
\ No newline at end of file
+        self.preco_unitario_centavos = para_centavos(preco_unitario)
+        self.pedido = pedido
+
+    @hybrid_property
+    def preco_unitario(self):
+        return (Decimal(self.preco_unitario_centavos) / 100).quantize(CENTAVO)
+
+    @preco_unitario.inplace.expression
+    @classmethod
+    def _preco_unitario_expression(cls):
+        return cls.preco_unitario_centavos / 100.0
+
+    @property
+    def total_centavos(self):
+        return self.preco_unitario_centavos * self.quantidade
+
+class EventoPedido(Base):
+    """Log de alterações de pedidos (outbox): uma linha por mutação, gravada na mesma transação da alteração.
+    O id crescente serve de offset para os consumidores."""
+    __tablename__ = "eventos_pedido"
+    # AUTOINCREMENT no SQLite: ids nunca são reaproveitados, mesmo após limpeza de eventos antigos.
+    # (usuario, id): último evento de um usuário (ETag da listagem dos seus pedidos) lido pelo fim do índice
+    __table_args__ = (Index("ix_eventos_pedido_usuario_id", "usuario", "id"), {"sqlite_autoincrement": True})
+
+    id = Column("id", Integer, primary_key = True, autoincrement = True)
+    tipo = Column("tipo", String, nullable = False)
+    pedido = Column("pedido", Integer, nullable = False)
+    usuario = Column("usuario", Integer)
+    dados = Column("dados", JSON, nullable = False)
+    criado_em = Column("criado_em", DateTime, nullable = False, server_default = func.current_timestamp())
+
+    def __init__(self, tipo, pedido, usuario, dados):
+        self.tipo = tipo
+        self.pedido = pedido
+        self.usuario = usuario
+        self.dados = dados
+
+class ChaveIdempotencia(Base):
+    """Resposta gravada para um Idempotency-Key (por usuário), na mesma transação da operação."""
+    __tablename__ = "chaves_idempotencia"
+
+    chave = Column("chave", String, primary_key = True)
+    impressao = Column("impressao", String, nullable = False)
+    resposta = Column("resposta", JSON, nullable = False)
+    criado_em = Column("criado_em", DateTime, nullable = False, server_default = func.current_timestamp(), index = True)
+
+    def __init__(self, chave, impressao, resposta):
+        self.chave = chave
+        self.impressao = impressao
+        self.resposta = resposta
+
+# agregados de vendas dos pedidos fechados (CONCLUIDO/CANCELADO), mantidos a cada fechamento (relatorios.py)
+# para que os relatórios não precisem varrer pedidos e itens
+class VendaDia(Base):
+    __tablename__ = "vendas_dia"
+
+    dia = Column("dia", Date, primary_key = True)
+    status = Column("status", String, primary_key = True)
+    pedidos = Column("pedidos", Integer, nullable = False, default = 0)
+    receita_centavos = Column("receita_centavos", Integer, nullable = False, default = 0)
+
+class VendaUsuario(Base):
+    __tablename__ = "vendas_usuario"
+    __table_args__ = (Index("ix_vendas_usuario_status_receita", "status", "receita_centavos"),)
+
+    usuario = Column("usuario", Integer, primary_key = True)
+    status = Column("status", String, primary_key = True)
+    pedidos = Column("pedidos", Integer, nullable = False, default = 0)
+    receita_centavos = Column("receita_centavos", Integer, nullable = False, default = 0)
+
+class VendaItem(Base):
+    __tablename__ = "vendas_item"
+
+    dia = Column("dia", Date, primary_key = True)
+    sabor = Column("sabor", String, primary_key = True)
+    tamanho = Column("tamanho", String, primary_key = True)
+    status = Column("status", String, primary_key = True)
+    quantidade = Column("quantidade", Integer, nullable = False, default = 0)
+    receita_centavos = Column("receita_centavos", Integer, nullable = False, default = 0)
+
+def soma_itens_centavos():
+    """Total do pedido calculado pelo banco em uma única agregação (subconsulta correlacionada com pedidos.id)."""
+    return (select(func.coalesce(func.sum(ItemPedido.preco_unitario_centavos * ItemPedido.quantidade), 0))
+            .where(ItemPedido.pedido == Pedido.id)
+            .scalar_subquery())
\ No newline at end of file
@@ -1,12 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException
-from schemas import PedidoSchema, ItemPedidoSchema
-from models import Pedido, Usuario, ItemPedido
-from sqlalchemy.orm import Session
-from dependencies import pegar_sessao, verificar_token
+import heapq
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Header, Response
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Optional
+from schemas import (PedidoSchema, ItemPedidoSchema, ListagemPedidosSchema, ListaPedidosResposta, PedidoAlteradoResposta,
+                     PedidoDetalheResposta, ItemAdicionadoResposta, ItensAdicionadosResposta, ItemRemovidoResposta,
+                     ItemPedidoResposta, PedidoResumoResposta, LogEventosResposta)
+from models import Pedido, Usuario, ItemPedido, para_centavos
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
+from database import SessionLocal, usar_primario, shards, shard_do_usuario, shard_do_id, usar_shard, em_cada_shard, arquivo
+from dependencies import pegar_sessao, verificar_token, UsuarioAutenticado
+from estados_pedido import aplicar_transicao
+from eventos import canal_eventos, registrar_evento, retomar_do_log, ler_eventos, ultimo_evento_id, ler_posicoes, PARTICOES
+from relatorios import acumular_vendas
+from idempotencia import Idempotencia, pegar_idempotencia, executar_idempotente
+from escrita import confirmar
+from limites import limitar_por_usuario
+from respostas import array_json_em_stream, etag_fraco, etag_corresponde, nao_modificado
 
 order_router = APIRouter(prefix="/pedidos", tags=["pedidos"], dependencies=[Depends(verificar_token)])
 
-@order_router.get("/")
+CAMPOS_PEDIDO = {"id": Pedido.id, "status": Pedido.status, "usuario": Pedido.usuario, "preco": Pedido.preco.label("preco")}
+LOTE_EXPORTACAO = 1000
+_resumos_pedidos = TypeAdapter(list[PedidoResumoResposta])
+
+async def listar_pagina_pedidos(session, filtros, *condicoes):
+    # paginação por cursor (keyset) no id: cada página é uma busca pelo índice a partir do cursor,
+    # então o custo não cresce com a profundidade da página
+    incluir_itens = False
+    if filtros.fields:
+        campos = [campo.strip() for campo in filtros.fields.split(",") if campo.strip()]
+        if "itens" in campos:
+            campos.remove("itens")
+            incluir_itens = True
+        invalidos = [campo for campo in campos if campo not in CAMPOS_PEDIDO]
+        if invalidos:
+            raise HTTPException(status_code = 400, detail = f"Campos inválidos: {', '.join(invalidos)}")
+        if "id" not in campos:
+            campos.insert(0, "id")
+    else:
+        campos = list(CAMPOS_PEDIDO)
+
+    consulta = select(*[CAMPOS_PEDIDO[campo] for campo in campos]).filter(*condicoes)
+    if filtros.cursor is not None:
+        consulta = consulta.filter(Pedido.id > filtros.cursor)
+    if filtros.status:
+        consulta = consulta.filter(Pedido.status == filtros.status)
+    if filtros.preco_min is not None:
+        consulta = consulta.filter(Pedido.preco_centavos >= para_centavos(filtros.preco_min))
+    if filtros.preco_max is not None:
+        consulta = consulta.filter(Pedido.preco_centavos <= para_centavos(filtros.preco_max))
+    consulta = consulta.order_by(Pedido.id).limit(filtros.limit + 1)
+
+    pedidos = [dict(linha) for linha in (await session.execute(consulta)).mappings()]
+    proximo_cursor = None
+    if len(pedidos) > filtros.limit:
+        pedidos = pedidos[:filtros.limit]
+        proximo_cursor = pedidos[-1]["id"]
+    if incluir_itens and pedidos:
+        # uma única consulta com IN para os itens da página inteira, em vez de uma por pedido
+        for pedido in pedidos:
+            pedido["itens"] = []
+        por_id = {pedido["id"]: pedido for pedido in pedidos}
+        itens = await session.scalars(select(ItemPedido).filter(ItemPedido.pedido.in_(list(por_id))).order_by(ItemPedido.id))
+        for item in itens:
+            por_id[item.pedido]["itens"].append(ItemPedidoResposta.model_validate(item))
+    return {
+        "pedidos" : pedidos,
+        "next_cursor" : proximo_cursor
+    }
+
+async def listar_pagina_todos(session, filtros):
+    """listar_pagina_pedidos em todos os shards e no arquivo."""
+    paginas = await em_cada_shard(session, lambda sessao: listar_pagina_pedidos(sessao, filtros))
+    if arquivo is not None:
+        paginas.append(await listar_pagina_arquivo(filtros))
+    return juntar_paginas(paginas, filtros.limit)
+
+async def listar_pagina_com_arquivo(session, filtros, *condicoes):
+    """listar_pagina_pedidos no banco da sessão e no arquivo."""
+    paginas = [await listar_pagina_pedidos(session, filtros, *condicoes)]
+    if arquivo is not None:
+        paginas.append(await listar_pagina_arquivo(filtros, *condicoes))
+    return juntar_paginas(paginas, filtros.limit)
+
+async def listar_pagina_arquivo(filtros, *condicoes):
+    async with SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+        return await listar_pagina_pedidos(sessao_arquivo, filtros, *condicoes)
+
+def juntar_paginas(paginas, limite):
+    """Intercala pelo id páginas de bancos diferentes (shards e arquivo) em uma página de até `limite`."""
+    if len(paginas) == 1:
+        return paginas[0]
+    pedidos = []
+    for pedido in heapq.merge(*(pagina["pedidos"] for pagina in paginas), key=lambda pedido: pedido["id"]):
+        # durante o arquivamento um pedido pode estar também no arquivo; fica a cópia da primeira página
+        if not pedidos or pedidos[-1]["id"] != pedido["id"]:
+            pedidos.append(pedido)
+    proximo_cursor = None
+    if len(pedidos) > limite or any(pagina["next_cursor"] is not None for pagina in paginas):
+        pedidos = pedidos[:limite]
+        proximo_cursor = pedidos[-1]["id"]
+    return {
+        "pedidos" : pedidos,
+        "next_cursor" : proximo_cursor
+    }
+
+async def buscar_pedido(session, consulta):
+    """Resultado (scalar) da consulta no banco da sessão ou, se não houver, no arquivo."""
+    resultado = await session.scalar(consulta)
+    if resultado is None and arquivo is not None:
+        async with SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+            resultado = await sessao_arquivo.scalar(consulta)
+    return resultado
+
+def rotear_pelo_id(session, id_registro, mensagem):
+    # com shards, o id do pedido (ou do item) indica o banco em que ele foi criado
+    shard = shard_do_id(id_registro)
+    if shards and shard is None:
+        raise HTTPException(status_code = 400, detail = mensagem)
+    usar_shard(session, shard)
+
+async def etag_listagem(session, usuario=None):
+    # toda alteração de pedido grava um evento (com o dono do pedido) na mesma transação, então o último id
+    # do log muda sempre que a listagem pode ter mudado: o de todos os eventos (de cada shard) na listagem de
+    # todos os pedidos, e só o dos eventos do usuário na dos seus pedidos, para que alterações de outros
+    # usuários não invalidem o seu ETag. Ambos são leituras só pelo fim de um índice.
+    if usuario is None:
+        return etag_fraco("pedidos", "todos", *await em_cada_shard(session, ultimo_evento_id))
+    return etag_fraco("pedidos", usuario, await ultimo_evento_id(session, usuario))
+
+async def exportar_pedidos(session, filtros, *condicoes, listar=listar_pagina_pedidos):
+    """Todos os pedidos a partir do cursor, como um array JSON em stream: lê e envia um lote de
+    LOTE_EXPORTACAO por vez (cada lote com sua própria sessão curta), então a memória não cresce com o total."""
+    pagina = filtros.model_copy(update={"limit": LOTE_EXPORTACAO})
+    # o primeiro lote usa a sessão da requisição: erros de validação (ex.: "fields") ainda viram resposta 400
+    primeiro = await listar(session, pagina, *condicoes)
+
+    async def lotes():
+        resultado = primeiro
+        while True:
+            yield _resumos_pedidos.dump_json(_resumos_pedidos.validate_python(resultado["pedidos"]), exclude_unset=True)
+            if resultado["next_cursor"] is None:
+                return
+            # os lotes seguintes leem da mesma réplica (ou do primário) e do mesmo shard que o primeiro
+            async with SessionLocal(info={"replica": session.info.get("replica"), "shard": session.info.get("shard")}) as sessao_lote:
+                resultado = await listar(sessao_lote, pagina.model_copy(update={"cursor": resultado["next_cursor"]}), *condicoes)
+
+    return array_json_em_stream(lotes())
+
+@order_router.get("/", dependencies=[Depends(limitar_por_usuario("pedidos_inicio"))])
 async def pedido():
     """Pedido:  
         Operação que somente pode ser executada por usuários devidamente autenticados por meio de login efetuado. 
@@ -19,8 +164,9 @@ async def pedido():
     "Rota de Pedidos"
     return {"Rota  acessada com sucesso"}
 
-@order_router.post("/pedido-admin")
-async def criar_pedido_admin(pedido_schema: PedidoSchema, session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+@order_router.post("/pedido-admin", dependencies=[Depends(limitar_por_usuario("pedidos_criar_admin"))])
+async def criar_pedido_admin(pedido_schema: PedidoSchema, session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token),
+                             idempotencia: Optional[Idempotencia] = Depends(pegar_idempotencia)):
     """Criar pedido ADMIN:  
         Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado. 
 
@@ -32,35 +178,53 @@ async def criar_pedido_admin(pedido_schema: PedidoSchema, session: Session = Dep
             "usuario": 0
             }
 
+        Aceita o cabeçalho opcional Idempotency-Key: repetições com a mesma chave devolvem a resposta original sem criar outro registro.
+        A chave vale por usuário do pedido: a mesma chave usada para outro usuário cria um novo pedido.
+
         ERRO 401: Usuário não autenticado.
     """
     if not usuario.admin:
         raise HTTPException(status_code = 401, detail = "você não tem autorização para criar esse pedido!")
     
-    usuario_alvo = session.query(Usuario).filter(Usuario.id == pedido_schema.usuario).first()
+    usuario_alvo = await session.scalar(select(Usuario).filter(Usuario.id == pedido_schema.usuario))
     if not usuario_alvo:
         raise HTTPException(status_code = 400, detail = "Usuário não encontrado!")
-    novo_pedido = Pedido(usuario=pedido_schema.usuario)
-    session.add(novo_pedido)
-    session.commit()
-    return {"Mensagem: " f"Pedido criado com sucesso! ID Pedido: {novo_pedido.id} "}
-
-@order_router.post("/pedido")
-async def criar_pedido_usuario(session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+    usar_shard(session, shard_do_usuario(usuario_alvo.id))
+    if idempotencia is not None:
+        idempotencia.para_usuario_alvo(usuario_alvo.id)
+
+    async def criar(sessao):
+        novo_pedido = Pedido(usuario=pedido_schema.usuario)
+        sessao.add(novo_pedido)
+        await sessao.flush()
+        registrar_evento(sessao, "pedido_criado", novo_pedido)
+        return {"Mensagem: " f"Pedido criado com sucesso! ID Pedido: {novo_pedido.id} "}
+    return await executar_idempotente(session, idempotencia, criar)
+
+@order_router.post("/pedido", dependencies=[Depends(limitar_por_usuario("pedidos_criar"))])
+async def criar_pedido_usuario(session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token),
+                               idempotencia: Optional[Idempotencia] = Depends(pegar_idempotencia)):
     """Criar pedido usuário:  
         Operação que somente pode ser executada por usuários devidamente autenticados por meio de login efetuado. 
 
         Recebe o ID do usuário apartir do login. Cria um pedido e atualiza o banco de dados.
 
+        Aceita o cabeçalho opcional Idempotency-Key: repetições com a mesma chave devolvem a resposta original sem criar outro registro.
+
         ERRO 401: Usuário não autenticado.
     """
-    novo_pedido = Pedido(usuario.id)
-    session.add(novo_pedido)
-    session.commit()
-    return {"Mensagem: " f"Pedido criado com sucesso! ID Pedido: {novo_pedido.id} "}
-
-@order_router.post("/pedido/cancelar/{id_pedido}")
-async def cancelar_pedido(id_pedido: int, session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+    usar_shard(session, shard_do_usuario(usuario.id))
+
+    async def criar(sessao):
+        novo_pedido = Pedido(usuario.id)
+        sessao.add(novo_pedido)
+        await sessao.flush()
+        registrar_evento(sessao, "pedido_criado", novo_pedido)
+        return {"Mensagem: " f"Pedido criado com sucesso! ID Pedido: {novo_pedido.id} "}
+    return await executar_idempotente(session, idempotencia, criar)
+
+@order_router.post("/pedido/cancelar/{id_pedido}", response_model=PedidoAlteradoResposta, dependencies=[Depends(limitar_por_usuario("pedidos_cancelar"))])
+async def cancelar_pedido(id_pedido: int, session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Cancelar pedido:  
         Operação que somente pode ser executada (por usuário ADMIN ou pelo próprio dono do pedido) devidamente autenticados por meio de login efetuado. 
 
@@ -69,45 +233,60 @@ async def cancelar_pedido(id_pedido: int, session: Session = Depends(pegar_sessa
         ERRO 400: Pedido não encontrado.
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
-    """
-    pedido = session.query(Pedido).filter(Pedido.id == id_pedido).first()
-
-    if not pedido:
-        raise HTTPException(status_code = 400, detail = "Pedido não encontrado!")
-    if pedido.status == "CANCELADO":
-        raise HTTPException(status_code = 400, detail = "Pedido já CANCELADO anteriormente!")
-    if pedido.status == "CONCLUIDO":
-        raise HTTPException(status_code = 400, detail = "Pedido CONCLUIDO!")
-    if not usuario.admin and usuario.id != pedido.usuario:
-        raise HTTPException(status_code = 401, detail = "Você não tem autorização para cancelar esse pedido!")
-    
-    pedido.status = "CANCELADO"
-    session.commit()
-    return {
-        "mensagem" : f"Pedido {pedido.id} CANCELADO com sucesso,",
-        "pedido" : pedido
-    }
 
-@order_router.get("/listar")
-async def listar(session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+        ERRO 409: Pedido já CANCELADO ou CONCLUIDO.
+    """
+    rotear_pelo_id(session, id_pedido, "Pedido não encontrado!")
+
+    async def cancelar(sessao):
+        pedido = await aplicar_transicao(sessao, "cancelar", id_pedido, usuario, opcoes=[selectinload(Pedido.itens)])
+        await acumular_vendas(sessao, pedido.id)
+        registrar_evento(sessao, "pedido_cancelado", pedido)
+        return {
+            "mensagem" : f"Pedido {pedido.id} CANCELADO com sucesso,",
+            "pedido" : pedido
+        }
+    return await confirmar(session, cancelar)
+
+@order_router.get("/listar", response_model=ListaPedidosResposta, response_model_exclude_unset=True, dependencies=[Depends(limitar_por_usuario("pedidos_listar"))])
+async def listar(filtros: Annotated[ListagemPedidosSchema, Query()], response: Response,
+                 if_none_match: Annotated[Optional[str], Header()] = None, session: AsyncSession = Depends(pegar_sessao),
+                 usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Listar pedidos:  
         Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado. 
 
-        Realiza uma busca no banco de dados e retorna uma lista com todos os pedidos armazenados.
+        Realiza uma busca no banco de dados e retorna uma página dos pedidos armazenados (inclusive os arquivados),
+        ordenados por ID.
+
+        Parâmetros opcionais (query):
+
+            cursor: valor de "next_cursor" da página anterior
+            limit: quantidade máxima de pedidos por página (1 a 200, padrão 50)
+            status: filtra pelo status do pedido
+            preco_min / preco_max: filtra por faixa de preço
+            fields: campos retornados, separados por vírgula (id, status, usuario, preco, itens)
+
+        "next_cursor" vem nulo na última página.
+
+        A resposta traz um ETag; enviado de volta no cabeçalho If-None-Match, a API responde 304 (sem corpo)
+        se nenhum pedido foi alterado desde então.
+
+        ERRO 400: Campo inválido em "fields".
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
     """
     if not usuario.admin:
         raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
-    else:
-        pedido = session.query(Pedido).all()
-    return {
-        "pedidos" : pedido
-    }
-
-@order_router.post("/pedido/adicionar-item/{id_pedido}")
-async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSchema, session: Session = Depends(pegar_sessao),
-                                 usuario: Usuario = Depends(verificar_token)):
+    etag = await etag_listagem(session)
+    if etag_corresponde(if_none_match, etag):
+        return nao_modificado(etag)
+    response.headers["ETag"] = etag
+    return await listar_pagina_todos(session, filtros)
+
+@order_router.post("/pedido/adicionar-item/{id_pedido}", response_model=ItemAdicionadoResposta, dependencies=[Depends(limitar_por_usuario("pedidos_adicionar_item"))])
+async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSchema, session: AsyncSession = Depends(pegar_sessao),
+                                 usuario: UsuarioAutenticado = Depends(verificar_token),
+                                 idempotencia: Optional[Idempotencia] = Depends(pegar_idempotencia)):
     """Adicionar item pedido:  
         Operação que somente pode ser executada (por usuário ADMIN ou pelo próprio dono do pedido) devidamente autenticados por meio de login efetuado. 
 
@@ -124,35 +303,81 @@ async def adicionar_item_pedido(id_pedido: int, item_pedido_schema: ItemPedidoSc
 
         Adiciona os itens no pedido, atualiza o valor e atualiza o banco de dados.
 
+        Aceita o cabeçalho opcional Idempotency-Key: repetições com a mesma chave devolvem a resposta original sem criar outro registro.
+
         ERRO 400: Pedido não encontrado.
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado. 
+
+        ERRO 409: Pedido CANCELADO ou CONCLUIDO.
     """
-    pedido = session.query(Pedido).filter(Pedido.id == id_pedido).first()
+    rotear_pelo_id(session, id_pedido, "Pedido não encontrado!")
+
+    async def adicionar(sessao):
+        item_pedido = ItemPedido(item_pedido_schema.sabor, item_pedido_schema.quantidade, item_pedido_schema.tamanho,
+                                             item_pedido_schema.preco_unitario, id_pedido)
+        # a validação do status/permissão e a soma ao total acontecem no mesmo UPDATE condicional
+        pedido = await aplicar_transicao(sessao, "alterar_itens", id_pedido, usuario,
+                                         preco_centavos = Pedido.preco_centavos + item_pedido.total_centavos)
+        sessao.add(item_pedido)
+        await sessao.flush()
+        registrar_evento(sessao, "item_adicionado", pedido, itens_ids=[item_pedido.id])
+        return {
+            "mensagem": "Item criado com sucesso.",
+            "item_id": item_pedido.id,
+            "preco_pedido": pedido.preco
+        }
+    return await executar_idempotente(session, idempotencia, adicionar)
+
+@order_router.post("/pedido/adicionar-itens/{id_pedido}", response_model=ItensAdicionadosResposta, dependencies=[Depends(limitar_por_usuario("pedidos_adicionar_itens"))])
+async def adicionar_itens_pedido(id_pedido: int, itens_schema: Annotated[list[ItemPedidoSchema], Body(min_length=1, max_length=500)],
+                                 session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token),
+                                 idempotencia: Optional[Idempotencia] = Depends(pegar_idempotencia)):
+    """Adicionar itens pedido (em lote):  
+        Operação que somente pode ser executada (por usuário ADMIN ou pelo próprio dono do pedido) devidamente autenticados por meio de login efetuado. 
 
-    if not pedido:
-        raise HTTPException(status_code = 400, detail = "Pedido não encontrado!")
-    if pedido.status == "CANCELADO":
-        raise HTTPException(status_code = 400, detail = "Pedido CANCELADO!")
-    if pedido.status == "CONCLUIDO":
-        raise HTTPException(status_code = 400, detail = "Pedido CONCLUIDO!")
-    if not usuario.admin and usuario.id != pedido.usuario:
-        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa operação.")
-    
-    item_pedido = ItemPedido(item_pedido_schema.sabor, item_pedido_schema.quantidade, item_pedido_schema.tamanho,
-                                         item_pedido_schema.preco_unitario, id_pedido)
-    session.add(item_pedido)
-    pedido.calcular_preco()
-    session.commit()
-    return {
-        "mensagem": "Item criado com sucesso.",
-        "item_id": item_pedido.id,
-        "preco_pedido": pedido.preco
-    }
+        Recebe um ID do pedido.
+
+        Recebe uma lista de itens (de 1 a 500) no mesmo formato de "Adicionar item pedido":
+
+            [
+                {
+                "sabor": "string",
+                "quantidade": 0,
+                "tamanho": "string",
+                "preco_unitario": 0
+                }
+            ]
+
+        Todos os itens são validados antes da gravação e inseridos em uma única transação; o valor do pedido é atualizado uma vez.
+
+        Aceita o cabeçalho opcional Idempotency-Key: repetições com a mesma chave devolvem a resposta original sem criar outro registro.
 
-@order_router.post("/pedido/remover-item/{id_item_pedido}")
-async def remover_item_pedido(id_item_pedido: int, session: Session = Depends(pegar_sessao),
-                                 usuario: Usuario = Depends(verificar_token)):
+        ERRO 400: Pedido não encontrado.
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado. 
+
+        ERRO 409: Pedido CANCELADO ou CONCLUIDO.
+    """
+    linhas = [{"sabor": item.sabor, "quantidade": item.quantidade, "tamanho": item.tamanho,
+               "preco_unitario_centavos": para_centavos(item.preco_unitario), "pedido": id_pedido} for item in itens_schema]
+    rotear_pelo_id(session, id_pedido, "Pedido não encontrado!")
+
+    async def adicionar(sessao):
+        pedido = await aplicar_transicao(sessao, "alterar_itens", id_pedido, usuario,
+                                         preco_centavos = Pedido.preco_centavos + sum(linha["preco_unitario_centavos"] * linha["quantidade"] for linha in linhas))
+        itens_ids = (await sessao.scalars(insert(ItemPedido).returning(ItemPedido.id), linhas)).all()
+        registrar_evento(sessao, "item_adicionado", pedido, itens_ids=list(itens_ids))
+        return {
+            "mensagem": f"{len(itens_ids)} itens criados com sucesso.",
+            "itens_ids": itens_ids,
+            "preco_pedido": pedido.preco
+        }
+    return await executar_idempotente(session, idempotencia, adicionar)
+
+@order_router.post("/pedido/remover-item/{id_item_pedido}", response_model=ItemRemovidoResposta, dependencies=[Depends(limitar_por_usuario("pedidos_remover_item"))])
+async def remover_item_pedido(id_item_pedido: int, session: AsyncSession = Depends(pegar_sessao),
+                                 usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Remover item pedido:  
         Operação que somente pode ser executada (por usuário ADMIN ou pelo próprio dono do pedido) devidamente autenticados por meio de login efetuado. 
 
@@ -163,32 +388,32 @@ async def remover_item_pedido(id_item_pedido: int, session: Session = Depends(pe
         ERRO 400: Pedido não encontrado.
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
-    """ 
-    item_pedido = session.query(ItemPedido).filter(ItemPedido.id == id_item_pedido).first()
 
-    if not item_pedido:
-        raise HTTPException(status_code = 400, detail = "Pedido não encontrado para esse item!")
-    
-    pedido = session.query(Pedido).filter(Pedido.id == item_pedido.pedido).first()
-
-    if pedido.status == "CANCELADO":
-        raise HTTPException(status_code = 400, detail = "Pedido CANCELADO!")
-    if pedido.status == "CONCLUIDO":
-        raise HTTPException(status_code = 400, detail = "Pedido CONCLUIDO!")
-    if not usuario.admin and usuario.id != pedido.usuario:
-        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa operação.")    
-    
-    session.delete(item_pedido)
-    pedido.calcular_preco()
-    session.commit()
-    return {
-        "mensagem": "Item removido com sucesso.",
-        "quantidade_itens_pedido": len(pedido.itens),
-        "pedido": pedido
-    }
-
-@order_router.post("/pedido/finalizar/{id_pedido}")
-async def finalizar_pedido(id_pedido: int, session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+        ERRO 409: Pedido CANCELADO ou CONCLUIDO.
+    """ 
+    rotear_pelo_id(session, id_item_pedido, "Pedido não encontrado para esse item!")
+
+    async def remover(sessao):
+        # remove o item já devolvendo o pedido e o valor; se a transição falhar, a transação é desfeita
+        # e a remoção junto
+        item_pedido = (await sessao.execute(delete(ItemPedido).filter(ItemPedido.id == id_item_pedido)
+                                            .returning(ItemPedido.pedido, ItemPedido.quantidade, ItemPedido.preco_unitario_centavos))).first()
+
+        if not item_pedido:
+            raise HTTPException(status_code = 400, detail = "Pedido não encontrado para esse item!")
+
+        pedido = await aplicar_transicao(sessao, "alterar_itens", item_pedido.pedido, usuario, opcoes=[selectinload(Pedido.itens)],
+                                         preco_centavos = Pedido.preco_centavos - item_pedido.quantidade * item_pedido.preco_unitario_centavos)
+        registrar_evento(sessao, "item_removido", pedido, item_id=id_item_pedido)
+        return {
+            "mensagem": "Item removido com sucesso.",
+            "quantidade_itens_pedido": len(pedido.itens),
+            "pedido": pedido
+        }
+    return await confirmar(session, remover)
+
+@order_router.post("/pedido/finalizar/{id_pedido}", response_model=PedidoAlteradoResposta, dependencies=[Depends(limitar_por_usuario("pedidos_finalizar"))])
+async def finalizar_pedido(id_pedido: int, session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Finalizar pedido:  
         Operação que somente pode ser executada por usuário ADMIN devidamente autenticados por meio de login efetuado. 
 
@@ -197,61 +422,190 @@ async def finalizar_pedido(id_pedido: int, session: Session = Depends(pegar_sess
         ERRO 400: Pedido não encontrado.
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
-    """
-    
-    pedido = session.query(Pedido).filter(Pedido.id == id_pedido).first()
-
-    if not pedido:
-        raise HTTPException(status_code = 400, detail = "Pedido não encontrado!")
-    if pedido.status == "CANCELADO":
-        raise HTTPException(status_code = 400, detail = "Pedido CANCELADO!")
-    if pedido.status == "CONCLUIDO":
-        raise HTTPException(status_code = 400, detail = "Pedido já estava CONCLUIDO anteriormente!")
-    if not usuario.admin:
-        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa operação!")
-    
-    pedido.status = "CONCLUIDO"
-    session.commit()
-    return {
-        "mensagem" : f"Pedido {pedido.id} CONCLUIDO com sucesso.",
-        "pedido" : pedido
-    }
 
-@order_router.get("/pedido/{id_pedido}")
-async def visualizar_pedido(id_pedido: int, session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+        ERRO 409: Pedido CANCELADO ou já CONCLUIDO.
+    """
+    rotear_pelo_id(session, id_pedido, "Pedido não encontrado!")
+
+    async def finalizar(sessao):
+        pedido = await aplicar_transicao(sessao, "finalizar", id_pedido, usuario, opcoes=[selectinload(Pedido.itens)])
+        await acumular_vendas(sessao, pedido.id)
+        registrar_evento(sessao, "pedido_concluido", pedido)
+        return {
+            "mensagem" : f"Pedido {pedido.id} CONCLUIDO com sucesso.",
+            "pedido" : pedido
+        }
+    return await confirmar(session, finalizar)
+
+@order_router.get("/pedido/{id_pedido}", response_model=PedidoDetalheResposta, dependencies=[Depends(limitar_por_usuario("pedidos_visualizar"))])
+async def visualizar_pedido(id_pedido: int, response: Response, if_none_match: Annotated[Optional[str], Header()] = None,
+                            session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Visualizar pedido:  
         Operação que somente pode ser executada por usuário ADMIN devidamente autenticados por meio de login efetuado.
 
         Recebe como entrada o ID de um pedido. 
 
-        Realiza uma busca no banco de dados e retorna os dados do pedido solicitado.
+        Realiza uma busca no banco de dados e retorna os dados do pedido solicitado, inclusive de pedidos já arquivados.
+
+        A resposta traz um ETag com a versão do pedido; enviado de volta no cabeçalho If-None-Match, a API
+        responde 304 (sem corpo) se o pedido não foi alterado desde então.
 
         ERRO 400: Pedido não encontrado.
 
         ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
     """
-    pedido = session.query(Pedido).filter(Pedido.id == id_pedido).first()
+    rotear_pelo_id(session, id_pedido, "Pedido não encontrado!")
+    if if_none_match and usuario.admin:
+        # revalidação: só a versão, pela chave primária, antes de carregar os itens
+        versao = await buscar_pedido(session, select(Pedido.versao).filter(Pedido.id == id_pedido))
+        if versao is not None and etag_corresponde(if_none_match, etag_fraco("pedido", id_pedido, versao)):
+            return nao_modificado(etag_fraco("pedido", id_pedido, versao))
+
+    pedido = await buscar_pedido(session, select(Pedido).options(selectinload(Pedido.itens)).filter(Pedido.id == id_pedido))
 
     if not pedido:
         raise HTTPException(status_code = 400, detail = "Pedido não encontrado!")
     if not usuario.admin:
         raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa modificação.")
-    
+
+    response.headers["ETag"] = etag_fraco("pedido", pedido.id, pedido.versao)
     return {
         "quantidade_itens_pedidos" : len(pedido.itens),
         "pedido" : pedido
     }
     
-@order_router.get("/listar/pedido-usuario")
-async def listar_pedido_usuario(session: Session = Depends(pegar_sessao), usuario: Usuario = Depends(verificar_token)):
+@order_router.get("/listar/pedido-usuario", response_model=ListaPedidosResposta, response_model_exclude_unset=True, dependencies=[Depends(limitar_por_usuario("pedidos_listar_usuario"))])
+async def listar_pedido_usuario(filtros: Annotated[ListagemPedidosSchema, Query()], response: Response,
+                                if_none_match: Annotated[Optional[str], Header()] = None, session: AsyncSession = Depends(pegar_sessao),
+                                usuario: UsuarioAutenticado = Depends(verificar_token)):
     """Listar pedido Usuário:  
         Operação pode ser executada por qualquer usuário devidamente autenticado por meio de login.
 
-        Identifica o usuário logado pelo token JWT e busca no banco todos os pedidos relacionados ao seu ID. 
+        Identifica o usuário logado pelo token JWT e busca no banco os pedidos relacionados ao seu ID (inclusive os
+        arquivados), paginados por cursor.
+
+        Aceita os mesmos parâmetros opcionais de "Listar pedidos" (cursor, limit, status, preco_min, preco_max, fields)
+        e o cabeçalho If-None-Match com o ETag de uma resposta anterior (304 se nada mudou).
+
+        ERRO 400: Campo inválido em "fields".
 
         ERRO 401: Usuário não autenticado.
     """
-    pedidos = session.query(Pedido).filter(Pedido.usuario == usuario.id).all()
+    usar_shard(session, shard_do_usuario(usuario.id))
+    etag = await etag_listagem(session, usuario.id)
+    if etag_corresponde(if_none_match, etag):
+        return nao_modificado(etag)
+    response.headers["ETag"] = etag
+    return await listar_pagina_com_arquivo(session, filtros, Pedido.usuario == usuario.id)
+
+@order_router.get("/listar/exportar", dependencies=[Depends(limitar_por_usuario("pedidos_exportar"))])
+async def exportar(filtros: Annotated[ListagemPedidosSchema, Query()], session: AsyncSession = Depends(pegar_sessao),
+                   usuario: UsuarioAutenticado = Depends(verificar_token)):
+    """Exportar pedidos:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna todos os pedidos (a partir de "cursor", se informado) em um único array JSON, enviado em stream,
+        sem paginação. Indicado para listagens muito longas.
+
+        Aceita os mesmos filtros de "Listar pedidos" (cursor, status, preco_min, preco_max, fields); "limit" é ignorado.
+
+        ERRO 400: Campo inválido em "fields".
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    if not usuario.admin:
+        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
+    return await exportar_pedidos(session, filtros, listar=listar_pagina_todos)
+
+@order_router.get("/listar/pedido-usuario/exportar", dependencies=[Depends(limitar_por_usuario("pedidos_exportar_usuario"))])
+async def exportar_pedido_usuario(filtros: Annotated[ListagemPedidosSchema, Query()], session: AsyncSession = Depends(pegar_sessao),
+                                  usuario: UsuarioAutenticado = Depends(verificar_token)):
+    """Exportar pedidos Usuário:  
+        Operação pode ser executada por qualquer usuário devidamente autenticado por meio de login.
+
+        Retorna todos os pedidos do usuário logado em um único array JSON, enviado em stream, sem paginação.
+
+        Aceita os mesmos filtros de "Listar pedidos" (cursor, status, preco_min, preco_max, fields); "limit" é ignorado.
+
+        ERRO 400: Campo inválido em "fields".
+
+        ERRO 401: Usuário não autenticado.
+    """
+    usar_shard(session, shard_do_usuario(usuario.id))
+    return await exportar_pedidos(session, filtros, Pedido.usuario == usuario.id, listar=listar_pagina_com_arquivo)
+
+@order_router.get("/eventos", dependencies=[Depends(limitar_por_usuario("pedidos_eventos"))])
+async def eventos_pedidos(id_pedido: Optional[int] = None, ultimo_id: Optional[str] = None,
+                          last_event_id: Annotated[Optional[str], Header()] = None, session: AsyncSession = Depends(pegar_sessao),
+                          usuario: UsuarioAutenticado = Depends(verificar_token)):
+    """Eventos de pedidos (SSE):  
+        Operação pode ser executada por qualquer usuário devidamente autenticado por meio de login.
+
+        Mantém a conexão aberta (text/event-stream) e envia um evento a cada alteração de pedido:
+        pedido_criado, item_adicionado, item_removido, pedido_cancelado, pedido_concluido e preco_reconciliado.
+        Usuário ADMIN recebe os eventos de todos os pedidos; os demais, apenas dos próprios pedidos.
+
+        Parâmetros opcionais (query):
+
+            id_pedido: recebe somente os eventos desse pedido
+            ultimo_id: retoma a partir do evento seguinte a esse (o mesmo que o cabeçalho Last-Event-ID)
+
+        O "id" de cada evento enviado é a posição do cliente no log: o id do evento ou, com o banco dividido em
+        shards, o último id de cada shard separados por vírgula. Deve ser devolvido como recebido.
+
+        A retomada usa o log de eventos (tabela eventos_pedido), inclusive após reinício do servidor. Se houver
+        eventos demais desde o id informado, é enviado o evento "recarregar" e o cliente deve buscar o estado
+        atual pelas rotas de listagem.
+
+        ERRO 400: Id de retomada inválido.
+
+        ERRO 401: Usuário não autenticado.
+    """
+    retomada = ultimo_id if ultimo_id is not None else last_event_id
+    posicoes = ler_posicoes(retomada) if retomada is not None else None
+    if retomada is not None and posicoes is None:
+        raise HTTPException(status_code = 400, detail = "Id de retomada inválido!")
+
+    def filtro(evento):
+        if id_pedido is not None and evento.pedido != id_pedido:
+            return False
+        return usuario.admin or evento.usuario == usuario.id
+
+    assinatura = canal_eventos.assinar(filtro, posicoes)
+    if assinatura.pendentes is None:
+        # a retomada lê do primário: numa réplica atrasada, eventos anteriores à assinatura ficariam de fora
+        usar_primario(session)
+        await retomar_do_log(session, assinatura)
+    return StreamingResponse(canal_eventos.transmitir(assinatura), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@order_router.get("/eventos/log", response_model=LogEventosResposta, dependencies=[Depends(limitar_por_usuario("pedidos_eventos_log"))])
+async def log_eventos_pedidos(offset: Annotated[int, Query(ge=0)] = 0, limite: Annotated[int, Query(ge=1, le=10000)] = 1000,
+                              particao: Annotated[int, Query(ge=0)] = 0, session: AsyncSession = Depends(pegar_sessao), usuario: UsuarioAutenticado = Depends(verificar_token)):
+    """Log de eventos de pedidos:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna, em ordem, os eventos de pedidos com id maior que "offset" (até "limite" por chamada, no máximo 10000),
+        para sincronização incremental de sistemas externos sem varrer as tabelas de pedidos.
+
+        Para continuar a leitura, envie "proximo_offset" como "offset" na chamada seguinte; uma página com menos
+        eventos que "limite" indica que o consumidor alcançou o fim do log.
+
+        Com o banco dividido em shards, cada shard tem o seu log: "particao" (0 até o número de shards - 1)
+        escolhe qual é lido, e o consumidor guarda um offset por partição.
+
+        ERRO 400: Partição inválida.
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    if not usuario.admin:
+        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
+    if particao >= PARTICOES:
+        raise HTTPException(status_code = 400, detail = "Partição inválida!")
+    if shards:
+        usar_shard(session, shards[particao])
+    eventos = await ler_eventos(session, offset, limite)
     return {
-        "pedidos" : pedidos
+        "eventos" : eventos,
+        "proximo_offset" : eventos[-1].id if eventos else offset
     }
\ No newline at end of file
@@ -0,0 +1,67 @@
+from sqlalchemy import select, delete, func, Date
+from database import insert_on_conflict, dialeto_de
+from models import Pedido, ItemPedido, VendaDia, VendaUsuario, VendaItem
+
+# os agregados recebem cada pedido uma única vez, quando ele é fechado (a máquina de estados não reabre
+# pedidos CONCLUIDO/CANCELADO); os relatórios leem apenas essas tabelas
+STATUS_FECHADOS = ("CONCLUIDO", "CANCELADO")
+
+def _somar(dialeto, modelo, chaves, metricas, origem=None):
+    """INSERT ... SELECT que soma as métricas à linha já existente do agregado (ON CONFLICT DO UPDATE, no
+    SQL do `dialeto`). Sem `origem`, um INSERT com os valores passados na execução."""
+    consulta = insert_on_conflict(dialeto, modelo)
+    if origem is not None:
+        consulta = consulta.from_select([*chaves, *metricas], origem)
+    return consulta.on_conflict_do_update(index_elements = chaves,
+                                          set_ = {metrica: getattr(modelo, metrica) + getattr(consulta.excluded, metrica) for metrica in metricas})
+
+def agregacoes_vendas(dialeto, *condicoes):
+    """Comandos que somam aos agregados os pedidos fechados que atendem às condições."""
+    return [_somar(dialeto, modelo, chaves, metricas, origem) for modelo, chaves, metricas, origem in consultas_vendas(*condicoes)]
+
+def consultas_vendas(*condicoes):
+    """Para cada agregado: modelo, colunas-chave, métricas e o SELECT agrupado dos pedidos fechados."""
+    dia = func.date(Pedido.fechado_em, type_ = Date)
+    fechados = (Pedido.status.in_(STATUS_FECHADOS), Pedido.fechado_em.is_not(None), *condicoes)
+    sabor = func.coalesce(ItemPedido.sabor, "")
+    tamanho = func.coalesce(ItemPedido.tamanho, "")
+    return [
+        (VendaDia, ["dia", "status"], ["pedidos", "receita_centavos"],
+         select(dia, Pedido.status, func.count(), func.sum(Pedido.preco_centavos))
+         .filter(*fechados).group_by(dia, Pedido.status)),
+        (VendaUsuario, ["usuario", "status"], ["pedidos", "receita_centavos"],
+         select(Pedido.usuario, Pedido.status, func.count(), func.sum(Pedido.preco_centavos))
+         .filter(*fechados, Pedido.usuario.is_not(None)).group_by(Pedido.usuario, Pedido.status)),
+        (VendaItem, ["dia", "sabor", "tamanho", "status"], ["quantidade", "receita_centavos"],
+         select(dia, sabor, tamanho, Pedido.status, func.sum(ItemPedido.quantidade),
+                func.sum(ItemPedido.quantidade * ItemPedido.preco_unitario_centavos))
+         .join(Pedido, ItemPedido.pedido == Pedido.id).filter(*fechados).group_by(dia, sabor, tamanho, Pedido.status)),
+    ]
+
+async def acumular_vendas(session, id_pedido):
+    """Soma um pedido recém-fechado aos agregados, na mesma transação do fechamento."""
+    for consulta in agregacoes_vendas(dialeto_de(session, VendaDia), Pedido.id == id_pedido):
+        await session.execute(consulta)
+
+async def reconstruir_vendas(session, lote, sessao_arquivo=None, *condicoes_arquivo):
+    """Apaga e recalcula os agregados a partir de pedidos e itens, em faixas de ID. Roda em uma única
+    transação para não contar em dobro pedidos fechados durante a reconstrução. Com `sessao_arquivo`, soma
+    também os pedidos arquivados que atendem a `condicoes_arquivo`."""
+    for modelo in (VendaDia, VendaUsuario, VendaItem):
+        await session.execute(delete(modelo))
+    dialeto = dialeto_de(session, VendaDia)
+    # com shards, os ids de cada banco começam no início da sua faixa
+    menor_id, maior_id = (await session.execute(select(func.min(Pedido.id), func.max(Pedido.id)))).one()
+    for inicio in range((menor_id or 1) - 1, maior_id or 0, lote):
+        for consulta in agregacoes_vendas(dialeto, Pedido.id > inicio, Pedido.id <= inicio + lote):
+            await session.execute(consulta)
+    fechados = (Pedido.status.in_(STATUS_FECHADOS), Pedido.fechado_em.is_not(None))
+    pedidos = await session.scalar(select(func.count()).select_from(Pedido).filter(*fechados))
+    if sessao_arquivo is not None:
+        # o arquivo fica em outro banco: os grupos são calculados lá e somados aqui
+        for modelo, chaves, metricas, origem in consultas_vendas(*condicoes_arquivo):
+            linhas = [dict(zip([*chaves, *metricas], linha)) for linha in await sessao_arquivo.execute(origem)]
+            if linhas:
+                await session.execute(_somar(dialeto, modelo, chaves, metricas), linhas)
+        pedidos += await sessao_arquivo.scalar(select(func.count()).select_from(Pedido).filter(*fechados, *condicoes_arquivo))
+    return pedidos
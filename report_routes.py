@@ -0,0 +1,128 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Annotated, Optional
+from schemas import (FiltroRelatorioSchema, FiltroVendasItemSchema, VendaDiaResposta, VendaStatusResposta, VendaUsuarioResposta, VendaItemResposta)
+from models import VendaDia, VendaUsuario, VendaItem
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import em_cada_shard
+from dependencies import pegar_sessao, verificar_token, UsuarioAutenticado
+
+async def verificar_admin(usuario: UsuarioAutenticado = Depends(verificar_token)):
+    if not usuario.admin:
+        raise HTTPException(status_code = 401, detail = "Você não tem autorização para fazer essa solicição!")
+    return usuario
+
+report_router = APIRouter(prefix="/relatorios", tags=["relatorios"], dependencies=[Depends(verificar_admin)])
+
+AGRUPAMENTOS_ITEM = {"sabor": VendaItem.sabor, "tamanho": VendaItem.tamanho}
+
+def filtrar_periodo(modelo, filtros):
+    condicoes = []
+    if filtros.de:
+        condicoes.append(modelo.dia >= filtros.de)
+    if filtros.ate:
+        condicoes.append(modelo.dia <= filtros.ate)
+    if filtros.status:
+        condicoes.append(modelo.status == filtros.status)
+    return condicoes
+
+async def consultar_vendas(session, consulta, chaves):
+    """Executa a consulta (com a coluna receita_centavos) em cada shard. Com shards, as linhas com as mesmas
+    `chaves` são combinadas somando as demais colunas e ordenadas pelas chaves. Acrescenta a receita em reais."""
+    async def executar(sessao):
+        return (await sessao.execute(consulta)).mappings().all()
+    resultados = await em_cada_shard(session, executar)
+    if len(resultados) == 1:
+        linhas = resultados[0]
+    else:
+        somadas = {}
+        for linha in (linha for linhas in resultados for linha in linhas):
+            chave = tuple(linha[campo] for campo in chaves)
+            anterior = somadas.get(chave)
+            somadas[chave] = dict(linha) if anterior is None else {campo: valor if campo in chaves else anterior[campo] + valor
+                                                                   for campo, valor in linha.items()}
+        linhas = [somadas[chave] for chave in sorted(somadas)]
+    # a soma é feita em centavos, sem erro de arredondamento entre shards
+    return [{**linha, "receita": linha["receita_centavos"] / 100.0} for linha in linhas]
+
+@report_router.get("/vendas/dia", response_model=list[VendaDiaResposta])
+async def vendas_por_dia(filtros: Annotated[FiltroRelatorioSchema, Query()], session: AsyncSession = Depends(pegar_sessao)):
+    """Vendas por dia:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna, para cada dia (UTC) e status de fechamento (CONCLUIDO ou CANCELADO), a quantidade de pedidos e a receita.
+
+        Parâmetros opcionais (query):
+
+            de / ate: intervalo de dias (AAAA-MM-DD), inclusive
+            status: CONCLUIDO ou CANCELADO
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    consulta = (select(VendaDia.dia, VendaDia.status, VendaDia.pedidos, VendaDia.receita_centavos)
+                .filter(*filtrar_periodo(VendaDia, filtros)).order_by(VendaDia.dia, VendaDia.status))
+    return await consultar_vendas(session, consulta, ("dia", "status"))
+
+@report_router.get("/vendas/status", response_model=list[VendaStatusResposta])
+async def vendas_por_status(filtros: Annotated[FiltroRelatorioSchema, Query()], session: AsyncSession = Depends(pegar_sessao)):
+    """Vendas por status:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna a quantidade de pedidos e a receita de cada status de fechamento no período.
+
+        Aceita os mesmos parâmetros opcionais de "Vendas por dia" (de, ate, status).
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    consulta = (select(VendaDia.status, func.sum(VendaDia.pedidos).label("pedidos"), func.sum(VendaDia.receita_centavos).label("receita_centavos"))
+                .filter(*filtrar_periodo(VendaDia, filtros)).group_by(VendaDia.status).order_by(VendaDia.status))
+    return await consultar_vendas(session, consulta, ("status",))
+
+@report_router.get("/vendas/usuario", response_model=list[VendaUsuarioResposta])
+async def vendas_por_usuario(status: str = "CONCLUIDO", usuario: Optional[int] = None,
+                             limite: Annotated[int, Query(ge=1, le=1000)] = 100, session: AsyncSession = Depends(pegar_sessao)):
+    """Vendas por usuário:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna os usuários com maior receita no status informado (padrão CONCLUIDO), desde o início.
+
+        Parâmetros opcionais (query):
+
+            status: CONCLUIDO ou CANCELADO
+            usuario: retorna apenas o usuário informado
+            limite: quantidade de usuários (1 a 1000, padrão 100)
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    consulta = (select(VendaUsuario.usuario, VendaUsuario.status, VendaUsuario.pedidos, VendaUsuario.receita_centavos)
+                .filter(VendaUsuario.status == status).order_by(VendaUsuario.receita_centavos.desc()).limit(limite))
+    if usuario is not None:
+        consulta = consulta.filter(VendaUsuario.usuario == usuario)
+    # cada usuário fica em um único shard: o ranking geral sai dos "limite" primeiros de cada shard
+    linhas = await consultar_vendas(session, consulta, ("usuario", "status"))
+    return sorted(linhas, key=lambda linha: linha["receita_centavos"], reverse=True)[:limite]
+
+@report_router.get("/vendas/item", response_model=list[VendaItemResposta], response_model_exclude_unset=True)
+async def vendas_por_item(filtros: Annotated[FiltroVendasItemSchema, Query()], session: AsyncSession = Depends(pegar_sessao)):
+    """Vendas por item:  
+        Operação que somente pode ser executada por usuário ADMIN devidamente autenticado por meio de login efetuado.
+
+        Retorna a quantidade vendida e a receita dos itens, agrupadas por sabor e/ou tamanho e por status.
+
+        Parâmetros opcionais (query):
+
+            agrupar: "sabor", "tamanho" ou "sabor,tamanho" (padrão)
+            de / ate / status: os mesmos filtros de "Vendas por dia"
+
+        ERRO 400: Agrupamento inválido.
+
+        ERRO 401: Usuário não é ADMIN, ou Usuário não autenticado.
+    """
+    campos = [campo.strip() for campo in filtros.agrupar.split(",") if campo.strip()]
+    if not campos or any(campo not in AGRUPAMENTOS_ITEM for campo in campos):
+        raise HTTPException(status_code = 400, detail = "Agrupamento inválido! Use sabor, tamanho ou sabor,tamanho.")
+    colunas = [AGRUPAMENTOS_ITEM[campo] for campo in dict.fromkeys(campos)]
+    consulta = (select(*colunas, VendaItem.status, func.sum(VendaItem.quantidade).label("quantidade"),
+                       func.sum(VendaItem.receita_centavos).label("receita_centavos"))
+                .filter(*filtrar_periodo(VendaItem, filtros)).group_by(*colunas, VendaItem.status).order_by(*colunas, VendaItem.status))
+    return await consultar_vendas(session, consulta, (*(coluna.key for coluna in colunas), "status"))
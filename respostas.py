@@ -0,0 +1,102 @@
+import os
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import IdentityResponder, GZipResponder
+from metricas import JSONRespostaMedida, ORJSONRespostaMedida
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# serializador das respostas: "orjson" (padrão, se o pacote estiver instalado) ou "json" (biblioteca padrão)
+RESPOSTA_JSON = os.getenv("RESPOSTA_JSON", "orjson")
+# respostas menores que isso não são comprimidas: o ganho não compensa o custo
+COMPRESSAO_MIN_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", 1024))
+COMPRESSAO_GZIP_NIVEL = int(os.getenv("COMPRESSAO_GZIP_NIVEL", 6))
+COMPRESSAO_BROTLI_QUALIDADE = int(os.getenv("COMPRESSAO_BROTLI_QUALIDADE", 4))
+
+def classe_resposta_json():
+    if RESPOSTA_JSON == "orjson" and orjson is not None:
+        return ORJSONRespostaMedida
+    return JSONRespostaMedida
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size, quality):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body, *, more_body):
+        comprimido = self.compressor.process(body)
+        if not more_body:
+            comprimido += self.compressor.finish()
+        return comprimido
+
+def codificacoes_aceitas(accept_encoding):
+    """Codificações do Accept-Encoding, ignorando as recusadas com q=0."""
+    aceitas = set()
+    for parte in accept_encoding.split(","):
+        codificacao, _, parametros = parte.partition(";")
+        nome, _, valor = parametros.strip().partition("=")
+        try:
+            if nome.strip() == "q" and float(valor) == 0:
+                continue
+        except ValueError:
+            continue
+        aceitas.add(codificacao.strip().lower())
+    return aceitas
+
+class CompressaoMiddleware:
+    """Comprime as respostas acima de COMPRESSAO_MIN_BYTES com brotli (se o pacote estiver instalado e o
+    cliente aceitar) ou gzip, conforme o Accept-Encoding. Também comprime respostas em stream, exceto SSE."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        aceitas = codificacoes_aceitas(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in aceitas:
+            responder = BrotliResponder(self.app, COMPRESSAO_MIN_BYTES, COMPRESSAO_BROTLI_QUALIDADE)
+        elif "gzip" in aceitas:
+            responder = GZipResponder(self.app, COMPRESSAO_MIN_BYTES, compresslevel=COMPRESSAO_GZIP_NIVEL)
+        else:
+            responder = IdentityResponder(self.app, COMPRESSAO_MIN_BYTES)
+        await responder(scope, receive, send)
+
+def array_json_em_stream(lotes):
+    """StreamingResponse com um array JSON montado a partir de `lotes`, um gerador assíncrono que produz
+    cada lote já serializado como array JSON (bytes). Só um lote fica em memória por vez."""
+    async def transmitir():
+        yield b"["
+        primeiro = True
+        async for lote in lotes:
+            if len(lote) <= 2:
+                continue
+            yield lote[1:-1] if primeiro else b"," + lote[1:-1]
+            primeiro = False
+        yield b"]"
+    return StreamingResponse(transmitir(), media_type="application/json")
+
+def etag_fraco(*partes):
+    return 'W/"' + "-".join(str(parte) for parte in partes) + '"'
+
+def etag_corresponde(if_none_match, etag):
+    """Comparação fraca do If-None-Match (ignora o prefixo W/); "*" corresponde a qualquer versão."""
+    if not if_none_match:
+        return False
+    valor = etag.removeprefix("W/")
+    return any(candidato.strip() == "*" or candidato.strip().removeprefix("W/") == valor for candidato in if_none_match.split(","))
+
+def nao_modificado(etag):
+    return Response(status_code=304, headers={"ETag": etag})
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
+from decimal import Decimal
+from datetime import datetime, date
 
 class UsuarioSchema(BaseModel):
     nome: str
@@ -25,11 +27,120 @@ class LoginSchema(BaseModel):
         from_attributes = True
 
 class ItemPedidoSchema(BaseModel):
+    sabor: str
+    quantidade: int
+    tamanho: str
+    preco_unitario: Decimal = Field(ge=0, decimal_places=2)
+
+    class Config:
+        from_attributes = True
+
+class ListagemPedidosSchema(BaseModel):
+    cursor: Optional[int] = None
+    limit: int = Field(50, ge=1, le=200)
+    status: Optional[str] = None
+    preco_min: Optional[Decimal] = None
+    preco_max: Optional[Decimal] = None
+    fields: Optional[str] = None
+
+class FiltroRelatorioSchema(BaseModel):
+    de: Optional[date] = None
+    ate: Optional[date] = None
+    status: Optional[str] = None
+
+class FiltroVendasItemSchema(FiltroRelatorioSchema):
+    agrupar: str = "sabor,tamanho"
+
+class ItemPedidoResposta(BaseModel):
+    id: int
     sabor: str
     quantidade: int
     tamanho: str
     preco_unitario: float
+    pedido: int
+
+    class Config:
+        from_attributes = True
+
+class PedidoResposta(BaseModel):
+    id: int
+    status: str
+    usuario: int
+    preco: float
+    itens: list[ItemPedidoResposta] = []
 
     class Config:
         from_attributes = True
-    
\ No newline at end of file
+
+class PedidoResumoResposta(BaseModel):
+    id: Optional[int] = None
+    status: Optional[str] = None
+    usuario: Optional[int] = None
+    preco: Optional[float] = None
+    itens: Optional[list[ItemPedidoResposta]] = None
+
+class ListaPedidosResposta(BaseModel):
+    pedidos: list[PedidoResumoResposta]
+    next_cursor: Optional[int]
+
+class PedidoAlteradoResposta(BaseModel):
+    mensagem: str
+    pedido: PedidoResposta
+
+class PedidoDetalheResposta(BaseModel):
+    quantidade_itens_pedidos: int
+    pedido: PedidoResposta
+
+class ItemAdicionadoResposta(BaseModel):
+    mensagem: str
+    item_id: int
+    preco_pedido: float
+
+class ItensAdicionadosResposta(BaseModel):
+    mensagem: str
+    itens_ids: list[int]
+    preco_pedido: float
+
+class ItemRemovidoResposta(BaseModel):
+    mensagem: str
+    quantidade_itens_pedido: int
+    pedido: PedidoResposta
+
+class EventoPedidoResposta(BaseModel):
+    id: int
+    tipo: str
+    pedido: int
+    usuario: Optional[int]
+    dados: dict
+    criado_em: datetime
+
+    class Config:
+        from_attributes = True
+
+class LogEventosResposta(BaseModel):
+    eventos: list[EventoPedidoResposta]
+    proximo_offset: int
+
+class VendaDiaResposta(BaseModel):
+    dia: date
+    status: str
+    pedidos: int
+    receita: float
+
+class VendaStatusResposta(BaseModel):
+    status: str
+    pedidos: int
+    receita: float
+
+class VendaUsuarioResposta(BaseModel):
+    usuario: int
+    status: str
+    pedidos: int
+    receita: float
+
+class VendaItemResposta(BaseModel):
+    sabor: Optional[str] = None
+    tamanho: Optional[str] = None
+    status: str
+    quantidade: int
+    receita: float
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from main import bcrypt_context
+from metricas import registrar_fase
+
+# o bcrypt é CPU-bound: roda fora do event loop, num pool limitado, para que um pico de logins
+# não congele as demais requisições do worker
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_FILA_MAX = int(os.getenv("HASH_FILA_MAX", 32))
+
+_pool = None
+_pendentes = 0
+
+class Estatistica:
+    def __init__(self):
+        self.contagem = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, valor):
+        self.contagem += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def como_dict(self):
+        media = self.soma / self.contagem if self.contagem else 0.0
+        return {"contagem": self.contagem, "soma_segundos": self.soma, "media_segundos": media, "max_segundos": self.maximo}
+
+latencia_hash = Estatistica()
+espera_fila = Estatistica()
+rejeitadas = 0
+
+def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+def _hash(senha):
+    return bcrypt_context.hash(senha)
+
+def _verificar(senha, senha_criptografada):
+    return bcrypt_context.verify_and_update(senha, senha_criptografada)
+
+def pegar_pool():
+    global _pool
+    if _pool is None:
+        if HASH_EXECUTOR == "process":
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _pool
+
+def _carregar_backend():
+    # o passlib só carrega o backend do bcrypt no primeiro hash
+    bcrypt_context.handler("bcrypt").get_backend()
+
+async def aquecer_pool():
+    """Carrega o backend do bcrypt e inicia os workers do pool, para que o primeiro login não pague isso."""
+    _carregar_backend()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pegar_pool(), _carregar_backend) for _ in range(HASH_WORKERS)))
+
+def encerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+async def _executar(funcao, *args):
+    global _pendentes, rejeitadas
+    if _pendentes >= HASH_WORKERS + HASH_FILA_MAX:
+        rejeitadas += 1
+        raise HTTPException(status_code = 503, detail = "Servidor ocupado, tente novamente.", headers = {"Retry-After": "1"})
+    _pendentes += 1
+    inicio = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        resultado, duracao = await loop.run_in_executor(pegar_pool(), _cronometrar, funcao, *args)
+    finally:
+        _pendentes -= 1
+    total = time.perf_counter() - inicio
+    latencia_hash.registrar(duracao)
+    espera_fila.registrar(max(total - duracao, 0.0))
+    registrar_fase("bcrypt", total)
+    return resultado
+
+async def criptografar_senha(senha):
+    return await _executar(_hash, senha)
+
+async def verificar_senha(senha, senha_criptografada):
+    """Retorna (senha_valida, novo_hash). novo_hash só vem preenchido quando o hash armazenado
+    usa um custo diferente do configurado em BCRYPT_ROUNDS e deve ser regravado."""
+    return await _executar(_verificar, senha, senha_criptografada)
+
+def metricas():
+    return {
+        "executor": HASH_EXECUTOR,
+        "workers": HASH_WORKERS,
+        "fila_max": HASH_FILA_MAX,
+        "pendentes": _pendentes,
+        "rejeitadas": rejeitadas,
+        "latencia_hash": latencia_hash.como_dict(),
+        "espera_fila": espera_fila.como_dict(),
+    }
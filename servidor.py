@@ -0,0 +1,105 @@
+"""Servidor de produção: gunicorn com workers uvicorn e o app carregado uma única vez no processo principal.
+
+Uso:
+    python servidor.py [--workers N] [--bind 0.0.0.0:8000]
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+from gunicorn.app.base import BaseApplication
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+from eventos import canal_eventos
+
+# quantidade de workers; 0 detecta pela cota de CPU do container (cgroup) ou pelas CPUs disponíveis
+SERVIDOR_WORKERS = int(os.getenv("SERVIDOR_WORKERS", 0))
+SERVIDOR_BIND = os.getenv("SERVIDOR_BIND", f"0.0.0.0:{os.getenv('PORT', 8000)}")
+# prazo para as requisições em andamento terminarem no desligamento (SIGTERM), em segundos
+SERVIDOR_TIMEOUT_DESLIGAMENTO = int(os.getenv("SERVIDOR_TIMEOUT_DESLIGAMENTO", 30))
+SERVIDOR_KEEPALIVE = int(os.getenv("SERVIDOR_KEEPALIVE", 5))
+
+def cota_cpu():
+    """CPUs permitidas pelo cgroup (v2: cpu.max; v1: cfs_quota/cfs_period), ou None sem limite."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as arquivo:
+            cota, periodo = arquivo.read().split()
+        if cota != "max":
+            return int(cota) / int(periodo)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as arquivo:
+            cota = int(arquivo.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as arquivo:
+            periodo = int(arquivo.read())
+        return cota / periodo if cota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def workers_padrao():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    cota = cota_cpu()
+    if cota is not None:
+        cpus = min(cpus, math.ceil(cota))
+    return max(cpus, 1)
+
+class ServidorUvicorn(Server):
+    def handle_exit(self, sig, frame):
+        # streams SSE não terminam sozinhos e segurariam o desligamento até o prazo: são encerrados já
+        # no sinal, enquanto as demais requisições em andamento terminam normalmente
+        try:
+            asyncio.get_running_loop().call_soon_threadsafe(canal_eventos.encerrar)
+        except RuntimeError:
+            pass
+        super().handle_exit(sig, frame)
+
+class WorkerUvicorn(UvicornWorker):
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS,
+                     # o uvicorn cancela o que sobrar um pouco antes do gunicorn matar o worker, para ainda
+                     # rodar o shutdown do lifespan (pool de senhas e conexões do banco)
+                     "timeout_graceful_shutdown": max(SERVIDOR_TIMEOUT_DESLIGAMENTO - 2, 1)}
+
+    async def _serve(self):
+        self.config.app = self.wsgi
+        server = ServidorUvicorn(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+class Servidor(BaseApplication):
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        super().__init__()
+
+    def load_config(self):
+        for chave, valor in self.opcoes.items():
+            self.cfg.set(chave, valor)
+
+    def load(self):
+        # com preload_app roda uma vez no processo principal, antes do fork: imports, load_dotenv e
+        # montagem das rotas não se repetem em cada worker
+        from main import app
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type = int, default = SERVIDOR_WORKERS or workers_padrao())
+    parser.add_argument("--bind", default = SERVIDOR_BIND)
+    args = parser.parse_args()
+    Servidor({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": WorkerUvicorn,
+        "preload_app": True,
+        "graceful_timeout": SERVIDOR_TIMEOUT_DESLIGAMENTO,
+        "keepalive": SERVIDOR_KEEPALIVE,
+        "accesslog": "-",
+    }).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+ITEM = {"sabor": "Calabresa", "quantidade": 2, "tamanho": "G", "preco_unitario": 45}
+
+async def criar_pedido(cliente, cabecalhos, itens=0):
+    """Cria um pedido do usuário dos `cabecalhos` com `itens` itens e retorna o seu id."""
+    resposta = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+    assert resposta.status_code == 200, resposta.text
+    id_pedido = int(resposta.json()[0].split("ID Pedido: ")[1].split()[0])
+    if itens:
+        resposta = await cliente.post(f"/pedidos/pedido/adicionar-itens/{id_pedido}", headers=cabecalhos, json=[ITEM] * itens)
+        assert resposta.status_code == 200, resposta.text
+    return id_pedido
+
+async def adicionar_item(cliente, cabecalhos, id_pedido, **campos):
+    return await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=cabecalhos, json={**ITEM, **campos})
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+# a configuração da API é lida na importação dos módulos: o banco temporário e as variáveis ficam definidos
+# antes de importar o app (e sobrescrevem as do ambiente, para os testes não usarem shards, réplicas etc.)
+_diretorio = tempfile.mkdtemp(prefix="testes-pedidos-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{_diretorio}/testes.db",
+    "DATABASE_REPLICAS": "",
+    "DATABASE_SHARDS": "",
+    "DATABASE_ARQUIVO": "",
+    "DB_POOL_AQUECER": "0",
+    "SECRET_KEY": "testes",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "TOKEN_EMBUTIR_CLAIMS": "false",
+    "BCRYPT_ROUNDS": "4",
+    "LIMITES_ATIVOS": "false",
+    "GRUPO_COMMIT": "false",
+    "DEBUG_SQL": "false",
+})
+
+import httpx
+import pytest
+from main import app
+from auth_routes import criar_token
+from database import SessionLocal, db
+from models import Base, Usuario
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+def usuarios():
+    """Cria as tabelas no banco temporário e os usuários dos testes (um ADMIN e dois comuns)."""
+    async def criar():
+        async with db.begin() as conexao:
+            await conexao.run_sync(Base.metadata.create_all)
+        async with SessionLocal() as session:
+            criados = {"admin": Usuario("Admin", "admin@testes.com", "-", admin=True),
+                       "usuario": Usuario("Usuário", "usuario@testes.com", "-"),
+                       "outro": Usuario("Outro", "outro@testes.com", "-")}
+            session.add_all(criados.values())
+            await session.commit()
+        await db.dispose()
+        return criados
+    criados = asyncio.run(criar())
+    yield criados
+    shutil.rmtree(_diretorio, ignore_errors=True)
+
+def cabecalhos(usuario):
+    return {"Authorization": f"Bearer {criar_token(usuario)}"}
+
+@pytest.fixture
+def admin(usuarios):
+    return cabecalhos(usuarios["admin"])
+
+@pytest.fixture
+def usuario(usuarios):
+    return cabecalhos(usuarios["usuario"])
+
+@pytest.fixture
+def outro(usuarios):
+    return cabecalhos(usuarios["outro"])
+
+@pytest.fixture
+async def cliente(usuarios, anyio_backend):
+    # o ASGITransport não roda o lifespan: ele é aberto aqui, como em cada worker do servidor. Cada teste roda
+    # no seu loop, então conexões, escritores e a leitura do log de eventos não passam de um teste para o outro
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes") as cliente:
+            yield cliente
@@ -0,0 +1,84 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select, update
+import database
+from arquivamento import criar_tabelas_arquivo, arquivar_pedidos
+from database import SessionLocal
+from models import Pedido, ItemPedido
+from tests.apoio import criar_pedido
+
+pytestmark = pytest.mark.anyio
+
+FECHADO_EM = datetime(2000, 1, 1)
+CORTE = datetime(2001, 1, 1)
+
+@pytest.fixture
+async def banco_arquivo(tmp_path, monkeypatch):
+    engine = database.criar_engine(f"sqlite+aiosqlite:///{tmp_path}/arquivo.db")
+    monkeypatch.setattr(database, "arquivo", engine)
+    await criar_tabelas_arquivo(engine)
+    yield engine
+    await engine.dispose()
+
+async def fechar_antigo(cliente, admin, id_pedido):
+    assert (await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=admin)).status_code == 200
+    async with SessionLocal() as session:
+        await session.execute(update(Pedido).filter(Pedido.id == id_pedido).values(fechado_em=FECHADO_EM))
+        await session.commit()
+
+async def arquivar():
+    async with SessionLocal() as session, SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+        return await arquivar_pedidos(session, sessao_arquivo, CORTE, 100)
+
+async def ler(id_pedido, arquivo=False):
+    async with SessionLocal(info={"arquivo": arquivo}) as session:
+        pedido = await session.get(Pedido, id_pedido)
+        itens = (await session.scalars(select(ItemPedido.id).filter(ItemPedido.pedido == id_pedido))).all()
+        return pedido and (pedido.status, pedido.preco_centavos, sorted(itens))
+
+async def test_arquivar_move_pedido_e_itens(cliente, admin, usuario, banco_arquivo):
+    id_pedido = await criar_pedido(cliente, usuario, itens=2)
+    await fechar_antigo(cliente, admin, id_pedido)
+    quente = await ler(id_pedido)
+
+    assert await arquivar() == (1, [])
+    assert await ler(id_pedido) is None
+    assert await ler(id_pedido, arquivo=True) == quente
+
+async def test_arquivar_de_novo_termina_execucao_interrompida(cliente, admin, usuario, banco_arquivo):
+    id_pedido = await criar_pedido(cliente, usuario, itens=1)
+    await fechar_antigo(cliente, admin, id_pedido)
+    quente = await ler(id_pedido)
+    # cópia já confirmada no arquivo, sem a remoção das tabelas quentes (processo interrompido no meio)
+    async with SessionLocal() as session, SessionLocal(info={"arquivo": True}) as sessao_arquivo:
+        pedido = await session.get(Pedido, id_pedido)
+        item = await session.scalar(select(ItemPedido).filter(ItemPedido.pedido == id_pedido))
+        await sessao_arquivo.merge(pedido)
+        await sessao_arquivo.merge(item)
+        await sessao_arquivo.commit()
+
+    assert await arquivar() == (1, [])
+    assert await ler(id_pedido) is None
+    assert await ler(id_pedido, arquivo=True) == quente
+
+async def test_id_reaproveitado_nao_e_apagado_sem_copia(cliente, admin, usuario, usuarios, banco_arquivo):
+    id_pedido = await criar_pedido(cliente, usuario, itens=1)
+    await fechar_antigo(cliente, admin, id_pedido)
+    assert await arquivar() == (1, [])
+    arquivado = await ler(id_pedido, arquivo=True)
+
+    # banco sem AUTOINCREMENT: um novo pedido recebe o mesmo id do arquivado
+    async with SessionLocal() as session:
+        reaproveitado = Pedido(usuarios["outro"].id, status="CANCELADO", preco=7)
+        reaproveitado.id = id_pedido
+        reaproveitado.fechado_em = FECHADO_EM
+        session.add(reaproveitado)
+        await session.commit()
+
+    assert await arquivar() == (0, [id_pedido])
+    assert await ler(id_pedido) == ("CANCELADO", 700, [])
+    assert await ler(id_pedido, arquivo=True) == arquivado
+
+    async with SessionLocal() as session:
+        await session.delete(await session.get(Pedido, id_pedido))
+        await session.commit()
@@ -0,0 +1,42 @@
+import pytest
+from jose import jwt
+from sqlalchemy import select
+from database import SessionLocal
+from models import Usuario
+
+pytestmark = pytest.mark.anyio
+
+async def login_admin(cliente, email):
+    resposta = await cliente.post("/auth/criar_conta", json={"nome": "Gerente", "email": email, "senha": "senha-gerente", "ativo": True, "admin": True})
+    assert resposta.status_code == 200, resposta.text
+    resposta = await cliente.post("/auth/login", json={"email": email, "senha": "senha-gerente"})
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()
+
+async def rebaixar(email):
+    async with SessionLocal() as session:
+        usuario = await session.scalar(select(Usuario).filter(Usuario.email == email))
+        usuario.admin = False
+        await session.commit()
+
+async def test_claims_embutidas_so_no_token_de_acesso(cliente, monkeypatch):
+    monkeypatch.setattr("auth_routes.TOKEN_EMBUTIR_CLAIMS", True)
+    monkeypatch.setattr("dependencies.TOKEN_EMBUTIR_CLAIMS", True)
+    tokens = await login_admin(cliente, "gerente@testes.com")
+    assert jwt.get_unverified_claims(tokens["access_token"])["admin"] is True
+    assert "admin" not in jwt.get_unverified_claims(tokens["refresh_token"])
+    assert "ativo" not in jwt.get_unverified_claims(tokens["refresh_token"])
+
+async def test_refresh_token_de_usuario_rebaixado_perde_o_acesso_de_admin(cliente, monkeypatch):
+    monkeypatch.setattr("auth_routes.TOKEN_EMBUTIR_CLAIMS", True)
+    monkeypatch.setattr("dependencies.TOKEN_EMBUTIR_CLAIMS", True)
+    tokens = await login_admin(cliente, "rebaixado@testes.com")
+    refresh = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    assert (await cliente.get("/pedidos/listar", headers=refresh)).status_code == 200
+
+    await rebaixar("rebaixado@testes.com")
+    resposta = await cliente.get("/pedidos/listar", headers=refresh)
+    assert resposta.status_code == 401
+    # o novo token de acesso também sai sem a claim de admin
+    novo = (await cliente.get("/auth/refresh", headers=refresh)).json()["access_token"]
+    assert jwt.get_unverified_claims(novo)["admin"] is False
@@ -0,0 +1,77 @@
+import logging
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+import database
+from diagnostico_sql import ativar_diagnostico, contar_queries, limitar_queries
+from tests.apoio import criar_pedido
+
+pytestmark = pytest.mark.anyio
+
+def consultas_itens(contador):
+    return [statement for statement in contador.statements if "FROM itens_pedido" in statement]
+
+async def test_visualizar_pedido_em_queries_fixas(cliente, admin, usuario):
+    pequeno = await criar_pedido(cliente, usuario, itens=1)
+    grande = await criar_pedido(cliente, usuario, itens=30)
+    # a primeira requisição do admin guarda o usuário no cache do token
+    await cliente.get(f"/pedidos/pedido/{pequeno}", headers=admin)
+
+    totais = []
+    for id_pedido, quantidade in ((pequeno, 1), (grande, 30)):
+        # pedido e itens (selectinload): 2 queries, qualquer que seja a quantidade de itens
+        with limitar_queries(2) as contador:
+            resposta = await cliente.get(f"/pedidos/pedido/{id_pedido}", headers=admin)
+        assert resposta.status_code == 200
+        assert resposta.json()["quantidade_itens_pedidos"] == quantidade
+        assert len(consultas_itens(contador)) == 1
+        totais.append(contador.total)
+    assert totais[0] == totais[1]
+
+async def test_listar_com_itens_usa_uma_query_de_itens(cliente, admin, usuario):
+    ids = [await criar_pedido(cliente, usuario, itens=quantidade) for quantidade in (1, 2, 3, 4, 5)]
+    await cliente.get("/pedidos/listar", headers=admin)
+
+    totais = []
+    for limite in (1, 5):
+        # ETag (último evento), página de pedidos e um único IN com os itens da página
+        with limitar_queries(3) as contador:
+            resposta = await cliente.get(f"/pedidos/listar?fields=itens&limit={limite}&cursor={ids[0] - 1}", headers=admin)
+        assert resposta.status_code == 200
+        pedidos = resposta.json()["pedidos"]
+        assert [pedido["id"] for pedido in pedidos] == ids[:limite]
+        assert [len(pedido["itens"]) for pedido in pedidos] == [1, 2, 3, 4, 5][:limite]
+        itens = consultas_itens(contador)
+        assert len(itens) == 1 and " IN (" in itens[0]
+        totais.append(contador.total)
+    assert totais[0] == totais[1]
+
+async def test_listar_sem_itens_nao_consulta_itens(cliente, admin, usuario):
+    await criar_pedido(cliente, usuario, itens=2)
+    await cliente.get("/pedidos/listar", headers=admin)
+    with contar_queries() as contador:
+        resposta = await cliente.get("/pedidos/listar?fields=id,preco", headers=admin)
+    assert resposta.status_code == 200
+    assert consultas_itens(contador) == []
+
+@pytest.fixture
+async def outro_banco(tmp_path, monkeypatch):
+    """Um segundo engine na lista de bancos configurados (como uma réplica, shard ou o arquivo)."""
+    engine = database.criar_engine(f"sqlite+aiosqlite:///{tmp_path}/outro.db")
+    monkeypatch.setattr(database, "engines", [*database.engines, engine])
+    yield engine
+    await engine.dispose()
+
+async def test_contar_queries_inclui_os_outros_bancos(outro_banco):
+    with contar_queries() as contador:
+        async with outro_banco.connect() as conexao:
+            await conexao.execute(text("SELECT 42"))
+    assert "SELECT 42" in contador.statements
+
+async def test_diagnostico_registra_queries_lentas_dos_outros_bancos(outro_banco, monkeypatch, caplog):
+    monkeypatch.setattr("diagnostico_sql.DEBUG_SQL_LENTA_MS", 0)
+    ativar_diagnostico(FastAPI(), outro_banco)
+    with caplog.at_level(logging.WARNING, logger="diagnostico_sql"):
+        async with outro_banco.connect() as conexao:
+            await conexao.execute(text("SELECT 42"))
+    assert any("Query lenta" in registro.message and "SELECT 42" in registro.message for registro in caplog.records)
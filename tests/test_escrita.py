@@ -0,0 +1,103 @@
+import asyncio
+import contextvars
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal
+import escrita
+from diagnostico_sql import contar_queries
+from escrita import EscritorEmGrupo, confirmar, encerrar_escritores
+from models import Pedido
+
+pytestmark = pytest.mark.anyio
+
+def criar(usuario, preco):
+    async def operacao(sessao):
+        pedido = Pedido(usuario=usuario.id, preco=preco)
+        sessao.add(pedido)
+        await sessao.flush()
+        return pedido
+    return operacao
+
+def falhar(usuario, preco):
+    async def operacao(sessao):
+        sessao.add(Pedido(usuario=usuario.id, preco=preco))
+        await sessao.flush()
+        raise ValueError("operação recusada")
+    return operacao
+
+async def gravados(*ids):
+    async with SessionLocal() as session:
+        return set(await session.scalars(select(Pedido.id).filter(Pedido.id.in_(ids))))
+
+async def pedidos_com_preco(preco):
+    async with SessionLocal() as session:
+        return await session.scalar(select(func.count()).select_from(Pedido).filter(Pedido.preco_centavos == preco * 100))
+
+def aberturas(contador):
+    return [statement for statement in contador.statements if statement == "BEGIN IMMEDIATE"]
+
+async def test_operacoes_simultaneas_sao_confirmadas_em_uma_transacao(cliente, usuarios):
+    escritor = EscritorEmGrupo(None, espera_ms=50)
+    with contar_queries() as contador:
+        pedidos = await asyncio.gather(*(escritor.executar(criar(usuarios["usuario"], 11)) for _ in range(5)))
+    assert len(aberturas(contador)) == 1
+    assert await gravados(*(pedido.id for pedido in pedidos)) == {pedido.id for pedido in pedidos}
+    await escritor.encerrar()
+
+async def test_operacao_que_falha_desfaz_so_o_seu_savepoint(cliente, usuarios):
+    escritor = EscritorEmGrupo(None, espera_ms=50)
+    with contar_queries() as contador:
+        resultados = await asyncio.gather(escritor.executar(criar(usuarios["usuario"], 12)),
+                                          escritor.executar(falhar(usuarios["usuario"], 13)),
+                                          escritor.executar(criar(usuarios["usuario"], 12)),
+                                          return_exceptions=True)
+    assert len(aberturas(contador)) == 1
+    primeiro, erro, terceiro = resultados
+    assert isinstance(erro, ValueError)
+    assert await gravados(primeiro.id, terceiro.id) == {primeiro.id, terceiro.id}
+    assert await pedidos_com_preco(13) == 0
+    await escritor.encerrar()
+
+async def test_falha_no_commit_chega_a_todas_as_operacoes_do_lote(cliente, usuarios, monkeypatch):
+    async def commit_falha(self):
+        raise RuntimeError("disco cheio")
+    monkeypatch.setattr(AsyncSession, "commit", commit_falha)
+    escritor = EscritorEmGrupo(None, espera_ms=50)
+    resultados = await asyncio.gather(*(escritor.executar(criar(usuarios["usuario"], 14)) for _ in range(3)), return_exceptions=True)
+    monkeypatch.undo()
+    assert [str(resultado) for resultado in resultados] == ["disco cheio"] * 3
+    assert await pedidos_com_preco(14) == 0
+    await escritor.encerrar()
+
+async def test_encerramento_confirma_a_fila(cliente, usuarios, monkeypatch):
+    monkeypatch.setattr("escrita.GRUPO_COMMIT", True)
+    # lote aberto por mais tempo que o teste leva para pedir o encerramento
+    escrita._escritores[None] = EscritorEmGrupo(None, espera_ms=300)
+
+    async def requisicao():
+        async with SessionLocal() as session:
+            return await confirmar(session, criar(usuarios["usuario"], 15))
+    requisicoes = [asyncio.create_task(requisicao()) for _ in range(4)]
+    await asyncio.sleep(0.1)
+    assert not any(requisicao.done() for requisicao in requisicoes)
+    await encerrar_escritores()
+    pedidos = await asyncio.wait_for(asyncio.gather(*requisicoes), 1)
+    assert await gravados(*(pedido.id for pedido in pedidos)) == {pedido.id for pedido in pedidos}
+
+async def test_tarefa_escritora_nao_herda_o_contexto_da_requisicao(cliente, usuarios):
+    requisicao = contextvars.ContextVar("requisicao", default=None)
+    vistos = []
+
+    async def operacao(sessao):
+        vistos.append(requisicao.get())
+
+    escritor = EscritorEmGrupo(None, espera_ms=1)
+
+    async def executar(nome):
+        requisicao.set(nome)
+        await escritor.executar(operacao)
+    await asyncio.create_task(executar("primeira"))
+    await asyncio.create_task(executar("segunda"))
+    assert vistos == [None, None]
+    await escritor.encerrar()
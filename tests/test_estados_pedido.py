@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from database import SessionLocal
+from models import Pedido
+from tests.apoio import criar_pedido, adicionar_item
+
+pytestmark = pytest.mark.anyio
+
+async def versao_do_pedido(id_pedido):
+    async with SessionLocal() as session:
+        return await session.scalar(select(Pedido.versao).filter(Pedido.id == id_pedido))
+
+async def test_cancelar_pedido_ja_cancelado(cliente, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    assert (await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario)).status_code == 200
+    resposta = await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario)
+    assert resposta.status_code == 409
+    assert resposta.json()["detail"] == "Pedido já CANCELADO anteriormente!"
+
+async def test_cancelar_pedido_concluido(cliente, admin, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    assert (await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=admin)).status_code == 200
+    resposta = await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario)
+    assert resposta.status_code == 409
+    assert resposta.json()["detail"] == "Pedido CONCLUIDO!"
+
+async def test_cancelar_pedido_de_outro_usuario(cliente, usuario, outro):
+    id_pedido = await criar_pedido(cliente, usuario)
+    resposta = await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=outro)
+    assert resposta.status_code == 401
+    assert resposta.json()["detail"] == "Você não tem autorização para cancelar esse pedido!"
+    assert await versao_do_pedido(id_pedido) == 1
+
+async def test_finalizar_sem_ser_admin(cliente, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    resposta = await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=usuario)
+    assert resposta.status_code == 401
+    assert resposta.json()["detail"] == "Você não tem autorização para fazer essa operação!"
+    assert await versao_do_pedido(id_pedido) == 1
+
+async def test_pedido_inexistente(cliente, admin):
+    resposta = await cliente.post("/pedidos/pedido/finalizar/999999", headers=admin)
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"] == "Pedido não encontrado!"
+
+@pytest.mark.parametrize("acao, status, mensagem", [("cancelar", "CANCELADO", "Pedido CANCELADO!"),
+                                                     ("finalizar", "CONCLUIDO", "Pedido CONCLUIDO!")])
+async def test_alterar_itens_de_pedido_fechado(cliente, admin, usuario, acao, status, mensagem):
+    id_pedido = await criar_pedido(cliente, usuario)
+    id_item = (await adicionar_item(cliente, usuario, id_pedido)).json()["item_id"]
+    assert (await cliente.post(f"/pedidos/pedido/{acao}/{id_pedido}", headers=admin)).json()["pedido"]["status"] == status
+    versao = await versao_do_pedido(id_pedido)
+
+    resposta = await adicionar_item(cliente, usuario, id_pedido)
+    assert resposta.status_code == 409
+    assert resposta.json()["detail"] == mensagem
+
+    resposta = await cliente.post(f"/pedidos/pedido/adicionar-itens/{id_pedido}", headers=usuario, json=[{"sabor": "Mussarela", "quantidade": 1,
+                                                                                                          "tamanho": "M", "preco_unitario": 30}])
+    assert resposta.status_code == 409
+    assert resposta.json()["detail"] == mensagem
+
+    # a remoção do item é desfeita junto com a transição que falhou
+    resposta = await cliente.post(f"/pedidos/pedido/remover-item/{id_item}", headers=usuario)
+    assert resposta.status_code == 409
+    assert resposta.json()["detail"] == mensagem
+
+    pedido = (await cliente.get(f"/pedidos/pedido/{id_pedido}", headers=admin)).json()
+    assert pedido["quantidade_itens_pedidos"] == 1
+    assert pedido["pedido"]["preco"] == 90.0
+    assert await versao_do_pedido(id_pedido) == versao
+
+async def test_cancelamentos_simultaneos(cliente, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    respostas = await asyncio.gather(*(cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario) for _ in range(5)))
+    assert sorted(resposta.status_code for resposta in respostas) == [200, 409, 409, 409, 409]
+    assert await versao_do_pedido(id_pedido) == 2
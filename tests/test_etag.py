@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import select, func, text
+from database import SessionLocal
+from models import EventoPedido
+from tests.apoio import criar_pedido, adicionar_item
+
+pytestmark = pytest.mark.anyio
+
+async def etag_do_usuario(cliente, cabecalhos):
+    resposta = await cliente.get("/pedidos/listar/pedido-usuario", headers=cabecalhos)
+    assert resposta.status_code == 200
+    return resposta.headers["ETag"]
+
+async def test_etag_da_listagem_do_usuario(cliente, admin, usuario, outro):
+    id_pedido = await criar_pedido(cliente, usuario)
+    etag = await etag_do_usuario(cliente, usuario)
+    resposta = await cliente.get("/pedidos/listar/pedido-usuario", headers={**usuario, "If-None-Match": etag})
+    assert resposta.status_code == 304 and resposta.headers["ETag"] == etag
+
+    # alterações nos pedidos de outro usuário não invalidam o ETag
+    id_outro = await criar_pedido(cliente, outro, itens=1)
+    await cliente.post(f"/pedidos/pedido/finalizar/{id_outro}", headers=admin)
+    resposta = await cliente.get("/pedidos/listar/pedido-usuario", headers={**usuario, "If-None-Match": etag})
+    assert resposta.status_code == 304
+
+    # alterações nos seus pedidos, inclusive feitas pelo admin, invalidam
+    await adicionar_item(cliente, usuario, id_pedido)
+    nova = await etag_do_usuario(cliente, usuario)
+    assert nova != etag
+    await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=admin)
+    assert await etag_do_usuario(cliente, usuario) != nova
+
+async def test_etag_da_listagem_de_todos(cliente, admin, outro):
+    resposta = await cliente.get("/pedidos/listar", headers=admin)
+    etag = resposta.headers["ETag"]
+    assert (await cliente.get("/pedidos/listar", headers={**admin, "If-None-Match": etag})).status_code == 304
+    await criar_pedido(cliente, outro)
+    assert (await cliente.get("/pedidos/listar", headers={**admin, "If-None-Match": etag})).status_code == 200
+
+async def test_ultimo_evento_do_usuario_usa_o_indice(cliente, usuario, usuarios):
+    await criar_pedido(cliente, usuario)
+    consulta = select(func.max(EventoPedido.id)).filter(EventoPedido.usuario == usuarios["usuario"].id)
+    async with SessionLocal() as session:
+        sql = str(consulta.compile(compile_kwargs={"literal_binds": True}))
+        plano = " ".join(str(linha) for linha in await session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+    assert "ix_eventos_pedido_usuario_id" in plano
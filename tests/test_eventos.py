@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from database import SessionLocal
+from eventos import canal_eventos
+from models import EventoPedido
+from tests.apoio import criar_pedido
+
+pytestmark = pytest.mark.anyio
+
+async def proximo(transmissao):
+    return await asyncio.wait_for(anext(transmissao), 5)
+
+async def test_stream_recebe_eventos_gravados_por_outro_worker(cliente, usuarios, monkeypatch):
+    monkeypatch.setattr("eventos.EVENTOS_INTERVALO_MS", 20)
+    assinatura = canal_eventos.assinar(lambda evento: True)
+    transmissao = canal_eventos.transmitir(assinatura)
+    assert (await proximo(transmissao)).startswith("retry:")
+
+    # a linha gravada sem registrar_evento não passa pelo pub/sub deste processo, como o commit de outro worker
+    async with SessionLocal() as session:
+        evento = EventoPedido("pedido_criado", 999, usuarios["outro"].id, {"id_pedido": 999, "status": "PENDENTE"})
+        session.add(evento)
+        await session.commit()
+
+    mensagem = await proximo(transmissao)
+    assert mensagem.startswith(f"id: {evento.id}\nevent: pedido_criado\n")
+    assert '"id_pedido": 999' in mensagem
+    await transmissao.aclose()
+
+async def test_stream_recebe_eventos_do_proprio_worker_uma_vez_e_em_ordem(cliente, usuario):
+    assinatura = canal_eventos.assinar(lambda evento: True)
+    transmissao = canal_eventos.transmitir(assinatura)
+    await proximo(transmissao)
+
+    id_pedido = await criar_pedido(cliente, usuario, itens=1)
+    resposta = await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario)
+    assert resposta.status_code == 200, resposta.text
+
+    mensagens = [await proximo(transmissao) for _ in range(3)]
+    assert [mensagem.split("\n")[1] for mensagem in mensagens] == ["event: pedido_criado", "event: item_adicionado", "event: pedido_cancelado"]
+    ids = [int(mensagem.split("\n")[0].removeprefix("id: ")) for mensagem in mensagens]
+    assert ids == sorted(ids)
+    # nenhum evento repetido (o commit local só acorda a leitura do log)
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(assinatura.fila.get(), 0.7)
+    await transmissao.aclose()
@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+import pytest
+from sqlalchemy import select, update, func
+import idempotencia
+from database import SessionLocal
+from models import Pedido, ChaveIdempotencia
+from tests.apoio import criar_pedido, adicionar_item, ITEM
+
+pytestmark = pytest.mark.anyio
+
+async def contar_pedidos(id_usuario):
+    async with SessionLocal() as session:
+        return await session.scalar(select(func.count()).select_from(Pedido).filter(Pedido.usuario == id_usuario))
+
+async def chaves_gravadas(*chaves):
+    async with SessionLocal() as session:
+        return (await session.scalars(select(ChaveIdempotencia.chave).filter(ChaveIdempotencia.chave.in_(chaves)))).all()
+
+def com_chave(cabecalhos, chave):
+    return {**cabecalhos, "Idempotency-Key": chave}
+
+async def test_repeticao_devolve_a_resposta_gravada(cliente, usuario, usuarios):
+    antes = await contar_pedidos(usuarios["usuario"].id)
+    primeira = await cliente.post("/pedidos/pedido", headers=com_chave(usuario, "repeticao-criar"))
+    repeticao = await cliente.post("/pedidos/pedido", headers=com_chave(usuario, "repeticao-criar"))
+    assert primeira.status_code == repeticao.status_code == 200
+    assert repeticao.json() == primeira.json()
+    assert "Idempotent-Replayed" not in primeira.headers
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+    assert await contar_pedidos(usuarios["usuario"].id) == antes + 1
+
+async def test_repeticao_de_adicionar_item(cliente, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    respostas = [await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=com_chave(usuario, f"item-{id_pedido}"), json=ITEM)
+                 for _ in range(2)]
+    assert respostas[0].json() == respostas[1].json()
+    assert respostas[1].headers["Idempotent-Replayed"] == "true"
+    assert (await adicionar_item(cliente, usuario, id_pedido)).json()["preco_pedido"] == 180.0
+
+async def test_mesma_chave_com_outro_corpo(cliente, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    cabecalhos = com_chave(usuario, f"corpo-{id_pedido}")
+    assert (await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=cabecalhos, json=ITEM)).status_code == 200
+    resposta = await cliente.post(f"/pedidos/pedido/adicionar-item/{id_pedido}", headers=cabecalhos, json={**ITEM, "quantidade": 5})
+    assert resposta.status_code == 422
+    assert resposta.json()["detail"] == "Idempotency-Key já utilizada em outra requisição!"
+    # outra rota com a mesma chave também é outra requisição
+    assert (await cliente.post("/pedidos/pedido", headers=cabecalhos)).status_code == 422
+
+async def test_mesma_chave_de_usuarios_diferentes(cliente, usuario, outro, usuarios):
+    primeira = await cliente.post("/pedidos/pedido", headers=com_chave(usuario, "compartilhada"))
+    segunda = await cliente.post("/pedidos/pedido", headers=com_chave(outro, "compartilhada"))
+    assert primeira.json() != segunda.json()
+    assert "Idempotent-Replayed" not in segunda.headers
+
+async def test_repeticoes_simultaneas_criam_um_pedido(cliente, usuario, usuarios):
+    antes = await contar_pedidos(usuarios["usuario"].id)
+    respostas = await asyncio.gather(*(cliente.post("/pedidos/pedido", headers=com_chave(usuario, "simultanea")) for _ in range(5)))
+    assert {resposta.status_code for resposta in respostas} == {200}
+    assert len({resposta.text for resposta in respostas}) == 1
+    assert sum(resposta.headers.get("Idempotent-Replayed") == "true" for resposta in respostas) == 4
+    assert await contar_pedidos(usuarios["usuario"].id) == antes + 1
+
+async def test_repeticoes_simultaneas_em_processos_diferentes(cliente, usuario, usuarios, monkeypatch):
+    # sem a trava do processo (como em workers diferentes), a chave primária decide: a transação que
+    # perde é desfeita e devolve a resposta da que gravou primeiro
+    @asynccontextmanager
+    async def sem_trava(chave):
+        yield
+    monkeypatch.setattr(idempotencia, "_travar", sem_trava)
+    antes = await contar_pedidos(usuarios["usuario"].id)
+    respostas = await asyncio.gather(*(cliente.post("/pedidos/pedido", headers=com_chave(usuario, "entre-processos")) for _ in range(3)))
+    assert {resposta.status_code for resposta in respostas} == {200}
+    assert len({resposta.text for resposta in respostas}) == 1
+    assert await contar_pedidos(usuarios["usuario"].id) == antes + 1
+
+async def test_pedido_admin_escopa_a_chave_pelo_usuario_alvo(cliente, admin, usuarios):
+    ids = {nome: usuarios[nome].id for nome in ("usuario", "outro")}
+    antes = {nome: await contar_pedidos(id_usuario) for nome, id_usuario in ids.items()}
+    cabecalhos = com_chave(admin, "admin-alvo")
+    respostas = {nome: await cliente.post("/pedidos/pedido-admin", headers=cabecalhos, json={"usuario": id_usuario})
+                 for nome, id_usuario in ids.items()}
+    repeticao = await cliente.post("/pedidos/pedido-admin", headers=cabecalhos, json={"usuario": ids["usuario"]})
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+    assert repeticao.json() == respostas["usuario"].json()
+    assert respostas["usuario"].json() != respostas["outro"].json()
+    for nome, id_usuario in ids.items():
+        assert await contar_pedidos(id_usuario) == antes[nome] + 1
+    admin_id = usuarios["admin"].id
+    assert sorted(await chaves_gravadas(*(f"{admin_id}>{id_usuario}:admin-alvo" for id_usuario in ids.values()))) == \
+        sorted(f"{admin_id}>{id_usuario}:admin-alvo" for id_usuario in ids.values())
+
+async def test_chave_vencida_executa_de_novo(cliente, usuario, usuarios):
+    cabecalhos = com_chave(usuario, "vencida")
+    primeira = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+    chave = f"{usuarios['usuario'].id}:vencida"
+    async with SessionLocal() as session:
+        await session.execute(update(ChaveIdempotencia).filter(ChaveIdempotencia.chave == chave).values(criado_em=datetime(2000, 1, 1)))
+        await session.commit()
+
+    nova = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+    assert nova.status_code == 200
+    assert "Idempotent-Replayed" not in nova.headers
+    assert nova.json() != primeira.json()
+    # a chave vencida foi substituída pela nova resposta
+    repeticao = await cliente.post("/pedidos/pedido", headers=cabecalhos)
+    assert repeticao.json() == nova.json()
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+
+async def test_limpeza_de_chaves_vencidas(cliente, usuario, monkeypatch):
+    async with SessionLocal() as session:
+        session.add_all(ChaveIdempotencia(f"0:antiga-{indice}", "-", {}) for indice in range(3))
+        await session.flush()
+        await session.execute(update(ChaveIdempotencia).filter(ChaveIdempotencia.chave.like("0:antiga-%")).values(criado_em=datetime(2000, 1, 1)))
+        await session.commit()
+    monkeypatch.setattr(idempotencia, "IDEMPOTENCIA_LIMPEZA", 1)
+    assert (await cliente.post("/pedidos/pedido", headers=com_chave(usuario, "dispara-limpeza"))).status_code == 200
+    assert await chaves_gravadas(*(f"0:antiga-{indice}" for indice in range(3))) == []
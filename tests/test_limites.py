@@ -0,0 +1,52 @@
+import inspect
+import pytest
+import limites
+from limites import Limite, LimitadorTaxa, ROTAS_PEDIDOS
+from order_routes import order_router
+from tests.apoio import criar_pedido
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def limites_ativos(monkeypatch):
+    monkeypatch.setattr(limites, "LIMITES_ATIVOS", True)
+    monkeypatch.setattr(limites, "limitador", LimitadorTaxa())
+
+def test_cada_rota_de_pedidos_tem_o_seu_limite():
+    nomes = [inspect.getclosurevars(dependencia.call).nonlocals["nome"] for rota in order_router.routes
+             for dependencia in rota.dependant.dependencies if dependencia.call.__qualname__.startswith("limitar_por_usuario.")]
+    assert sorted(nomes) == sorted(ROTAS_PEDIDOS)
+
+def test_limite_de_rota_configuravel(monkeypatch):
+    monkeypatch.setenv("LIMITE_PEDIDOS_EXPORTAR", "5/60")
+    limite = Limite.ler("LIMITE_PEDIDOS_EXPORTAR", limites.LIMITE_PEDIDOS_USUARIO)
+    assert limite.capacidade == 5 and limite.taxa == pytest.approx(5 / 60)
+
+async def test_leituras_nao_consomem_o_limite_das_escritas(cliente, admin, usuario, limites_ativos, monkeypatch):
+    monkeypatch.setitem(limites.LIMITES, "pedidos_listar_usuario", Limite(2, 60))
+    monkeypatch.setitem(limites.LIMITES, "pedidos_criar", Limite(3, 60))
+    for _ in range(2):
+        assert (await cliente.get("/pedidos/listar/pedido-usuario", headers=usuario)).status_code == 200
+    resposta = await cliente.get("/pedidos/listar/pedido-usuario", headers=usuario)
+    assert resposta.status_code == 429
+    assert int(resposta.headers["Retry-After"]) >= 1
+
+    # o balde das escritas continua cheio, e o limite é por usuário
+    for _ in range(3):
+        await criar_pedido(cliente, usuario)
+    assert (await cliente.post("/pedidos/pedido", headers=usuario)).status_code == 429
+    assert (await cliente.get("/pedidos/listar/pedido-usuario", headers=admin)).status_code == 200
+    assert limites.metricas()["rejeitadas"] == {"pedidos_listar_usuario": 1, "pedidos_criar": 1}
+
+async def test_criar_conta_limitada_por_email_entre_ips(cliente, limites_ativos, monkeypatch):
+    monkeypatch.setitem(limites.LIMITES, "criar_conta_email", Limite(2, 60))
+    ips = iter(f"10.0.0.{numero}" for numero in range(1, 10))
+    monkeypatch.setattr(limites, "ip_cliente", lambda request: next(ips))
+    dados = {"nome": "Alvo", "email": "alvo@testes.com", "senha": "senha-alvo", "ativo": True, "admin": False}
+    assert (await cliente.post("/auth/criar_conta", json=dados)).status_code == 200
+    assert (await cliente.post("/auth/criar_conta", json=dados)).status_code == 400
+    resposta = await cliente.post("/auth/criar_conta", json=dados)
+    assert resposta.status_code == 429
+    assert int(resposta.headers["Retry-After"]) >= 1
+    # outros endereços não são afetados
+    assert (await cliente.post("/auth/criar_conta", json={**dados, "email": "outro-alvo@testes.com"})).status_code == 200
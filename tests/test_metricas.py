@@ -0,0 +1,19 @@
+import pytest
+import metrics_routes
+
+pytestmark = pytest.mark.anyio
+
+async def test_metricas_exigem_autenticacao(cliente):
+    assert (await cliente.get("/metrics")).status_code == 401
+    assert (await cliente.get("/metrics", headers={"Authorization": "Bearer invalido"})).status_code == 401
+
+async def test_metricas_somente_para_admin(cliente, admin, usuario):
+    assert (await cliente.get("/metrics", headers=usuario)).status_code == 401
+    resposta = await cliente.get("/metrics", headers=admin)
+    assert resposta.status_code == 200
+    assert "# TYPE http_request_duration_seconds histogram" in resposta.text
+
+async def test_metricas_com_token_do_coletor(cliente, monkeypatch):
+    monkeypatch.setattr(metrics_routes, "METRICAS_TOKEN", "token-do-prometheus")
+    assert (await cliente.get("/metrics", headers={"Authorization": "Bearer token-do-prometheus"})).status_code == 200
+    assert (await cliente.get("/metrics", headers={"Authorization": "Bearer outro-token"})).status_code == 401
@@ -0,0 +1,22 @@
+import sqlite3
+from alembic import command
+from alembic.config import Config
+
+def migrar(caminho):
+    # sem o alembic.ini: o env.py não reconfigura o logging dos outros testes
+    config = Config()
+    config.set_main_option("script_location", "alembic")
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{caminho}")
+    command.upgrade(config, "head")
+
+def test_ids_de_pedidos_e_itens_apagados_nao_sao_reaproveitados(tmp_path):
+    caminho = tmp_path / "migrado.db"
+    migrar(caminho)
+    conexao = sqlite3.connect(caminho)
+    for tabela in ("pedidos", "itens_pedido"):
+        assert "AUTOINCREMENT" in conexao.execute("SELECT sql FROM sqlite_master WHERE name = ?", (tabela,)).fetchone()[0]
+    conexao.execute("INSERT INTO pedidos (status) VALUES ('CONCLUIDO')")
+    conexao.execute("DELETE FROM pedidos")
+    conexao.execute("INSERT INTO pedidos (status) VALUES ('PENDENTE')")
+    assert conexao.execute("SELECT id FROM pedidos").fetchone()[0] == 2
+    conexao.close()
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Pedido
+import database
+from database import insert_on_conflict, verificar_dialetos
+from relatorios import agregacoes_vendas
+from tests.apoio import criar_pedido
+
+pytestmark = pytest.mark.anyio
+
+@pytest.mark.parametrize("dialeto", [sqlite.dialect(), postgresql.dialect()])
+def test_agregados_no_sql_de_cada_banco(dialeto):
+    for consulta in agregacoes_vendas(dialeto.name, Pedido.id == 1):
+        sql = str(consulta.compile(dialect=dialeto))
+        assert "ON CONFLICT" in sql and "DO UPDATE" in sql
+
+@pytest.mark.parametrize("dialeto", [sqlite.dialect(), postgresql.dialect()])
+def test_arquivamento_no_sql_de_cada_banco(dialeto):
+    sql = str(insert_on_conflict(dialeto.name, Pedido).on_conflict_do_nothing().compile(dialect=dialeto))
+    assert "ON CONFLICT DO NOTHING" in sql
+
+def test_banco_sem_on_conflict_falha_na_inicializacao(monkeypatch):
+    class EngineFalsa:
+        class dialect:
+            name = "mssql"
+    monkeypatch.setattr(database, "engines", [*database.engines, EngineFalsa()])
+    with pytest.raises(RuntimeError, match="mssql"):
+        verificar_dialetos()
+
+def test_shard_fora_do_sqlite_falha_na_inicializacao(monkeypatch):
+    class ShardFalso:
+        class dialect:
+            name = "postgresql"
+    monkeypatch.setattr(database, "shards", [ShardFalso()])
+    with pytest.raises(RuntimeError, match="DATABASE_SHARDS"):
+        verificar_dialetos()
+
+async def test_fechamento_soma_aos_relatorios(cliente, admin, usuario, usuarios):
+    async def vendas_do_usuario(status):
+        resposta = await cliente.get(f"/relatorios/vendas/usuario?status={status}&usuario={usuarios['usuario'].id}", headers=admin)
+        assert resposta.status_code == 200
+        return resposta.json()[0] if resposta.json() else {"pedidos": 0, "receita": 0}
+
+    antes = await vendas_do_usuario("CONCLUIDO")
+    id_pedido = await criar_pedido(cliente, usuario, itens=2)
+    assert (await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=admin)).status_code == 200
+    depois = await vendas_do_usuario("CONCLUIDO")
+    assert depois["pedidos"] == antes["pedidos"] + 1
+    assert depois["receita"] == pytest.approx(antes["receita"] + 180)
@@ -0,0 +1,43 @@
+import pytest
+from tests.apoio import criar_pedido, adicionar_item
+
+pytestmark = pytest.mark.anyio
+
+# o banco guarda centavos inteiros, mas o JSON público continua com os preços em reais (decimais)
+CAMPOS_PEDIDO = {"id", "status", "usuario", "preco", "itens"}
+CAMPOS_ITEM = {"id", "sabor", "quantidade", "tamanho", "preco_unitario", "pedido"}
+
+def conferir_pedido(pedido, preco):
+    assert set(pedido) == CAMPOS_PEDIDO
+    assert pedido["preco"] == preco
+    for item in pedido["itens"]:
+        assert set(item) == CAMPOS_ITEM
+
+async def test_visualizar_pedido_traz_precos_em_reais(cliente, admin, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    await adicionar_item(cliente, usuario, id_pedido, quantidade=3, preco_unitario="12.35")
+    resposta = await cliente.get(f"/pedidos/pedido/{id_pedido}", headers=admin)
+    assert resposta.status_code == 200
+    pedido = resposta.json()["pedido"]
+    conferir_pedido(pedido, 37.05)
+    assert pedido["itens"][0]["preco_unitario"] == 12.35
+
+async def test_alteracoes_de_pedido_trazem_precos_em_reais(cliente, admin, usuario):
+    id_pedido = await criar_pedido(cliente, usuario)
+    resposta = await adicionar_item(cliente, usuario, id_pedido, quantidade=1, preco_unitario="10.10")
+    assert resposta.json()["preco_pedido"] == 10.10
+    id_item = (await adicionar_item(cliente, usuario, id_pedido, quantidade=2, preco_unitario="0.45")).json()["item_id"]
+
+    resposta = await cliente.post(f"/pedidos/pedido/remover-item/{id_item}", headers=usuario)
+    assert resposta.status_code == 200
+    conferir_pedido(resposta.json()["pedido"], 10.10)
+
+    resposta = await cliente.post(f"/pedidos/pedido/cancelar/{id_pedido}", headers=usuario)
+    assert resposta.status_code == 200
+    conferir_pedido(resposta.json()["pedido"], 10.10)
+
+async def test_finalizar_traz_precos_em_reais(cliente, admin, usuario):
+    id_pedido = await criar_pedido(cliente, usuario, itens=2)
+    resposta = await cliente.post(f"/pedidos/pedido/finalizar/{id_pedido}", headers=admin)
+    assert resposta.status_code == 200
+    conferir_pedido(resposta.json()["pedido"], 180.0)